@@ -24,12 +24,15 @@ from django.utils.translation import ugettext as _
 from urllib3.exceptions import ConnectTimeoutError
 
 from backend import env
+from backend.components.circuit_breaker import CircuitBreaker
 from backend.components.constants import CLIENT_CRT_PATH, SSL_KEY, SSLEnum
 from backend.components.domains import ESB_PREFIX
 from backend.components.exception import DataAPIException
+from backend.components.transport import endpoint_metrics, session_pool
 from backend.components.utils.params import add_esb_info_before_request, remove_auth_args
 from backend.configuration.models.system import SystemSettings
 from backend.exceptions import ApiError, ApiRequestError, ApiResultError, AppBaseException
+from backend.utils.cache import SingleFlight
 from backend.utils.local import local
 
 logger = logging.getLogger("root")
@@ -105,6 +108,7 @@ class DataAPI(object):
         cache_time: int = 0,
         default_timeout: int = 30,
         max_retry_times: int = 3,
+        circuit_breaker: CircuitBreaker = None,
     ):
         """
         初始化一个请求句柄
@@ -124,6 +128,7 @@ class DataAPI(object):
         @param {int} cache_time 缓存时间
         @param {int} default_timeout 默认超时时间
         @param {int} max_retry_times 最大自动重试次数
+        @param {CircuitBreaker} circuit_breaker 所属模块共享的熔断器，超时重试同时受其重试预算限制
         """
         self.base = base
         self.url = f'{base.rstrip("/")}/{url.lstrip("/")}'
@@ -146,6 +151,7 @@ class DataAPI(object):
         self.cache_time = cache_time
         self.default_timeout = default_timeout
         self.max_retry_times = max_retry_times
+        self.circuit_breaker = circuit_breaker
 
     def __call__(
         self,
@@ -189,14 +195,17 @@ class DataAPI(object):
                 )
 
             return response.data
-        except (requests.exceptions.Timeout, ConnectTimeoutError):
-            # 网络超时导致，尝试重试并增加超时时间
+        except (requests.exceptions.Timeout, ConnectTimeoutError) as error:
+            # 网络超时导致，在重试预算内按原超时时间重试，预算耗尽时快速失败，避免请求在上游异常时越堆越多
             current_retry_times += 1
+            if self.circuit_breaker and not self.circuit_breaker.acquire_retry():
+                logger.exception(f"{self.module}-接口调用超时且重试预算耗尽, url => {self.url}")
+                raise ApiRequestError(self.get_error_message(_("接口调用超时且重试预算耗尽: {}").format(error)))
             return self.__call__(
                 params=params,
                 data=data,
                 raw=raw,
-                timeout=self.timeout + 30,
+                timeout=timeout,
                 raise_exception=raise_exception,
                 use_admin=use_admin,
                 headers=headers,
@@ -216,6 +225,11 @@ class DataAPI(object):
             elif isinstance(error, Exception):
                 raise DataAPIException(error_message=error_message)
 
+    @property
+    def endpoint(self):
+        """接口标识，用于按接口聚合调用指标"""
+        return f"{self.module}:{self.method.upper()} {self.url}"
+
     def get_error_message(self, error_message, request_id=None):
         url_path = ""
         try:
@@ -247,6 +261,7 @@ class DataAPI(object):
             return DataResponse(self.default_return_value, self.request_id)
 
         # 缓存
+        single_flight = None
         try:
             cache_key = self._build_cache_key(params)
             if self.cache_time:
@@ -254,6 +269,15 @@ class DataAPI(object):
                 if result is not None:
                     # 有缓存时返回
                     return DataResponse(result, self.request_id)
+
+                # 缓存失效时只允许一个请求回源，其余请求返回旧值或等待新值，等待超时则自行请求
+                single_flight = SingleFlight(cache_key, self.cache_time)
+                if not single_flight.acquire():
+                    result = single_flight.get_stale()
+                    if result is None:
+                        result = single_flight.wait()
+                    if result is not None:
+                        return DataResponse(result, self.request_id)
         except (TypeError, AttributeError):
             pass
 
@@ -264,7 +288,7 @@ class DataAPI(object):
         # 开始时记录请求时间
         start_time = time.time()
         try:
-            raw_response = self._send(params, headers, use_admin=use_admin)
+            raw_response = self._send_with_circuit_breaker(params, headers, use_admin=use_admin)
 
             # http层面的处理结果
             if raw_response.status_code != self.HTTP_STATUS_OK:
@@ -306,6 +330,9 @@ class DataAPI(object):
                 response = DataResponse(response_result, self.request_id)
                 return response
         finally:
+            if single_flight is not None:
+                single_flight.release()
+
             # 最后记录时间
             end_time = time.time()
             # 如果param是一个非dict，则手动变成dict来记录流水日志
@@ -358,6 +385,8 @@ class DataAPI(object):
                 "request_user": bk_username,
             }
 
+            endpoint_metrics.record(self.endpoint, cost_time=end_time - start_time, is_success=bool(response_result))
+
             _log = _("[BKAPI] {info}").format(
                 info=" && ".join([" {}=>{} ".format(_k, _v) for _k, _v in list(_info.items())])
             )
@@ -385,7 +414,31 @@ class DataAPI(object):
         :param cache_key:
         :return:
         """
-        cache.set(cache_key, data, self.cache_time)
+        SingleFlight(cache_key, self.cache_time).set(data)
+
+    def _send_with_circuit_breaker(self, params: Any, headers: Dict, use_admin: bool = False):
+        """
+        经过熔断器发送请求：熔断打开时快速失败，网络异常和 5xx 记为失败
+        """
+        if self.circuit_breaker is None:
+            return self._send(params, headers, use_admin=use_admin)
+
+        self.circuit_breaker.before_request()
+        try:
+            raw_response = self._send(params, headers, use_admin=use_admin)
+        except (requests.exceptions.RequestException, ConnectTimeoutError):
+            self.circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            # 非上游导致的异常不计入失败，但必须释放探测名额，否则半开状态会一直拒绝请求
+            self.circuit_breaker.release_probe()
+            raise
+
+        if raw_response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return raw_response
 
     def _send(self, params: Any, headers: Dict, use_admin: bool = False):
         """
@@ -394,26 +447,23 @@ class DataAPI(object):
         @return: requests response
         """
 
+        # 同一主机复用连接池，请求态数据(headers/cookies/cert)均按请求传入，不写入共享会话
+        url = self.build_actual_url(params)
+        session = session_pool.get_session(url, ssl=self.ssl)
+
         # 增加request id
-        session = requests.session()
-        session.headers.update(headers)
-        session.headers.update(
-            {
-                "X-Bkapi-Request-Id": self.request_id,
-                "blueking-language": translation.get_language(),
-            }
-        )
+        request_headers = {
+            **headers,
+            "X-Bkapi-Request-Id": self.request_id,
+            "blueking-language": translation.get_language(),
+        }
         # 增加鉴权信息
         if isinstance(params, dict):
-            session.headers.update(
+            request_headers["X-Bkapi-Authorization"] = json.dumps(
                 {
-                    "X-Bkapi-Authorization": json.dumps(
-                        {
-                            "bk_app_code": params.pop("bk_app_code", ""),
-                            "bk_app_secret": params.pop("bk_app_secret", ""),
-                            "bk_username": params.pop("bk_username", env.DEFAULT_USERNAME),
-                        }
-                    ),
+                    "bk_app_code": params.pop("bk_app_code", ""),
+                    "bk_app_secret": params.pop("bk_app_secret", ""),
+                    "bk_username": params.pop("bk_username", env.DEFAULT_USERNAME),
                 }
             )
 
@@ -423,33 +473,38 @@ class DataAPI(object):
         except AppBaseException:
             local_request = None
 
+        cookies = None
         if local_request and local_request.COOKIES and not use_admin:
-            session.cookies.update(local_request.COOKIES)
+            cookies = dict(local_request.COOKIES)
 
         # headers 申明重载请求方法
         if self.method_override is not None:
-            session.headers.update({"X-METHOD-OVERRIDE": self.method_override})
+            request_headers["X-METHOD-OVERRIDE"] = self.method_override
 
-        url = self.build_actual_url(params)
         # 发出请求并返回结果
         non_file_data, file_data = self._split_file_data(params)
         request_method = self.method.upper()
 
         # 如果是https链接，则需要带上client证书
-        if self.ssl:
-            client_crt, client_key = self._fetch_client_crt()
-            session.cert = (client_crt, client_key)
+        cert = self._fetch_client_crt() if self.ssl else None
+        request_kwargs = {
+            "method": self.method,
+            "url": url,
+            "headers": request_headers,
+            "cookies": cookies,
+            "cert": cert,
+            "verify": False,
+            "timeout": self.timeout,
+        }
 
         if request_method == "GET":
-            result = session.request(method=self.method, url=url, params=params, verify=False, timeout=self.timeout)
+            result = session.request(params=params, **request_kwargs)
         elif request_method == "DELETE":
-            session.headers.update({"Content-Type": "application/json; charset=utf-8"})
-            result = session.request(
-                method=self.method, url=url, data=json.dumps(non_file_data), verify=False, timeout=self.timeout
-            )
+            request_headers["Content-Type"] = "application/json; charset=utf-8"
+            result = session.request(data=json.dumps(non_file_data), **request_kwargs)
         elif request_method in ["PUT", "PATCH", "POST"]:
             if not file_data:
-                session.headers.update({"Content-Type": "application/json; charset=utf-8"})
+                request_headers["Content-Type"] = "application/json; charset=utf-8"
                 params = json.dumps(non_file_data)
             else:
                 params = non_file_data
@@ -457,11 +512,9 @@ class DataAPI(object):
             # PUT 方法上传文件时，data需作为
             if request_method == "PUT" and file_data:
                 data = list(file_data.values())[0]
-                result = session.request(method=self.method, url=url, data=data, verify=False, timeout=self.timeout)
+                result = session.request(data=data, **request_kwargs)
             else:
-                result = session.request(
-                    method=self.method, url=url, data=params, files=file_data, verify=False, timeout=self.timeout
-                )
+                result = session.request(data=params, files=file_data, **request_kwargs)
         else:
             raise ApiRequestError(_("异常请求方式，{method}").format(method=self.method))
 
@@ -529,8 +582,7 @@ class DataAPI(object):
         :param cache_key:
         :return:
         """
-        if cache.get(cache_key):
-            return cache.get(cache_key)
+        return cache.get(cache_key) or None
 
 
 class BaseApi(object):
@@ -540,13 +592,23 @@ class BaseApi(object):
 
     MODULE = ""
     BASE = ""
+    # 熔断器配置，参考 CircuitBreaker 的初始化参数，模块内的所有接口共享一个熔断器
+    CIRCUIT_BREAKER_CONFIG = {}
 
     @classmethod
     def is_esb(cls):
         return ESB_PREFIX in cls.BASE
 
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        # 子类的 __init__ 不会调用父类初始化，因此这里延迟创建
+        if "_circuit_breaker" not in self.__dict__:
+            self._circuit_breaker = CircuitBreaker(name=self.MODULE, **self.CIRCUIT_BREAKER_CONFIG)
+        return self._circuit_breaker
+
     def generate_data_api(self, method, url, description, **kwargs):
         """
         生成 DataAPI，使用类变量 BASE，MODULE 作为统一参数
         """
+        kwargs.setdefault("circuit_breaker", self.circuit_breaker)
         return DataAPI(method=method, base=self.BASE, url=url, module=self.MODULE, description=description, **kwargs)
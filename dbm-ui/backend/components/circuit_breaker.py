@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import threading
+import time
+
+from django.utils.translation import ugettext as _
+
+from backend.components.exception import DataAPIException
+
+logger = logging.getLogger("root")
+
+
+class CircuitBreakerOpenError(DataAPIException):
+    """熔断打开时快速失败的异常"""
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker(object):
+    """
+    第三方平台接口熔断器，每个 BaseApi 模块共享一个实例
+    - CLOSED: 正常请求，连续失败 failure_threshold 次后进入 OPEN
+    - OPEN: 所有请求快速失败，经过 recovery_timeout 秒后进入 HALF_OPEN
+    - HALF_OPEN: 只放行一个探测请求，成功则恢复 CLOSED，失败则重新 OPEN
+    同时维护一个按时间窗口统计的重试预算: 窗口内的重试次数不超过 min_retries + 请求数 * retry_ratio，
+    避免上游变慢时所有 worker 都堆积在重试上
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        retry_ratio: float = 0.1,
+        min_retries: int = 3,
+        budget_window: float = 10,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.retry_ratio = retry_ratio
+        self.min_retries = min_retries
+        self.budget_window = budget_window
+
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failure_count = 0
+        self._opened_at = 0.0
+        self._half_open_probing = False
+
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._window_retries = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_probing = False
+        return self._state
+
+    def _roll_budget_window(self):
+        now = time.monotonic()
+        if now - self._window_start >= self.budget_window:
+            self._window_start = now
+            self._window_requests = 0
+            self._window_retries = 0
+
+    def before_request(self):
+        """请求前检查熔断状态，熔断打开时直接抛出异常"""
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.OPEN or (state == CircuitState.HALF_OPEN and self._half_open_probing):
+                raise CircuitBreakerOpenError(
+                    _("[{name}]接口熔断中，请稍后重试").format(name=self.name),
+                )
+            if state == CircuitState.HALF_OPEN:
+                self._half_open_probing = True
+
+            self._roll_budget_window()
+            self._window_requests += 1
+
+    def record_success(self):
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._failure_count = 0
+            self._half_open_probing = False
+
+    def release_probe(self):
+        """释放半开状态的探测名额，用于探测请求因非上游原因中断的情况，不改变熔断状态"""
+        with self._lock:
+            self._half_open_probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failure_count += 1
+            if self._state == CircuitState.HALF_OPEN or self._failure_count >= self.failure_threshold:
+                if self._state != CircuitState.OPEN:
+                    logger.warning(f"[{self.name}] circuit breaker open after {self._failure_count} failures")
+                self._state = CircuitState.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_probing = False
+
+    def acquire_retry(self) -> bool:
+        """从重试预算中申请一次重试，预算耗尽或熔断打开时返回 False"""
+        with self._lock:
+            if self._current_state() != CircuitState.CLOSED:
+                return False
+
+            self._roll_budget_window()
+            if self._window_retries >= self.min_retries + self._window_requests * self.retry_ratio:
+                return False
+
+            self._window_retries += 1
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._failure_count = 0
+            self._half_open_probing = False
+            self._window_start = time.monotonic()
+            self._window_requests = 0
+            self._window_retries = 0
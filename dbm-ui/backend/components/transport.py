@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import http.cookiejar
+import os
+import threading
+from typing import Dict, Tuple
+from urllib import parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend import env
+
+
+class _RejectCookiePolicy(http.cookiejar.DefaultCookiePolicy):
+    """共享会话不保存任何响应 cookie，避免不同用户的登录态在会话间串用"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class SessionPool(object):
+    """
+    按 API 主机复用的 requests 会话池
+    - 同一主机的请求共享一个 Session，从而复用底层 urllib3 连接池，避免每次请求都重新进行 TCP/TLS 握手
+    - 会话本身不保存任何请求态数据(headers/cookies/cert 均按请求传入)，因此可以在 gevent 协程间安全共享
+    - threading.Lock 在 gevent monkey patch 之后为协程锁；celery prefork 子进程 fork 后会重建会话池
+    """
+
+    def __init__(self, pool_connections: int, pool_maxsize: int, keep_alive: bool = True):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._sessions: Dict[Tuple[str, str, bool], requests.Session] = {}
+
+    def get_session(self, url: str, ssl: bool = False) -> requests.Session:
+        parsed_url = parse.urlparse(url)
+        session_key = (parsed_url.scheme, parsed_url.netloc, ssl)
+        session = self._sessions.get(session_key)
+        if session is not None:
+            return session
+
+        with self._lock:
+            if session_key not in self._sessions:
+                self._sessions[session_key] = self._create_session()
+            return self._sessions[session_key]
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        session.cookies.set_policy(_RejectCookiePolicy())
+        # 重试由 DataAPI 自身控制，连接层不做重试
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def reset(self):
+        """丢弃所有会话。fork 后的子进程不能继续使用父进程的连接，这里只丢弃引用而不关闭父进程的 socket"""
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+
+class EndpointMetrics(object):
+    """进程内的接口调用指标，按接口(模块+请求方法+地址模板)统计调用次数、失败次数和耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def record(self, endpoint: str, cost_time: float, is_success: bool):
+        with self._lock:
+            metric = self._metrics.setdefault(
+                endpoint, {"count": 0, "error_count": 0, "total_cost": 0.0, "max_cost": 0.0, "last_cost": 0.0}
+            )
+            metric["count"] += 1
+            metric["error_count"] += 0 if is_success else 1
+            metric["total_cost"] += cost_time
+            metric["max_cost"] = max(metric["max_cost"], cost_time)
+            metric["last_cost"] = cost_time
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                endpoint: {**metric, "avg_cost": metric["total_cost"] / metric["count"]}
+                for endpoint, metric in self._metrics.items()
+            }
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+
+session_pool = SessionPool(
+    pool_connections=env.DATA_API_POOL_CONNECTIONS,
+    pool_maxsize=env.DATA_API_POOL_MAXSIZE,
+    keep_alive=env.DATA_API_KEEP_ALIVE,
+)
+endpoint_metrics = EndpointMetrics()
+
+# celery prefork 模式下，子进程需要重新建立连接池和统计指标
+os.register_at_fork(after_in_child=session_pool.reset)
+os.register_at_fork(after_in_child=endpoint_metrics.reset)
+
+
+def get_endpoint_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    获取当前进程内各接口的调用指标
+    >>> get_endpoint_metrics()
+    {"CMDB:POST http://.../list_biz_hosts/": {"count": 10, "error_count": 0, "avg_cost": 0.05, ...}}
+    """
+    return endpoint_metrics.snapshot()
@@ -12,7 +12,7 @@ specific language governing permissions and limitations under the License.
 import logging
 
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.utils.translation import ugettext_lazy as _
 
 logger = logging.getLogger("root")
@@ -37,4 +37,10 @@ class ConfigurationConfig(AppConfig):
     name = "backend.configuration"
 
     def ready(self):
+        from .models.system import BizSettings, SystemSettings
+
         post_migrate.connect(register_system_settings, sender=self)
+        # 配置变更时刷新各进程的配置快照
+        for model in [SystemSettings, BizSettings]:
+            post_save.connect(model.refresh_snapshot, sender=model)
+            post_delete.connect(model.refresh_snapshot, sender=model)
@@ -24,6 +24,10 @@ SQLSERVER_ADMIN_USER = "dbm_admin"
 MYSQL_DATA_RESTORE_TIME = 259200
 MYSQL_USUAL_JOB_TIME = 7200
 MYSQL8_VER_PARSE_NUM = 8000000
+# 配置表的版本号，配置变更时自增，各进程据此判断本地配置快照是否过期
+SETTINGS_VERSION_KEY = "configuration:settings_version:{table}"
+# 检查配置版本号的间隔(秒)，即配置变更传播到其他进程的最大延迟
+SETTINGS_VERSION_CHECK_INTERVAL = 5
 
 
 class AdminPasswordRole(str, StructuredEnum):
@@ -8,20 +8,36 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import copy
 import logging
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from django.conf import settings
-from django.db import connection, models
+from django.db import connection, models, transaction
 from django.utils.translation import ugettext_lazy as _
 
 from backend import env
 from backend.bk_web.constants import LEN_LONG, LEN_NORMAL
 from backend.bk_web.models import AuditedModel
 from backend.configuration import constants
+from backend.utils.cache import VersionedSnapshot
 
 logger = logging.getLogger("root")
 
+# 快照中表示配置不存在的占位值，配置不存在的结果也会被缓存
+_MISSING = object()
+
+
+class SettingsSnapshot(VersionedSnapshot):
+    """配置表的进程内快照，以配置的查询条件作为快照的 key"""
+
+    def get(self, key: Dict[str, Any], loader: Callable[[], Any]) -> Any:
+        """从快照中获取配置，未命中时通过 loader 从数据库加载"""
+        return super().get(tuple(sorted(key.items())), loader)
+
+
+_SETTINGS_SNAPSHOTS: Dict[type, SettingsSnapshot] = {}
+
 
 class AbstractSettings(AuditedModel):
     """定义配置表的基本字段"""
@@ -31,17 +47,41 @@ class AbstractSettings(AuditedModel):
     value = models.JSONField(_("系统设置值"), blank=True, null=True)
     desc = models.CharField(_("描述"), max_length=LEN_LONG)
 
+    @classmethod
+    def snapshot(cls) -> SettingsSnapshot:
+        """获取配置表的进程内快照"""
+        if cls not in _SETTINGS_SNAPSHOTS:
+            _SETTINGS_SNAPSHOTS[cls] = SettingsSnapshot(
+                version_key=constants.SETTINGS_VERSION_KEY.format(table=cls._meta.db_table),
+                check_interval=constants.SETTINGS_VERSION_CHECK_INTERVAL,
+            )
+        return _SETTINGS_SNAPSHOTS[cls]
+
+    @classmethod
+    def refresh_snapshot(cls, sender, **kwargs):
+        """
+        配置变更的信号处理：当前进程的快照立即失效，事务提交后再自增版本号通知其他进程，
+        避免其他进程在提交前重新加载到旧配置
+        """
+        snapshot = sender.snapshot()
+        snapshot.clear()
+        transaction.on_commit(snapshot.bump)
+
     @classmethod
     def get_setting_value(cls, key: dict, default: Optional[Any] = None) -> Union[str, Dict]:
-        """插入一条配置记录"""
-        try:
-            setting_value = cls.objects.get(**key).value
-        except cls.DoesNotExist:
-            if default is None:
-                setting_value = ""
-            else:
-                setting_value = default
-        return setting_value
+        """获取配置值，优先读取进程内快照"""
+
+        def _load_setting_value():
+            try:
+                return cls.objects.get(**key).value
+            except cls.DoesNotExist:
+                return _MISSING
+
+        setting_value = cls.snapshot().get(key, _load_setting_value)
+        if setting_value is _MISSING:
+            return "" if default is None else default
+        # 快照中的配置在进程内共享，返回副本避免调用方修改快照
+        return copy.deepcopy(setting_value)
 
     @classmethod
     def insert_setting_value(
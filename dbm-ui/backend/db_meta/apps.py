@@ -12,7 +12,7 @@ import logging
 
 from django.apps import AppConfig
 from django.db import IntegrityError
-from django.db.models.signals import post_delete, post_migrate, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
 
 logger = logging.getLogger("root")
 
@@ -43,8 +43,14 @@ class DBMeta(AppConfig):
     name = "backend.db_meta"
 
     def ready(self):
-        from backend.db_meta.models import ProxyInstance, StorageInstance
-        from backend.db_meta.signals import update_cluster_status
+        from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
+        from backend.db_meta.signals import (
+            mark_cluster_dbmeta_dirty,
+            mark_cluster_relation_dbmeta_dirty,
+            mark_instance_dbmeta_dirty,
+            mark_machine_dbmeta_dirty,
+            update_cluster_status,
+        )
 
         post_migrate.connect(init_db_meta, sender=self)
         # 当实例进行修改或者删除时，更新集群状态
@@ -52,3 +58,11 @@ class DBMeta(AppConfig):
         post_save.connect(update_cluster_status, sender=ProxyInstance)
         post_delete.connect(update_cluster_status, sender=StorageInstance)
         post_delete.connect(update_cluster_status, sender=ProxyInstance)
+
+        # 集群、实例和机器变更时，标记主机的 dbm_meta 需要增量同步到 CMDB
+        for instance_model in [StorageInstance, ProxyInstance]:
+            post_save.connect(mark_instance_dbmeta_dirty, sender=instance_model)
+            post_delete.connect(mark_instance_dbmeta_dirty, sender=instance_model)
+            m2m_changed.connect(mark_cluster_relation_dbmeta_dirty, sender=instance_model.cluster.through)
+        post_save.connect(mark_machine_dbmeta_dirty, sender=Machine)
+        post_save.connect(mark_cluster_dbmeta_dirty, sender=Cluster)
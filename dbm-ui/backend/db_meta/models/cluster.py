@@ -10,7 +10,8 @@ specific language governing permissions and limitations under the License.
 """
 import json
 import logging
-from typing import Dict, List
+from collections import defaultdict
+from typing import Dict, Iterable, List
 
 from django.core.cache import cache
 from django.db import models
@@ -43,6 +44,48 @@ from backend.ticket.models import ClusterOperateRecord
 
 logger = logging.getLogger("root")
 
+# 集群状态位的计算规则，集群类型 -> (状态位类型, [(状态位, 实例类型, 实例的 instance_inner_role)])
+# 集群下存在满足条件的不可用实例时，集群带上对应的状态位；instance_inner_role 为 None 时不区分角色
+CLUSTER_STATUS_FLAG_RULES = {
+    ClusterType.TenDBHA.value: (
+        ClusterDBHAStatusFlags,
+        [
+            (ClusterDBHAStatusFlags.ProxyUnavailable, "proxy", None),
+            (ClusterDBHAStatusFlags.BackendMasterUnavailable, "storage", InstanceInnerRole.MASTER.value),
+            (ClusterDBHAStatusFlags.BackendSlaveUnavailable, "storage", InstanceInnerRole.SLAVE.value),
+        ],
+    ),
+    ClusterType.TenDBCluster.value: (
+        ClusterTenDBClusterStatusFlag,
+        [
+            (ClusterTenDBClusterStatusFlag.SpiderUnavailable, "proxy", None),
+            (ClusterTenDBClusterStatusFlag.RemoteMasterUnavailable, "storage", InstanceInnerRole.MASTER.value),
+            (ClusterTenDBClusterStatusFlag.RemoteSlaveUnavailable, "storage", InstanceInnerRole.SLAVE.value),
+        ],
+    ),
+    ClusterType.TenDBSingle.value: (
+        ClusterDBSingleStatusFlags,
+        [(ClusterDBSingleStatusFlags.SingleUnavailable, "storage", None)],
+    ),
+}
+
+# 集群访问端口的计算规则，集群类型 -> (实例类型, 实例过滤条件)，取满足条件的第一个实例的端口
+CLUSTER_ACCESS_PORT_RULES = {
+    ClusterType.TenDBSingle.value: ("storage", {}),
+    ClusterType.TenDBHA.value: ("proxy", {}),
+    **{cluster_type: ("proxy", {}) for cluster_type in ClusterType.db_type_to_cluster_types(DBType.Redis)},
+    ClusterType.TenDBCluster.value: (
+        "proxy",
+        {"tendbclusterspiderext__spider_role": TenDBClusterSpiderRole.SPIDER_MASTER},
+    ),
+    ClusterType.Es.value: ("storage", {"instance_role": InstanceRole.ES_MASTER}),
+    ClusterType.Kafka.value: ("storage", {"instance_role": InstanceRole.BROKER}),
+    ClusterType.Hdfs.value: ("storage", {"instance_role": InstanceRole.HDFS_NAME_NODE}),
+    ClusterType.Pulsar.value: ("storage", {"instance_role": InstanceRole.PULSAR_BROKER}),
+    ClusterType.MongoShardedCluster.value: ("proxy", {"machine_type": MachineType.MONGOS}),
+    ClusterType.MongoReplicaSet.value: ("storage", {"machine_type": MachineType.MONGODB}),
+}
+
 
 class Cluster(AuditedModel):
     name = models.CharField(max_length=64, default="", help_text=_("集群英文名"))
@@ -172,40 +215,59 @@ class Cluster(AuditedModel):
 
     @property
     def __status_flag(self):
-        if self.cluster_type == ClusterType.TenDBHA.value:
-            flag_obj = ClusterDBHAStatusFlags(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
-                flag_obj |= ClusterDBHAStatusFlags.ProxyUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
-                flag_obj |= ClusterDBHAStatusFlags.BackendMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
-                flag_obj |= ClusterDBHAStatusFlags.BackendSlaveUnavailable
-        elif self.cluster_type == ClusterType.TenDBCluster.value:
-            flag_obj = ClusterTenDBClusterStatusFlag(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
-                flag_obj |= ClusterTenDBClusterStatusFlag.SpiderUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
-                flag_obj |= ClusterTenDBClusterStatusFlag.RemoteMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
-                flag_obj |= ClusterTenDBClusterStatusFlag.RemoteSlaveUnavailable
-        elif self.cluster_type == ClusterType.TenDBSingle.value:
-            flag_obj = ClusterDBSingleStatusFlags(0)
-            if self.storageinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
-                flag_obj |= ClusterDBSingleStatusFlags.SingleUnavailable
-        else:
+        # 批量查询时可以通过 fill_status_flags 预先计算
+        if hasattr(self, "_cached_status_flag"):
+            return self._cached_status_flag
+
+        if self.cluster_type not in CLUSTER_STATUS_FLAG_RULES:
             logger.debug(_("{} 未实现 status flag,".format(self.cluster_type)))
-            flag_obj = ClusterStatusFlags(0)
+            return ClusterStatusFlags(0)
+
+        flag_cls, rules = CLUSTER_STATUS_FLAG_RULES[self.cluster_type]
+        flag_obj = flag_cls(0)
+        for flag, instance_type, instance_inner_role in rules:
+            instances = getattr(self, f"{instance_type}instance_set").filter(status=InstanceStatus.UNAVAILABLE.value)
+            if instance_inner_role:
+                instances = instances.filter(instance_inner_role=instance_inner_role)
+            if instances.exists():
+                flag_obj |= flag
 
         return flag_obj
 
+    @classmethod
+    def fill_status_flags(cls, clusters: Iterable["Cluster"]) -> Dict[int, ClusterStatusFlags]:
+        """
+        批量计算集群的状态位并缓存到集群对象上，查询次数与集群数量无关
+        @param clusters: 集群对象列表
+        """
+        clusters = list(clusters)
+        cluster_ids = [cluster.id for cluster in clusters]
+
+        # 查询出各集群下不可用实例的角色，proxy 不区分角色
+        unavailable_roles: Dict[str, Dict[int, set]] = {"proxy": defaultdict(set), "storage": defaultdict(set)}
+        unavailable_proxies = cls.objects.filter(
+            id__in=cluster_ids, proxyinstance__status=InstanceStatus.UNAVAILABLE.value
+        ).values_list("id", flat=True)
+        for cluster_id in unavailable_proxies.distinct():
+            unavailable_roles["proxy"][cluster_id].add(None)
+        unavailable_storages = cls.objects.filter(
+            id__in=cluster_ids, storageinstance__status=InstanceStatus.UNAVAILABLE.value
+        ).values_list("id", "storageinstance__instance_inner_role")
+        for cluster_id, instance_inner_role in unavailable_storages.distinct():
+            unavailable_roles["storage"][cluster_id].add(instance_inner_role)
+
+        cluster_status_flags: Dict[int, ClusterStatusFlags] = {}
+        for cluster in clusters:
+            flag_cls, rules = CLUSTER_STATUS_FLAG_RULES.get(cluster.cluster_type, (ClusterStatusFlags, []))
+            flag_obj = flag_cls(0)
+            for flag, instance_type, instance_inner_role in rules:
+                roles = unavailable_roles[instance_type][cluster.id]
+                if (instance_inner_role is None and roles) or instance_inner_role in roles:
+                    flag_obj |= flag
+            cluster._cached_status_flag = cluster_status_flags[cluster.id] = flag_obj
+
+        return cluster_status_flags
+
     @property
     def status_flag(self):
         return self.__status_flag.value
@@ -227,7 +289,7 @@ class Cluster(AuditedModel):
     @property
     def access_port(self) -> int:
         """
-        获取集群的访问端口，如果要批量查询，请使用prefetch预存instance得queryset
+        获取集群的访问端口，如果要批量查询，请使用 fill_access_ports 预先计算
         tendbsingle: 只有一台机器，直接取那个port
         tendbha, redis: 取proxy的一台port
         tendbcluster: 主域名取spider master的port   从域名取spider slave的port
@@ -240,32 +302,65 @@ class Cluster(AuditedModel):
         mongo_replicaset: 去存储节点的port
         sqlserver: ?
         """
+        if hasattr(self, "_cached_access_port"):
+            return self._cached_access_port
+
+        if self.cluster_type == ClusterType.Riak:
+            return DEFAULT_RIAK_PORT
+        if self.cluster_type not in CLUSTER_ACCESS_PORT_RULES:
+            return None
+
+        instance_type, filters = CLUSTER_ACCESS_PORT_RULES[self.cluster_type]
         try:
-            if self.cluster_type == ClusterType.TenDBSingle:
-                return self.storageinstance_set.first().port
-            elif self.cluster_type in [ClusterType.TenDBHA, *ClusterType.db_type_to_cluster_types(DBType.Redis)]:
-                return self.proxyinstance_set.first().port
-            elif self.cluster_type == ClusterType.TenDBCluster:
-                spider_master_filter = Q(tendbclusterspiderext__spider_role=TenDBClusterSpiderRole.SPIDER_MASTER)
-                return self.proxyinstance_set.filter(spider_master_filter).first().port
-            elif self.cluster_type == ClusterType.Es:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.ES_MASTER).first().port
-            elif self.cluster_type == ClusterType.Kafka:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.BROKER).first().port
-            elif self.cluster_type == ClusterType.Hdfs:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.HDFS_NAME_NODE).first().port
-            elif self.cluster_type == ClusterType.Pulsar:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.PULSAR_BROKER).first().port
-            elif self.cluster_type == ClusterType.Riak:
-                return DEFAULT_RIAK_PORT
-            elif self.cluster_type == ClusterType.MongoShardedCluster:
-                return self.proxyinstance_set.filter(machine_type=MachineType.MONGOS).first().port
-            elif self.cluster_type == ClusterType.MongoReplicaSet:
-                return self.storageinstance_set.filter(machine_type=MachineType.MONGODB).first().port
+            return getattr(self, f"{instance_type}instance_set").filter(**filters).first().port
         except AttributeError:
             logger.warning(_("无法访问集群[]的访问端口，请检查实例信息").format(self.name))
             return 0
 
+    @classmethod
+    def fill_access_ports(cls, clusters: Iterable["Cluster"]) -> Dict[int, int]:
+        """
+        批量计算集群的访问端口并缓存到集群对象上，proxy 和 storage 各查询一次
+        @param clusters: 集群对象列表
+        """
+        clusters = list(clusters)
+
+        # 按实例类型合并各集群类型的过滤条件
+        instance_filters: Dict[str, Q] = {"proxy": Q(), "storage": Q()}
+        for cluster_type in {cluster.cluster_type for cluster in clusters}:
+            if cluster_type not in CLUSTER_ACCESS_PORT_RULES:
+                continue
+            instance_type, filters = CLUSTER_ACCESS_PORT_RULES[cluster_type]
+            instance_filters[instance_type] |= Q(
+                cluster_type=cluster_type, **{f"{instance_type}instance__{key}": val for key, val in filters.items()}
+            )
+
+        # 实例默认按创建时间倒序，与单个集群查询时 first() 取到的实例保持一致
+        first_ports: Dict[int, int] = {}
+        for instance_type, instance_filter in instance_filters.items():
+            if not instance_filter:
+                continue
+            instance_ports = (
+                cls.objects.filter(instance_filter, id__in=[cluster.id for cluster in clusters])
+                .order_by(f"-{instance_type}instance__create_at")
+                .values_list("id", f"{instance_type}instance__port")
+            )
+            for cluster_id, port in instance_ports:
+                if port is not None:
+                    first_ports.setdefault(cluster_id, port)
+
+        cluster_access_ports: Dict[int, int] = {}
+        for cluster in clusters:
+            if cluster.cluster_type == ClusterType.Riak:
+                access_port = DEFAULT_RIAK_PORT
+            elif cluster.cluster_type not in CLUSTER_ACCESS_PORT_RULES:
+                access_port = None
+            else:
+                access_port = first_ports.get(cluster.id, 0)
+            cluster._cached_access_port = cluster_access_ports[cluster.id] = access_port
+
+        return cluster_access_ports
+
     def get_partition_port(self):
         """
         获取集群在分区管理的端口号
@@ -10,19 +10,25 @@ specific language governing permissions and limitations under the License.
 """
 import gzip
 import io
+import itertools
 import json
 from dataclasses import asdict
+from typing import Callable, Dict, Iterable
 
+from django.core.cache import cache
 from django.db import models
 from django.forms import model_to_dict
 from django.utils.translation import ugettext_lazy as _
 
+from backend.bk_web.constants import CACHE_5MIN
 from backend.bk_web.models import AuditedModel
 from backend.components import CCApi
-from backend.constants import CommonHostDBMeta
+from backend.constants import QUERY_CMDB_LIMIT, CommonHostDBMeta
 from backend.db_meta.enums import AccessLayer, ClusterType, MachineType
 from backend.db_meta.exceptions import HostDoseNotExistInCmdbException
 from backend.db_meta.models import AppCache, BKCity
+from backend.utils.basic import chunk_lists
+from backend.utils.batch_request import request_multi_thread
 from backend.utils.string import base64_encode
 
 
@@ -61,6 +67,14 @@ class Machine(AuditedModel):
 
     @property
     def dbm_meta(self) -> dict:
+        return self.get_dbm_meta()
+
+    def get_dbm_meta(self, get_app_attr: Callable = None) -> dict:
+        """
+        生成主机的 dbm_meta 属性
+        @param get_app_attr: 获取业务英文缩写的方法，批量生成时可以传入带缓存的实现，避免重复查询 AppCache
+        """
+        get_app_attr = get_app_attr or AppCache.get_app_attr
         proxies = self.proxyinstance_set.all()
         storages = self.storageinstance_set.all()
 
@@ -87,7 +101,7 @@ class Machine(AuditedModel):
                 host_labels.append(
                     asdict(
                         CommonHostDBMeta(
-                            app=AppCache.get_app_attr(cluster.bk_biz_id, default=cluster.bk_biz_id),
+                            app=get_app_attr(cluster.bk_biz_id, default=cluster.bk_biz_id),
                             appid=str(cluster.bk_biz_id),
                             cluster_type=cluster.cluster_type,
                             cluster_domain=cluster.immute_domain,
@@ -107,7 +121,7 @@ class Machine(AuditedModel):
                 host_labels.append(
                     asdict(
                         CommonHostDBMeta(
-                            app=AppCache.get_app_attr(storage.bk_biz_id, default=storage.bk_biz_id),
+                            app=get_app_attr(storage.bk_biz_id, default=storage.bk_biz_id),
                             appid=str(storage.bk_biz_id),
                             cluster_domain=storage.machine.ip,
                             cluster_type=storage.cluster_type,
@@ -123,7 +137,7 @@ class Machine(AuditedModel):
                 host_labels.append(
                     asdict(
                         CommonHostDBMeta(
-                            app=AppCache.get_app_attr(cluster.bk_biz_id, default=cluster.bk_biz_id),
+                            app=get_app_attr(cluster.bk_biz_id, default=cluster.bk_biz_id),
                             appid=str(cluster.bk_biz_id),
                             cluster_domain=cluster.immute_domain,
                             cluster_type=cluster.cluster_type,
@@ -136,45 +150,90 @@ class Machine(AuditedModel):
 
         return {"version": "v2", "content": compress_dbm_meta_content({"common": {}, "custom": host_labels})}
 
+    # 主机的 CMDB 信息缓存，详情页会重复查询同一批主机
+    CMDB_HOST_INFO_CACHE_KEY = "cmdb_host_info"
+    CMDB_HOST_FIELDS = [
+        "bk_host_id",
+        "bk_os_name",
+        "bk_host_innerip",
+        "idc_city_name",
+        "sub_zone",
+        "rack",
+        "bk_svr_device_cls_name",
+        "bk_idc_area",
+        "idc_name",
+        "idc_id",
+        "bk_cloud_name",
+        "net_device_id",
+        "bk_cpu",
+        "bk_disk",
+        "bk_mem",
+        "bk_agent_id",
+    ]
+
     @classmethod
-    def get_host_info_from_cmdb(cls, bk_host_id: int) -> dict:
-        """获取主机的基本信息"""
-        host_info = CCApi.list_hosts_without_biz(
+    def batch_get_host_info_from_cmdb(
+        cls, bk_host_ids: Iterable[int], use_cache: bool = True, cache_time: int = CACHE_5MIN
+    ) -> Dict[int, dict]:
+        """
+        批量获取主机的基本信息: 主机ID去重后优先读取缓存，未命中的主机按分页大小分批并发查询 CMDB
+        @param bk_host_ids: 主机ID列表
+        @param use_cache: 是否读取缓存，查询结果总会写入缓存
+        @param cache_time: 缓存时间
+        @return: {bk_host_id: host_info}，CMDB 中不存在的主机不会出现在结果中
+        """
+        cache_keys = {int(bk_host_id): f"{cls.CMDB_HOST_INFO_CACHE_KEY}:{bk_host_id}" for bk_host_id in bk_host_ids}
+        host_infos: Dict[int, dict] = {}
+        if use_cache:
+            cached_host_infos = cache.get_many(list(cache_keys.values()))
+            host_infos = {
+                bk_host_id: cached_host_infos[key]
+                for bk_host_id, key in cache_keys.items()
+                if key in cached_host_infos
+            }
+
+        missing_host_ids = sorted(set(cache_keys) - set(host_infos))
+        if not missing_host_ids:
+            return host_infos
+
+        params_list = [
             {
-                "fields": [
-                    "bk_host_id",
-                    "bk_os_name",
-                    "bk_host_innerip",
-                    "idc_city_name",
-                    "sub_zone",
-                    "rack",
-                    "bk_svr_device_cls_name",
-                    "bk_idc_area",
-                    "idc_name",
-                    "idc_id",
-                    "bk_cloud_name",
-                    "net_device_id",
-                    "bk_cpu",
-                    "bk_disk",
-                    "bk_mem",
-                    "bk_agent_id",
-                ],
-                "host_property_filter": {
-                    "condition": "AND",
-                    "rules": [
-                        {"field": "bk_host_id", "operator": "equal", "value": bk_host_id},
-                    ],
-                },
+                "params": {
+                    "fields": cls.CMDB_HOST_FIELDS,
+                    "host_property_filter": {
+                        "condition": "AND",
+                        "rules": [{"field": "bk_host_id", "operator": "in", "value": host_ids}],
+                    },
+                    "page": {"start": 0, "limit": QUERY_CMDB_LIMIT},
+                }
             }
+            for host_ids in chunk_lists(missing_host_ids, QUERY_CMDB_LIMIT)
+        ]
+        fetched_host_infos: Dict[int, dict] = {}
+        host_info_chunks = request_multi_thread(
+            CCApi.list_hosts_without_biz, params_list, get_data=lambda x: x["info"]
+        )
+        for host_info in itertools.chain.from_iterable(host_info_chunks):
+            if host_info["bk_host_id"] not in cache_keys:
+                continue
+            # 格式化idc信息
+            host_info = dict(host_info)
+            host_info["bk_idc_name"] = host_info.pop("idc_name", "")
+            host_info["bk_idc_id"] = host_info.pop("idc_id", "")
+            fetched_host_infos[host_info["bk_host_id"]] = host_info
+
+        cache.set_many(
+            {cache_keys[bk_host_id]: host_info for bk_host_id, host_info in fetched_host_infos.items()}, cache_time
         )
+        host_infos.update(fetched_host_infos)
+        return host_infos
 
+    @classmethod
+    def get_host_info_from_cmdb(cls, bk_host_id: int, use_cache: bool = True) -> dict:
+        """获取主机的基本信息"""
         try:
-            exact_host_info = host_info["info"][0]
-            # 格式化idc信息
-            exact_host_info["bk_idc_name"] = exact_host_info.pop("idc_name", "")
-            exact_host_info["bk_idc_id"] = exact_host_info.pop("idc_id", "")
-            return exact_host_info
-        except IndexError:
+            return cls.batch_get_host_info_from_cmdb([bk_host_id], use_cache=use_cache)[int(bk_host_id)]
+        except KeyError:
             raise HostDoseNotExistInCmdbException(bk_host_id=bk_host_id)
 
     @classmethod
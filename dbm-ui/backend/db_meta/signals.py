@@ -8,10 +8,22 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from typing import Union
+import hashlib
+import logging
+from typing import Dict, Iterable, Union
 
 from backend.db_meta.enums import ClusterStatus
-from backend.db_meta.models import ProxyInstance, StorageInstance
+from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("root")
+
+# 待同步 dbm_meta 的主机集合
+HOST_DBMETA_DIRTY_KEY = "host_dbmeta:dirty"
+# 主机最近一次推送到 CMDB 的 dbm_meta 内容摘要
+HOST_DBMETA_HASH_KEY = "host_dbmeta:pushed_hash"
+# 影响主机 dbm_meta 的集群字段
+CLUSTER_DBMETA_FIELDS = {"bk_biz_id", "immute_domain", "cluster_type"}
 
 
 def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance], **kwargs):
@@ -21,7 +33,9 @@ def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance
     if kwargs.get("created"):
         return
     # 仅在实例状态变更时，同步更新集群状态
-    for cluster in instance.cluster.all():
+    clusters = list(instance.cluster.all())
+    Cluster.fill_status_flags(clusters)
+    for cluster in clusters:
         # 忽略临时集群
         if cluster.status == ClusterStatus.TEMPORARY.value:
             return
@@ -33,3 +47,78 @@ def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance
         if origin_status != target_status:
             cluster.status = target_status
             cluster.save(update_fields=["status"])
+
+
+def mark_host_dbmeta_dirty(bk_host_ids: Iterable[int]):
+    """
+    标记主机的 dbm_meta 需要重新同步，由 sync_dirty_host_dbmeta 增量推送到 CMDB
+    标记失败不影响业务数据的变更，遗漏的主机由 update_host_dbmeta 定期全量对账补齐
+    """
+    # 0为默认的无效machine
+    bk_host_ids = {bk_host_id for bk_host_id in bk_host_ids if bk_host_id}
+    if not bk_host_ids:
+        return
+    try:
+        RedisConn.sadd(HOST_DBMETA_DIRTY_KEY, *bk_host_ids)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("[mark_host_dbmeta_dirty] mark dirty failed: %s (%s)", bk_host_ids, e)
+
+
+def get_dbm_meta_hash(cc_dbm_meta: str) -> str:
+    return hashlib.md5(cc_dbm_meta.encode("utf-8")).hexdigest()
+
+
+def record_host_dbmeta_pushed(host_dbm_metas: Dict[int, str]):
+    """
+    记录主机已推送到 CMDB 的 dbm_meta 内容摘要，内容未变化的脏主机在增量同步时会被跳过
+    @param host_dbm_metas: 主机ID -> 已推送的 dbm_meta(json 字符串)
+    """
+    if not host_dbm_metas:
+        return
+    try:
+        RedisConn.hset(
+            HOST_DBMETA_HASH_KEY,
+            mapping={bk_host_id: get_dbm_meta_hash(dbm_meta) for bk_host_id, dbm_meta in host_dbm_metas.items()},
+        )
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("[record_host_dbmeta_pushed] record failed: %s (%s)", list(host_dbm_metas), e)
+
+
+def get_cluster_bk_host_ids(cluster_ids: Iterable[int]):
+    return list(StorageInstance.objects.filter(cluster__in=cluster_ids).values_list("machine_id", flat=True)) + list(
+        ProxyInstance.objects.filter(cluster__in=cluster_ids).values_list("machine_id", flat=True)
+    )
+
+
+def mark_instance_dbmeta_dirty(sender, instance: Union[StorageInstance, ProxyInstance], **kwargs):
+    """实例新增、变更或删除时，标记所在主机的 dbm_meta 需要同步"""
+    mark_host_dbmeta_dirty([instance.machine_id])
+
+
+def mark_machine_dbmeta_dirty(sender, instance: Machine, **kwargs):
+    mark_host_dbmeta_dirty([instance.bk_host_id])
+
+
+def mark_cluster_dbmeta_dirty(sender, instance: Cluster, **kwargs):
+    """集群的业务、域名等信息变更时，标记集群所有主机的 dbm_meta 需要同步"""
+    update_fields = kwargs.get("update_fields")
+    if kwargs.get("created") or (update_fields and not CLUSTER_DBMETA_FIELDS & set(update_fields)):
+        return
+    mark_host_dbmeta_dirty(get_cluster_bk_host_ids([instance.id]))
+
+
+def mark_cluster_relation_dbmeta_dirty(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """实例与集群的关联关系变更时，标记相关主机的 dbm_meta 需要同步"""
+    # clear 操作在 post_clear 时已无法获取被清理的关联，因此在 pre_clear 时标记
+    if action not in ["post_add", "post_remove", "pre_clear"]:
+        return
+
+    if not reverse:
+        # instance 为实例
+        mark_host_dbmeta_dirty([instance.machine_id])
+    elif action == "pre_clear":
+        # instance 为集群
+        mark_host_dbmeta_dirty(get_cluster_bk_host_ids([instance.id]))
+    else:
+        # instance 为集群，pk_set 为实例 ID
+        mark_host_dbmeta_dirty(model.objects.filter(id__in=pk_set).values_list("machine_id", flat=True))
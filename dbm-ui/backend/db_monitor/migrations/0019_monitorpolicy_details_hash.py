@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("db_monitor", "0018_auto_20231120_1654"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="monitorpolicy",
+            name="details_hash",
+            field=models.CharField(default="", max_length=32, verbose_name="最近一次同步到监控的策略详情摘要"),
+        ),
+    ]
@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import copy
 import datetime
+import hashlib
 import json
 import logging
 from collections import defaultdict
@@ -467,7 +468,14 @@ class DispatchGroup(AuditedModel):
 class MonitorPolicy(AuditedModel):
     """监控策略"""
 
-    KEEPED_FIELDS = [*AuditedModel.AUDITED_FIELDS, "id", "is_enabled", "monitor_policy_id", "policy_status"]
+    KEEPED_FIELDS = [
+        *AuditedModel.AUDITED_FIELDS,
+        "id",
+        "is_enabled",
+        "monitor_policy_id",
+        "policy_status",
+        "details_hash",
+    ]
 
     parent_id = models.IntegerField(verbose_name=_("父级策略ID，0代表父级"), default=0)
     parent_details = models.JSONField(verbose_name=_("父级策略模板详情，可用于还原"), default=dict)
@@ -572,6 +580,7 @@ class MonitorPolicy(AuditedModel):
     )
 
     monitor_policy_id = models.BigIntegerField(verbose_name=_("蓝鲸监控策略ID"), default=0)
+    details_hash = models.CharField(verbose_name=_("最近一次同步到监控的策略详情摘要"), max_length=LEN_SHORT, default="")
 
     # 支持版本管理
     version = models.IntegerField(verbose_name=_("版本"), default=0)
@@ -770,15 +779,58 @@ class MonitorPolicy(AuditedModel):
 
         return details
 
+    def calc_details_hash(self, details) -> str:
+        """
+        计算策略详情的摘要，用于判断策略是否需要重新同步到监控
+        同步后本地详情会被监控返回的详情覆盖(回填策略ID、更新时间等)，因此只对 DBM 渲染的字段及模板版本计算摘要，
+        保证按模板重新渲染和加载已同步的策略重新保存时，内容未变化的策略摘要一致
+        """
+        content = {
+            "version": self.version,
+            "name": details.get("name"),
+            "priority": details.get("priority"),
+            "labels": sorted(details.get("labels", [])),
+            "notice": {
+                "signal": details["notice"].get("signal"),
+                "user_groups": details["notice"].get("user_groups"),
+                "assign_mode": details["notice"].get("options", {}).get("assign_mode"),
+            },
+            "items": [
+                {
+                    "target": item.get("target"),
+                    "algorithms": item.get("algorithms"),
+                    "query_configs": [
+                        {key: query_config.get(key) for key in ["agg_condition", "promql", "metric_id"]}
+                        for query_config in item["query_configs"]
+                    ],
+                }
+                for item in details["items"]
+            ],
+        }
+        return hashlib.md5(json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         """保存策略对象的同时，同步记录到监控"""
 
-        # step1. sync to model
         # 启停操作(["is_enabled"]) -> 跳过重复的patch
-        details = self.details if update_fields == ["is_enabled"] else self.patch_all()
+        details_hash = None
+        if update_fields == ["is_enabled"]:
+            details = self.details
+        else:
+            # step1. sync to model
+            details = self.patch_all()
+
+            # 渲染后的策略与上次同步到监控的一致时，仅保存到本地
+            details_hash = self.calc_details_hash(details)
+            if self.monitor_policy_id and details_hash == self.details_hash:
+                logger.info("skip sync unchanged policy to bkm: %s", self.name)
+                super().save(force_insert, force_update, using, update_fields)
+                return
 
         # step2. sync to bkm
         res = bkm_save_alarm_strategy(details)
+        if details_hash:
+            self.details_hash = details_hash
 
         # overwrite by bkm strategy details
         self.details = res
@@ -11,8 +11,16 @@ specific language governing permissions and limitations under the License.
 
 
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class DBPackageConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "backend.db_package"
+
+    def ready(self):
+        from .models import Package
+
+        # 介质包变更时刷新各进程的介质包清单
+        post_save.connect(Package.refresh_manifest, sender=Package)
+        post_delete.connect(Package.refresh_manifest, sender=Package)
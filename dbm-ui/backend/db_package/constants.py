@@ -18,6 +18,8 @@ from blue_krill.data_types.enum import EnumField, StructuredEnum
 
 DB_PACKAGE_TAG = "db_package"
 PARSE_FILE_EXT = re.compile(r"^.*?[.](?P<ext>tar\.gz|tar\.bz2|\w+)$")
+# 介质包清单的版本号，介质变更时自增，各进程据此判断本地清单是否过期
+PACKAGE_MANIFEST_VERSION_KEY = "db_package:manifest_version"
 
 
 class PackageMode(str, StructuredEnum):
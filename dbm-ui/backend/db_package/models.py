@@ -8,19 +8,23 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from typing import Optional
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 
 import django.utils.timezone as timezone
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
 from django.utils.translation import ugettext_lazy as _
 
 from backend.bk_web.constants import LEN_LONG, LEN_NORMAL, LEN_SHORT
 from backend.bk_web.models import AuditedModel
 from backend.configuration.constants import DBType
-from backend.db_package.constants import PackageMode, PackageType
+from backend.db_package.constants import PACKAGE_MANIFEST_VERSION_KEY, PackageMode, PackageType
 from backend.db_package.exceptions import PackageNotExistException
 from backend.flow.consts import MediumEnum
+from backend.utils.cache import VersionedSnapshot
+
+# 已启用介质包的进程内清单，介质变更时通过版本号通知各进程重新加载
+_PACKAGE_MANIFEST = VersionedSnapshot(PACKAGE_MANIFEST_VERSION_KEY)
 
 
 class Package(AuditedModel):
@@ -46,6 +50,38 @@ class Package(AuditedModel):
         verbose_name = _("介质包（Package）")
         ordering = ("-create_at",)
 
+    @classmethod
+    def manifest_snapshot(cls) -> VersionedSnapshot:
+        """获取介质包清单的进程内快照"""
+        return _PACKAGE_MANIFEST
+
+    @classmethod
+    def get_manifest(cls) -> Dict[Tuple[str, str, str], List["Package"]]:
+        """
+        获取已启用介质包的清单，一次查询加载全部介质包，按 (db_type, pkg_type, version) 分组，组内按更新时间倒序
+        version 为 MediumEnum.Latest 的分组包含该类型下的全部版本
+        """
+
+        def _load_manifest():
+            manifest = defaultdict(list)
+            for package in cls.objects.filter(enable=True).order_by("-update_at", "-id"):
+                manifest[(package.db_type, package.pkg_type, package.version)].append(package)
+                if package.version != MediumEnum.Latest:
+                    manifest[(package.db_type, package.pkg_type, MediumEnum.Latest)].append(package)
+            return dict(manifest)
+
+        return cls.manifest_snapshot().get("manifest", _load_manifest)
+
+    @classmethod
+    def refresh_manifest(cls, *args, **kwargs):
+        """
+        介质包变更后刷新清单：当前进程的清单立即失效，事务提交后再自增版本号通知其他进程
+        可直接作为 post_save/post_delete 的信号处理函数，bulk_create/update 等不触发信号的批量操作需要手动调用
+        """
+        snapshot = cls.manifest_snapshot()
+        snapshot.clear()
+        transaction.on_commit(snapshot.bump)
+
     @classmethod
     def get_latest_package(
         cls,
@@ -56,21 +92,21 @@ class Package(AuditedModel):
         name: Optional[str] = None,
     ) -> "Package":
         """
-        根据版本和包类型获取最新的介质包
+        根据版本和包类型获取最新的介质包，从进程内的介质包清单中查找
+        注意：返回的介质包在进程内共享，调用方不能修改
         """
-        if version == MediumEnum.Latest:
-            # 引进制品版本管理后，默认最新版就是最近上传的介质
-            packages = cls.objects.filter(pkg_type=pkg_type, db_type=db_type, enable=True)
-        else:
-            packages = cls.objects.filter(version=version, pkg_type=pkg_type, db_type=db_type, enable=True)
+        # 引进制品版本管理后，默认最新版就是最近上传的介质
+        packages = cls.get_manifest().get((db_type, pkg_type, version), [])
         if bk_biz_id:
             # 过滤出灰度的业务以及无指定业务的包
-            allow_biz_filter = Q(allow_biz_ids__contains=bk_biz_id) | Q(allow_biz_ids__isnull=True)
-            packages = packages.filter(allow_biz_filter, enable=True)
+            packages = [
+                package
+                for package in packages
+                if package.allow_biz_ids is None or bk_biz_id in package.allow_biz_ids
+            ]
 
         if not packages:
             raise PackageNotExistException(version=version, pkg_type=pkg_type, db_type=db_type)
 
         # 取最新的版本
-        package = packages.order_by("-update_at").first()
-        return package
+        return packages[0]
@@ -104,6 +104,8 @@ class DBPackageViewSet(viewsets.AuditedModelViewSet):
         with atomic():
             old_packages.delete()
             Package.objects.bulk_create([Package(**info) for info in sync_medium_infos])
+            # bulk_create 不会触发信号，需要手动刷新介质包清单
+            Package.refresh_manifest()
 
         return Response()
 
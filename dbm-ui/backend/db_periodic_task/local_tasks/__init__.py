@@ -15,6 +15,7 @@ from backend.db_periodic_task.local_tasks.db_monitor import *
 from backend.db_periodic_task.local_tasks.db_proxy import *
 from backend.db_periodic_task.local_tasks.dbmon_heartbeat import *
 from backend.db_periodic_task.local_tasks.mysql_backup import *
+from backend.db_periodic_task.local_tasks.quick_search import *
 from backend.db_periodic_task.local_tasks.randomize_password import *
 from backend.db_periodic_task.local_tasks.redis_autofix import *
 from backend.db_periodic_task.local_tasks.redis_backup import *
@@ -9,20 +9,32 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
+import functools
 import json
 import logging
 
+from celery.schedules import crontab
+from django.db.models import QuerySet
 from django.utils import timezone
 
 from backend import env
 from backend.components import CCApi
 from backend.configuration.constants import SystemSettingsEnum
 from backend.configuration.models import SystemSettings
-from backend.db_meta.models import Cluster, Machine
+from backend.db_meta.models import AppCache, Cluster, Machine
 from backend.db_meta.models.cluster_monitor import SyncFailedMachine
+from backend.db_meta.signals import (
+    HOST_DBMETA_DIRTY_KEY,
+    HOST_DBMETA_HASH_KEY,
+    get_dbm_meta_hash,
+    mark_host_dbmeta_dirty,
+    record_host_dbmeta_pushed,
+)
+from backend.db_periodic_task.local_tasks.register import register_periodic_task
 from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 from backend.dbm_init.constants import CC_HOST_DBM_ATTR
 from backend.dbm_init.services import Services
+from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("celery")
 
@@ -59,7 +71,7 @@ def reset_host_dbmeta(bk_biz_id=env.DBA_APP_BK_BIZ_ID, bk_host_ids=None):
         try:
             logger.info("[reset_host_dbmeta] batch_update_host: %s", updates)
             CCApi.batch_update_host({"update": updates}, use_admin=True)
-        except Exception as e:  # pylint: disable=wildcard-import
+        except Exception as e:  # pylint: disable=broad-except
             failed_hosts.extend(updates)
             logger.error("[reset_host_dbmeta] batch reset exception: %s (%s)", updates, e)
 
@@ -67,7 +79,7 @@ def reset_host_dbmeta(bk_biz_id=env.DBA_APP_BK_BIZ_ID, bk_host_ids=None):
     for fail_host in failed_hosts:
         try:
             CCApi.update_host({"bk_host_id": fail_host["bk_host_id"], "data": fail_host["properties"]}, use_admin=True)
-        except Exception as e:  # pylint: disable=wildcard-import
+        except Exception as e:  # pylint: disable=broad-except
             logger.error("[reset_host_dbmeta] single reset error: %s (%s)", fail_host, e)
 
     logger.info(
@@ -77,11 +89,115 @@ def reset_host_dbmeta(bk_biz_id=env.DBA_APP_BK_BIZ_ID, bk_host_ids=None):
     )
 
 
-# @register_periodic_task(run_every=crontab(hour="*/6"))
+def push_host_dbmeta(machines: QuerySet, dbm_meta=None, force: bool = False) -> int:
+    """
+    计算主机的 dbm_meta 并推送到 CMDB
+    - 每台主机最近一次推送成功的 dbm_meta 内容摘要记录在 redis 中，内容未变化的主机不会重复推送
+    - 集群和实例信息通过 prefetch 批量查询，避免逐台主机查询
+    @param machines: 待同步的主机
+    @param dbm_meta: 指定推送的 dbm_meta，为空时根据主机的集群信息生成
+    @param force: 是否忽略内容摘要强制推送
+    @return: 实际推送的主机数量
+    """
+    machines = machines.prefetch_related(
+        "proxyinstance_set__cluster",
+        "proxyinstance_set__tendbclusterspiderext",
+        "storageinstance_set__cluster",
+        "storageinstance_set__machine",
+    )
+    get_app_attr = functools.lru_cache(maxsize=None)(AppCache.get_app_attr)
+
+    # 批量更新接口限制最多500条，这里取456条
+    step_size = 456
+    updated_hosts, failed_updates = [], []
+    machine_count = machines.count()
+    for step in range(machine_count // step_size + 1):
+        batch_machines = list(machines[step * step_size : (step + 1) * step_size])
+        pushed_hashes = RedisConn.hmget(HOST_DBMETA_HASH_KEY, [machine.bk_host_id for machine in batch_machines])
+
+        updates, pushed_dbm_metas = [], {}
+        for machine, pushed_hash in zip(batch_machines, pushed_hashes):
+            cc_dbm_meta = json.dumps(machine.get_dbm_meta(get_app_attr) if dbm_meta is None else dbm_meta)
+            dbm_meta_hash = get_dbm_meta_hash(cc_dbm_meta)
+            if not force and dbm_meta_hash == pushed_hash:
+                continue
+            updates.append({"properties": {CC_HOST_DBM_ATTR: cc_dbm_meta}, "bk_host_id": machine.bk_host_id})
+            pushed_dbm_metas[machine.bk_host_id] = cc_dbm_meta
+
+        if not updates:
+            continue
+
+        updated_hosts.extend(updates)
+        res = CCApi.batch_update_host({"update": updates}, use_admin=True, raw=True)
+        # proxy request failed - 1199036
+        # failed to request http://bkauth - 1306000
+        # 权限校验失败 - 1199048
+        if res.get("code") not in [0, 1199036, 1199048, 1306000]:
+            logger.error("[update_host_dbmeta] batch update failed: %s (%s)", updates, res.get("code"))
+            failed_updates.extend(updates)
+            continue
+        record_host_dbmeta_pushed(pushed_dbm_metas)
+
+    # 容错处理：逐个更新，避免批量更新误伤有效ip
+    for fail_update in failed_updates:
+        try:
+            CCApi.update_host(
+                {"bk_host_id": fail_update["bk_host_id"], "data": fail_update["properties"]}, use_admin=True
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            # 记录异常ip，下次任务直接排除掉，尽量走批量更新
+            SyncFailedMachine.objects.get_or_create(bk_host_id=fail_update["bk_host_id"], error=str(e))
+            logger.error("[update_host_dbmeta] single update error: %s (%s)", fail_update, e)
+        else:
+            record_host_dbmeta_pushed({fail_update["bk_host_id"]: fail_update["properties"][CC_HOST_DBM_ATTR]})
+
+    return len(updated_hosts)
+
+
+@register_periodic_task(run_every=crontab(minute="*/1"))
+def sync_dirty_host_dbmeta(batch_size: int = 2000):
+    """
+    增量同步 dbm_meta 发生变更的主机
+    只处理被标记为脏数据的主机，并且只推送内容确实发生变化的主机。
+    CcManage.update_host_properties 推送成功后同样会记录内容摘要，因此单据流程中已推送的主机在这里会被跳过，
+    这里只补齐单据流程之外的元数据变更(如手动修改元数据、集群改名等)
+    """
+    now = datetime.datetime.now(timezone.utc)
+    bk_host_ids = [int(bk_host_id) for bk_host_id in RedisConn.spop(HOST_DBMETA_DIRTY_KEY, batch_size) or []]
+    if not bk_host_ids:
+        return
+
+    failed_host_ids = SyncFailedMachine.objects.values_list("bk_host_id", flat=True)
+    machines = Machine.objects.filter(bk_host_id__in=bk_host_ids).exclude(bk_host_id__in=failed_host_ids)
+    try:
+        updated_cnt = push_host_dbmeta(machines)
+    except Exception:
+        # 同步异常时重新标记，等待下一轮处理
+        mark_host_dbmeta_dirty(bk_host_ids)
+        raise
+
+    # 已下架的主机无需再维护推送记录
+    removed_host_ids = set(bk_host_ids) - set(
+        Machine.objects.filter(bk_host_id__in=bk_host_ids).values_list("bk_host_id", flat=True)
+    )
+    if removed_host_ids:
+        RedisConn.hdel(HOST_DBMETA_HASH_KEY, *removed_host_ids)
+
+    logger.info(
+        "[sync_dirty_host_dbmeta] finish sync end: %s, dirty_cnt: %s, update_cnt: %s",
+        datetime.datetime.now(timezone.utc) - now,
+        len(bk_host_ids),
+        updated_cnt,
+    )
+
+
+@register_periodic_task(run_every=crontab(minute=0, hour="*/6"))
 def update_host_dbmeta(bk_biz_id=None, cluster_id=None, bk_host_ids=None, dbm_meta=None):
     """
-    更新集群主机的dbm_meta属性
-    TODO 应该挪到转移主机的时候做，每两分钟对全量主机更新一次 db_meta，太频繁了
+    更新集群主机的dbm_meta属性，定期全量对账，只推送内容有变化的主机
+    日常的变更由 CcManage.update_host_properties 推送，遗漏的变更由 sync_dirty_host_dbmeta 增量补齐，
+    queryset.update/bulk_create 等不触发信号的变更则由这里兜底
+    指定 dbm_meta 时(如下架集群时清空主机属性)会强制推送
     """
 
     # 初始化主机自定义属性，用于system数据拷贝
@@ -120,40 +236,10 @@ def update_host_dbmeta(bk_biz_id=None, cluster_id=None, bk_host_ids=None, dbm_me
     if bk_host_ids:
         machines = machines.filter(bk_host_id__in=bk_host_ids)
 
-    # 批量更新接口限制最多500条，这里取456条
-    step_size = 456
-    updated_hosts, failed_updates = [], []
-    machine_count = machines.count()
-    for step in range(machine_count // step_size + 1):
-        updates = []
-        for machine in machines[step * step_size : (step + 1) * step_size]:
-            cc_dbm_meta = machine.dbm_meta if dbm_meta is None else dbm_meta
-            updates.append(
-                {"properties": {CC_HOST_DBM_ATTR: json.dumps(cc_dbm_meta)}, "bk_host_id": machine.bk_host_id}
-            )
-
-        updated_hosts.extend(updates)
-        res = CCApi.batch_update_host({"update": updates}, use_admin=True, raw=True)
-        # proxy request failed - 1199036
-        # failed to request http://bkauth - 1306000
-        # 权限校验失败 - 1199048
-        if res.get("code") not in [0, 1199036, 1199048, 1306000]:
-            logger.error("[update_host_dbmeta] batch update failed: %s (%s)", updates, res.get("code"))
-            failed_updates.extend(updates)
-
-    # 容错处理：逐个更新，避免批量更新误伤有效ip
-    for fail_update in failed_updates:
-        try:
-            CCApi.update_host(
-                {"bk_host_id": fail_update["bk_host_id"], "data": fail_update["properties"]}, use_admin=True
-            )
-        except Exception as e:  # pylint: disable=wildcard-import
-            # 记录异常ip，下次任务直接排除掉，尽量走批量更新
-            SyncFailedMachine.objects.get_or_create(bk_host_id=fail_update["bk_host_id"], error=str(e))
-            logger.error("[update_host_dbmeta] single update error: %s (%s)", fail_update, e)
+    updated_cnt = push_host_dbmeta(machines, dbm_meta=dbm_meta, force=dbm_meta is not None)
 
     logger.info(
         "[update_host_dbmeta] finish update end: %s, update_cnt: %s",
         datetime.datetime.now(timezone.utc) - now,
-        len(updated_hosts),
+        updated_cnt,
     )
@@ -78,8 +78,8 @@ def sync_plat_monitor_policy():
     now = datetime.datetime.now(timezone.utc)
     logger.warning("[sync_plat_monitor_policy] sync bkm alarm policy start: %s", now)
 
-    # 逐个json导入，本地+远程
-    updated_policies = 0
+    # 逐个json解析
+    templates = []
     for root, dirs, files in os.walk(TPLS_ALARM_DIR):
         if skip_dir in dirs:
             dirs.remove(skip_dir)
@@ -98,48 +98,56 @@ def sync_plat_monitor_policy():
                 deleted = template_dict.pop("deleted", False)
 
                 # patch template
-                template_dict["details"]["labels"] = list(set(template_dict["details"]["labels"]))
+                # 标签排序后再下发，保证相同模板渲染出的策略详情一致，以便跳过未变更的策略
+                template_dict["details"]["labels"] = sorted(set(template_dict["details"]["labels"]))
                 template_dict["details"]["name"] = policy_name
                 template_dict["details"]["priority"] = TargetPriority.PLATFORM.value
                 # 平台策略仅开启基于分派通知
                 template_dict["details"]["notice"]["options"]["assign_mode"] = ["by_rule"]
 
-                policy = MonitorPolicy(**template_dict)
-
-            policy_name = policy.name
-            logger.info("[sync_plat_monitor_policy] start sync bkm alarm policy: %s " % policy_name)
-            try:
-                synced_policy = MonitorPolicy.objects.get(
-                    bk_biz_id=policy.bk_biz_id, db_type=policy.db_type, name=policy_name
-                )
+                templates.append((MonitorPolicy(**template_dict), deleted))
 
-                if deleted:
-                    logger.info("[sync_plat_monitor_policy] delete old alarm: %s " % policy_name)
-                    synced_policy.delete()
-                    continue
+    # 一次性查询已同步的策略，避免逐个模板查询
+    synced_policies = {
+        (synced_policy.bk_biz_id, synced_policy.db_type, synced_policy.name): synced_policy
+        for synced_policy in MonitorPolicy.objects.filter(name__in=[policy.name for policy, __ in templates])
+    }
 
-                if synced_policy.version >= policy.version:
-                    logger.info("[sync_plat_monitor_policy] skip same version alarm: %s " % policy_name)
-                    continue
+    # 逐个策略导入，本地+远程
+    updated_policies = 0
+    for policy, deleted in templates:
+        policy_name = policy.name
+        logger.info("[sync_plat_monitor_policy] start sync bkm alarm policy: %s " % policy_name)
+        synced_policy = synced_policies.get((policy.bk_biz_id, policy.db_type, policy_name))
+        if synced_policy is None:
+            logger.info("[sync_plat_monitor_policy] create bkm alarm policy: %s " % policy_name)
+        else:
+            if deleted:
+                logger.info("[sync_plat_monitor_policy] delete old alarm: %s " % policy_name)
+                synced_policy.delete()
+                continue
 
-                for keeped_field in MonitorPolicy.KEEPED_FIELDS:
-                    setattr(policy, keeped_field, getattr(synced_policy, keeped_field))
+            if synced_policy.version >= policy.version:
+                logger.info("[sync_plat_monitor_policy] skip same version alarm: %s " % policy_name)
+                continue
 
-                policy.details["id"] = synced_policy.monitor_policy_id
-                logger.info("[sync_plat_monitor_policy] update bkm alarm policy: %s " % policy_name)
-            except MonitorPolicy.DoesNotExist:
-                logger.info("[sync_plat_monitor_policy] create bkm alarm policy: %s " % policy_name)
+            for keeped_field in MonitorPolicy.KEEPED_FIELDS:
+                setattr(policy, keeped_field, getattr(synced_policy, keeped_field))
 
-            try:
-                # fetch targets/test_rules/notify_rules/notify_groups from parent details
-                for attr, value in policy.parse_details().items():
-                    setattr(policy, attr, value)
+            policy.details["id"] = synced_policy.monitor_policy_id
+            logger.info("[sync_plat_monitor_policy] update bkm alarm policy: %s " % policy_name)
 
-                policy.save()
-                updated_policies += 1
-                logger.error("[sync_plat_monitor_policy] save bkm alarm policy success: %s", policy_name)
-            except BkMonitorSaveAlarmException as e:
-                logger.error("[sync_plat_monitor_policy] save bkm alarm policy failed: %s, %s ", policy_name, e)
+        try:
+            # fetch targets/test_rules/notify_rules/notify_groups from parent details
+            for attr, value in policy.parse_details().items():
+                setattr(policy, attr, value)
+
+            # 渲染后的策略详情没有变化时，save 只更新本地记录，不会重复下发到监控
+            policy.save()
+            updated_policies += 1
+            logger.error("[sync_plat_monitor_policy] save bkm alarm policy success: %s", policy_name)
+        except BkMonitorSaveAlarmException as e:
+            logger.error("[sync_plat_monitor_policy] save bkm alarm policy failed: %s, %s ", policy_name, e)
 
     logger.warning(
         "[sync_plat_monitor_policy] finish sync bkm alarm policy end: %s, update_cnt: %s",
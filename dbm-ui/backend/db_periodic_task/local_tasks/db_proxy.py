@@ -22,6 +22,7 @@ from backend import env
 from backend.components import JobApi
 from backend.configuration.constants import DBType
 from backend.core.consts import BK_PUSH_CONFIG_PAYLOAD
+from backend.db_meta.exceptions import HostDoseNotExistInCmdbException
 from backend.db_meta.models import Machine
 from backend.db_periodic_task.local_tasks import register_periodic_task
 from backend.db_proxy import nginxconf_tpl
@@ -80,12 +81,17 @@ def fill_cluster_service_nginx_conf():
         # 获取下发nginx conf的机器 TODO: 后续要改为clb的地址进行转发
         proxy = DBCloudProxy.objects.filter(bk_cloud_id=cloud_id).last()
         nginx_extensions = DBExtension.get_extension_in_cloud(bk_cloud_id=cloud_id, extension_type=ExtensionType.NGINX)
-        # 获取nginx的bk_agent_id(兼容gse2.0的agent查询)
-        for nginx_extension in nginx_extensions:
-            if "bk_agent_id" not in nginx_extension.details:
-                host_info = Machine.get_host_info_from_cmdb(bk_host_id=nginx_extension.details["bk_host_id"])
-                nginx_extension.details["bk_agent_id"] = host_info.get("bk_agent_id", "")
-                nginx_extension.save(update_fields=["details"])
+        # 获取nginx的bk_agent_id(兼容gse2.0的agent查询)，缺失agent信息的主机统一批量查询
+        missing_agent_extensions = [ext for ext in nginx_extensions if "bk_agent_id" not in ext.details]
+        host_infos = Machine.batch_get_host_info_from_cmdb(
+            [ext.details["bk_host_id"] for ext in missing_agent_extensions]
+        )
+        for nginx_extension in missing_agent_extensions:
+            bk_host_id = int(nginx_extension.details["bk_host_id"])
+            if bk_host_id not in host_infos:
+                raise HostDoseNotExistInCmdbException(bk_host_id=bk_host_id)
+            nginx_extension.details["bk_agent_id"] = host_infos[bk_host_id].get("bk_agent_id", "")
+            nginx_extension.save(update_fields=["details"])
 
         manage_port = nginx_extensions.first().details["manage_port"]
         file_list: List[Dict[str, str]] = []
@@ -14,9 +14,15 @@ from typing import Dict, List
 
 from backend import env
 from backend.components.bklog.client import BKLogApi
+from backend.utils.batch_request import request_multi_thread
 from backend.utils.string import pascal_to_snake
 from backend.utils.time import datetime2str
 
+# 单次查询日志平台的记录数上限
+BKLOG_QUERY_SIZE = 6000
+# 批量查询备份记录时，单次查询的集群数
+BACKUP_LOG_QUERY_CLUSTER_BATCH = 50
+
 
 def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> List[Dict]:
     """
@@ -34,7 +40,7 @@ def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> Li
             # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
             "query_string": query_string,
             "start": 0,
-            "size": 6000,
+            "size": BKLOG_QUERY_SIZE,
             "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
         },
         use_admin=True,
@@ -47,6 +53,82 @@ def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> Li
     return backup_logs
 
 
+def _format_backup_log(log: Dict) -> Dict:
+    """将日志平台的全备记录转换为备份信息"""
+    return {
+        "bk_biz_id": log["bk_biz_id"],
+        "backup_id": log["backup_id"],
+        "cluster_domain": log["cluster_address"],
+        "cluster_id": log["cluster_id"],
+        "mysql_host": log["backup_host"],
+        "mysql_port": log["backup_port"],
+        "mysql_role": log["mysql_role"],
+        "backup_type": log["backup_type"],
+        "file_list": log["file_list"],
+        "data_schema_grant": log["data_schema_grant"],
+        "is_full_backup": log["is_full_backup"],
+        "total_filesize": log["total_filesize"],
+        "encrypt_enable": log["encrypt_enable"],
+        "mysql_version": log["mysql_version"],
+        "backup_begin_time": log["backup_begin_time"],
+        "backup_end_time": log["backup_end_time"],
+        "backup_consistent_time": log["backup_consistent_time"],
+        "shard_value": log["shard_value"],
+    }
+
+
+def _query_backup_log_by_domains(
+    cluster_domains: List[str], start_time: datetime.datetime, end_time: datetime.datetime
+) -> Dict[str, List[Dict]]:
+    """
+    一次查询多个集群的全备备份记录，按集群域名分组
+    查询结果达到单次查询的上限时可能被截断，此时将集群拆成两半分别重新查询
+    """
+    backup_logs = _get_log_from_bklog(
+        collector="mysql_dbbackup_result",
+        start_time=start_time,
+        end_time=end_time,
+        query_string=" OR ".join(f'log: "cluster_address: \\"{domain}\\""' for domain in cluster_domains),
+    )
+    if len(backup_logs) >= BKLOG_QUERY_SIZE and len(cluster_domains) > 1:
+        middle = len(cluster_domains) // 2
+        return {
+            **_query_backup_log_by_domains(cluster_domains[:middle], start_time, end_time),
+            **_query_backup_log_by_domains(cluster_domains[middle:], start_time, end_time),
+        }
+
+    domain_backup_logs: Dict[str, List[Dict]] = {domain: [] for domain in cluster_domains}
+    for log in backup_logs:
+        # 只保留本次查询的集群，忽略日志平台模糊匹配到的其他集群
+        if log["cluster_address"] in domain_backup_logs:
+            domain_backup_logs[log["cluster_address"]].append(_format_backup_log(log))
+    return domain_backup_logs
+
+
+def query_backup_log_from_bklog(
+    cluster_domains: List[str], start_time: datetime.datetime, end_time: datetime.datetime
+) -> Dict[str, List[Dict]]:
+    """
+    批量查询集群的时间范围内的全备备份记录，按集群域名分组
+    每次查询 BACKUP_LOG_QUERY_CLUSTER_BATCH 个集群，多批之间并发查询
+    :param cluster_domains: 集群域名列表
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    """
+    params_list = [
+        {
+            "cluster_domains": cluster_domains[i : i + BACKUP_LOG_QUERY_CLUSTER_BATCH],
+            "start_time": start_time,
+            "end_time": end_time,
+        }
+        for i in range(0, len(cluster_domains), BACKUP_LOG_QUERY_CLUSTER_BATCH)
+    ]
+    domain_backup_logs: Dict[str, List[Dict]] = {}
+    for backup_logs in request_multi_thread(_query_backup_log_by_domains, params_list, get_data=lambda x: x):
+        domain_backup_logs.update(backup_logs)
+    return domain_backup_logs
+
+
 class ClusterBackup:
     """
     集群前一天备份信息，包括全备和binlog
@@ -64,7 +146,6 @@ class ClusterBackup:
         :param start_time: 开始时间
         :param end_time: 结束时间
         """
-        backup_files = []
         backup_logs = _get_log_from_bklog(
             collector="mysql_dbbackup_result",
             start_time=start_time,
@@ -72,29 +153,7 @@ class ClusterBackup:
             # query_string=f'log: "cluster_id: {self.cluster_id}"',
             query_string=f'log: "cluster_address: \\"{self.cluster_domain}\\""',
         )
-        for log in backup_logs:
-            bf = {
-                "bk_biz_id": log["bk_biz_id"],
-                "backup_id": log["backup_id"],
-                "cluster_domain": log["cluster_address"],
-                "cluster_id": log["cluster_id"],
-                "mysql_host": log["backup_host"],
-                "mysql_port": log["backup_port"],
-                "mysql_role": log["mysql_role"],
-                "backup_type": log["backup_type"],
-                "file_list": log["file_list"],
-                "data_schema_grant": log["data_schema_grant"],
-                "is_full_backup": log["is_full_backup"],
-                "total_filesize": log["total_filesize"],
-                "encrypt_enable": log["encrypt_enable"],
-                "mysql_version": log["mysql_version"],
-                "backup_begin_time": log["backup_begin_time"],
-                "backup_end_time": log["backup_end_time"],
-                "backup_consistent_time": log["backup_consistent_time"],
-                "shard_value": log["shard_value"],
-            }
-            backup_files.append(bf)
-        return backup_files
+        return [_format_backup_log(log) for log in backup_logs]
 
     def query_binlog_from_bklog(self, start_time: datetime.datetime, end_time: datetime.datetime) -> List[Dict]:
         """
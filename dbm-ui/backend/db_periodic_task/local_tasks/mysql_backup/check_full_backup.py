@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import List, Tuple
 
 from django.utils import timezone
 
@@ -19,10 +20,13 @@ from backend.db_meta.models import Cluster
 from backend.db_report.enums import MysqlBackupCheckSubType
 from backend.db_report.models import MysqlBackupCheckReport
 
-from .bklog_query import ClusterBackup
+from .bklog_query import ClusterBackup, query_backup_log_from_bklog
 
 logger = logging.getLogger("root")
 
+# 巡检报告批量写入的批次大小
+REPORT_BULK_CREATE_BATCH = 500
+
 
 def get_last_date_time():
     now_time = datetime.now(timezone.utc)
@@ -84,57 +88,61 @@ def _build_backup_info_files(backups_info: []):
     return backups
 
 
-def _check_tendbha_full_backup():
+def _query_cluster_backups(cluster_type: str) -> List[Tuple[Cluster, ClusterBackup]]:
     """
-    tendbha 必须有一份完整的备份
+    批量查询某类集群前一天的全备信息
     """
     start_time, end_time = get_last_date_time()
     logger.info(
         "====  start check full backup for cluster type {}, time range[{},{}] ====".format(
-            ClusterType.TenDBHA, start_time, end_time
+            cluster_type, start_time, end_time
         )
     )
-    for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBHA):
-        logger.info("==== start check full backup for cluster {} ====".format(c.immute_domain))
+    clusters = list(Cluster.objects.filter(cluster_type=cluster_type))
+    domain_backup_logs = query_backup_log_from_bklog([c.immute_domain for c in clusters], start_time, end_time)
+
+    cluster_backups = []
+    for c in clusters:
         backup = ClusterBackup(c.id, c.immute_domain)
+        backup.backups = _build_backup_info_files(domain_backup_logs.get(c.immute_domain, []))
+        cluster_backups.append((c, backup))
+    return cluster_backups
 
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
-        backup.backups = _build_backup_info_files(items)
 
+def _check_tendbha_full_backup():
+    """
+    tendbha 必须有一份完整的备份
+    """
+    reports = []
+    for c, backup in _query_cluster_backups(ClusterType.TenDBHA):
+        logger.info("==== start check full backup for cluster {} ====".format(c.immute_domain))
         for bid, bk in backup.backups.items():
             if bk.is_full_backup == 1:
                 if bk.file_index and bk.file_tar:
                     backup.success = True
                     break
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBHA,
-                status=False,
-                msg="no success full backup found",
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=ClusterType.TenDBHA,
+                    status=False,
+                    msg="no success full backup found",
+                    subtype=MysqlBackupCheckSubType.FullBackup.value,
+                )
             )
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=REPORT_BULK_CREATE_BATCH)
 
 
 def _check_tendbcluster_full_backup():
     """
     tendbcluster 集群必须有完整的备份
     """
-    start_time, end_time = get_last_date_time()
-    logger.info(
-        "==== start check full backup for cluster type {}, time range[{},{}] ====".format(
-            ClusterType.TenDBCluster, start_time, end_time
-        )
-    )
-
-    for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBCluster):
+    reports = []
+    for c, backup in _query_cluster_backups(ClusterType.TenDBCluster):
         logger.info("==== start check full backup for cluster {} ====".format(c.immute_domain))
-        backup = ClusterBackup(c.id, c.immute_domain)
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
-        backup.backups = _build_backup_info_files(items)
-
         backup_id_stat = defaultdict(list)
         backup_id_invalid = {}
         for bid, bk in backup.backups.items():
@@ -155,12 +163,15 @@ def _check_tendbcluster_full_backup():
                 break
 
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBCluster,
-                status=False,
-                msg="no success full backup found:{}".format(message),
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=ClusterType.TenDBCluster,
+                    status=False,
+                    msg="no success full backup found:{}".format(message),
+                    subtype=MysqlBackupCheckSubType.FullBackup.value,
+                )
             )
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=REPORT_BULK_CREATE_BATCH)
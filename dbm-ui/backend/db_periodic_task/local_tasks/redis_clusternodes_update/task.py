@@ -35,7 +35,7 @@ from backend.db_services.redis.autofix.models import (
 )
 from backend.flow.consts import DEFAULT_REDIS_START_PORT, RedisRole
 from backend.flow.utils.dns_manage import DnsManage
-from backend.flow.utils.redis.redis_cluster_nodes import ClusterNodeData, decode_cluster_nodes
+from backend.flow.utils.redis.redis_cluster_nodes import ClusterNodeData, ClusterNodes
 from backend.flow.utils.redis.redis_module_operate import RedisCCTopoOperator
 from backend.ticket.constants import TicketType
 from backend.ticket.models.ticket import ClusterOperateRecord
@@ -185,8 +185,9 @@ class RedisClusterNodesUpdateJob:
         self.role_updated_instances: List[Dict] = []
 
     def decode_raw_nodes_data(self):
-        _, self.addr_to_cluster_node = decode_cluster_nodes(self.task_row.report_nodes_data)
-        self.nodeid_to_cluster_node = {node.node_id: node for node in self.addr_to_cluster_node.values()}
+        cluster_nodes = ClusterNodes.parse(self.task_row.report_nodes_data)
+        self.addr_to_cluster_node = cluster_nodes.addr_to_node
+        self.nodeid_to_cluster_node = cluster_nodes.node_id_to_node
 
     def update_node_status(self, meta_obj: StorageInstance, cluster_node: ClusterNodeData):
         """
@@ -299,7 +300,7 @@ class RedisClusterNodesUpdateJob:
             and slave_node
             and slave_node.is_running()
             and slave_node.get_role() == RedisRole.MASTER.value
-            and len(slave_node.slots) > 0
+            and slave_node.slot_cnt > 0
         ):
             # meta中的master节点实际还是master角色,但是状态异常,且他原本的slave节点成了master角色并负责slots
             # 那么说明发生了 master 故障且没有拉起来的情况
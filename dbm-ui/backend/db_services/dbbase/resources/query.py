@@ -9,11 +9,11 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import abc
-from typing import Any, Callable, Dict, List, Tuple, Union
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 
 import attr
 from django.db.models import F, Prefetch, Q, QuerySet
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.utils.http import urlquote
 from django.utils.translation import ugettext_lazy as _
 
@@ -25,11 +25,16 @@ from backend.db_services.dbbase.instances.handlers import InstanceHandler
 from backend.db_services.ipchooser.handlers.host_handler import HostHandler
 from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 from backend.flow.utils.dns_manage import DnsManage
+from backend.ticket.constants import InstanceType
 from backend.ticket.models import ClusterOperateRecord
 from backend.utils.excel import ExcelHandler
 from backend.utils.time import datetime2str
 
 
+# 导出时每批查询的对象数量
+EXPORT_CHUNK_SIZE = 500
+
+
 @attr.s
 class ResourceList:
     count = attr.ib(validator=attr.validators.instance_of(int))
@@ -63,17 +68,26 @@ class CommonQueryResourceMixin(abc.ABC):
         return entry_details
 
     @staticmethod
-    def common_query_cluster(bk_biz_id: int, cluster_types: list, cluster_ids: list) -> Tuple[List[Dict], List[Dict]]:
-        """集群的通用属性查询"""
+    def _iter_queryset_chunks(queryset: QuerySet, chunk_size: int) -> Iterator[List]:
+        """按主键分批遍历查询集，每批单独执行 prefetch，避免一次性加载全部对象"""
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id).order_by("id")[:chunk_size])
+            if not chunk:
+                break
+            yield chunk
+            last_id = chunk[-1].id
+
+    @classmethod
+    def iter_query_cluster(
+        cls, bk_biz_id: int, cluster_types: list, cluster_ids: list, chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> Tuple[List[Dict], Iterator[Dict]]:
+        """集群的通用属性查询，返回表头和按批查询的集群信息迭代器"""
         # 获取所有符合条件的集群对象
-        clusters = Cluster.objects.prefetch_related(
-            "storageinstance_set", "proxyinstance_set", "storageinstance_set__machine", "proxyinstance_set__machine"
-        ).filter(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types)
+        clusters = Cluster.objects.filter(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types)
         if cluster_ids:
             clusters = clusters.filter(id__in=cluster_ids)
 
-        cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids=list(clusters.values_list("id", flat=True)))
-
         # 初始化用于存储Excel数据的字典列表
         headers = [
             {"id": "cluster_id", "name": _("集群 ID")},
@@ -86,6 +100,16 @@ class CommonQueryResourceMixin(abc.ABC):
             {"id": "region", "name": _("地域")},
             {"id": "disaster_tolerance_level", "name": _("容灾级别")},
         ]
+        # 流式写入前需要确定全部表头，因此预先查询出集群包含的实例角色
+        roles = list(
+            StorageInstance.objects.filter(cluster__in=clusters)
+            .order_by("instance_role")
+            .values_list("instance_role", flat=True)
+            .distinct()
+        )
+        if ProxyInstance.objects.filter(cluster__in=clusters).exists():
+            roles.append(InstanceType.PROXY.value)
+        headers.extend([{"id": role, "name": role} for role in roles])
 
         def fill_instances_to_cluster_info(
             _cluster_info: Dict, instances: List[Union[StorageInstance, ProxyInstance]]
@@ -98,40 +122,52 @@ class CommonQueryResourceMixin(abc.ABC):
                 role = ins.instance_role
 
                 # 如果该角色已经存在于集群信息字典中，则添加新的IP和端口；否则，更新字典的值
-                if role in cluster_info:
-                    cluster_info[role] += f"\n{ins.machine.ip}#{ins.port}"
+                if role in _cluster_info:
+                    _cluster_info[role] += f"\n{ins.machine.ip}#{ins.port}"
                 else:
-                    role_header = {"id": role, "name": role}
-                    if role_header not in headers:
-                        headers.append(role_header)
-                    cluster_info[role] = f"{ins.machine.ip}#{ins.port}"
-
-        # 遍历所有的集群对象
-        data_list = []
-        for cluster in clusters:
-            # 创建一个空字典来保存当前集群的信息
-            cluster_info = {
-                "cluster_id": cluster.id,
-                "cluster_name": cluster.name,
-                "cluster_alias": cluster.alias,
-                "cluster_type": cluster.cluster_type,
-                "master_domain": cluster.immute_domain,
-                "slave_domain": cluster_entry_map[cluster.id].get("slave_domain", ""),
-                "major_version": cluster.major_version,
-                "region": cluster.region,
-                "disaster_tolerance_level": cluster.get_disaster_tolerance_level_display(),
-            }
-            fill_instances_to_cluster_info(cluster_info, cluster.storageinstance_set.all())
-            fill_instances_to_cluster_info(cluster_info, cluster.proxyinstance_set.all())
-
-            # 将当前集群的信息追加到data_list列表中
-            data_list.append(cluster_info)
-
-        return headers, data_list
+                    _cluster_info[role] = f"{ins.machine.ip}#{ins.port}"
+
+        def iter_cluster_infos():
+            clusters_with_instances = clusters.prefetch_related(
+                "storageinstance_set",
+                "proxyinstance_set",
+                "storageinstance_set__machine",
+                "proxyinstance_set__machine",
+            )
+            for cluster_chunk in cls._iter_queryset_chunks(clusters_with_instances, chunk_size):
+                cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids=[c.id for c in cluster_chunk])
+                for cluster in cluster_chunk:
+                    # 创建一个空字典来保存当前集群的信息
+                    cluster_info = {
+                        "cluster_id": cluster.id,
+                        "cluster_name": cluster.name,
+                        "cluster_alias": cluster.alias,
+                        "cluster_type": cluster.cluster_type,
+                        "master_domain": cluster.immute_domain,
+                        "slave_domain": cluster_entry_map[cluster.id].get("slave_domain", ""),
+                        "major_version": cluster.major_version,
+                        "region": cluster.region,
+                        "disaster_tolerance_level": cluster.get_disaster_tolerance_level_display(),
+                    }
+                    fill_instances_to_cluster_info(cluster_info, cluster.storageinstance_set.all())
+                    fill_instances_to_cluster_info(cluster_info, cluster.proxyinstance_set.all())
+                    yield cluster_info
+
+        return headers, iter_cluster_infos()
 
-    @staticmethod
-    def common_query_instance(bk_biz_id: int, cluster_types: list, bk_host_ids: list) -> Tuple[List[Dict], List[Dict]]:
-        """实例通用属性查询"""
+    @classmethod
+    def common_query_cluster(
+        cls, bk_biz_id: int, cluster_types: list, cluster_ids: list
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """集群的通用属性查询"""
+        headers, cluster_infos = cls.iter_query_cluster(bk_biz_id, cluster_types, cluster_ids)
+        return headers, list(cluster_infos)
+
+    @classmethod
+    def iter_query_instance(
+        cls, bk_biz_id: int, cluster_types: list, bk_host_ids: list, chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> Tuple[List[Dict], Iterator[Dict]]:
+        """实例通用属性查询，返回表头和按批查询的实例信息迭代器"""
         query_condition = Q(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types)
         if bk_host_ids:
             query_condition = query_condition & Q(machine__bk_host_id__in=bk_host_ids)
@@ -156,55 +192,66 @@ class CommonQueryResourceMixin(abc.ABC):
             {"id": "master_domain", "name": _("主域名")},
             {"id": "major_version", "name": _("主版本")},
         ]
-        # 插入数据
-        data_list = []
-        for instances in [storages, proxies]:
-            for ins in instances:
-                for cluster in ins.cluster.all():
-                    data_list.append(
-                        {
-                            "bk_host_id": ins.machine.bk_host_id,
-                            "bk_cloud_id": ins.machine.bk_cloud_id,
-                            "ip": ins.machine.ip,
-                            "ip_port": ins.ip_port,
-                            "instance_role": ins.instance_role,
-                            "bk_idc_city_name": ins.machine.bk_city.bk_idc_city_name,
-                            "bk_idc_name": ins.machine.bk_idc_name,
-                            "cluster_id": cluster.id,
-                            "cluster_name": cluster.name,
-                            "cluster_alias": cluster.alias,
-                            "cluster_type": cluster.cluster_type,
-                            "master_domain": cluster.immute_domain,
-                            "major_version": cluster.major_version,
-                        }
-                    )
-
-        return headers, data_list
-
-    @classmethod
-    def export_cluster(cls, bk_biz_id: int, cluster_ids: list) -> HttpResponse:
+
+        def iter_instance_infos():
+            for instances in [storages, proxies]:
+                for instance_chunk in cls._iter_queryset_chunks(instances, chunk_size):
+                    for ins in instance_chunk:
+                        for cluster in ins.cluster.all():
+                            yield {
+                                "bk_host_id": ins.machine.bk_host_id,
+                                "bk_cloud_id": ins.machine.bk_cloud_id,
+                                "ip": ins.machine.ip,
+                                "ip_port": ins.ip_port,
+                                "instance_role": ins.instance_role,
+                                "bk_idc_city_name": ins.machine.bk_city.bk_idc_city_name,
+                                "bk_idc_name": ins.machine.bk_idc_name,
+                                "cluster_id": cluster.id,
+                                "cluster_name": cluster.name,
+                                "cluster_alias": cluster.alias,
+                                "cluster_type": cluster.cluster_type,
+                                "master_domain": cluster.immute_domain,
+                                "major_version": cluster.major_version,
+                            }
+
+        return headers, iter_instance_infos()
+
+    @classmethod
+    def common_query_instance(
+        cls, bk_biz_id: int, cluster_types: list, bk_host_ids: list
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """实例通用属性查询"""
+        headers, instance_infos = cls.iter_query_instance(bk_biz_id, cluster_types, bk_host_ids)
+        return headers, list(instance_infos)
+
+    @classmethod
+    def export_cluster(cls, bk_biz_id: int, cluster_ids: list) -> StreamingHttpResponse:
         """集群通用属性导出"""
-        headers, data_list = cls.common_query_cluster(bk_biz_id, cls.cluster_types, cluster_ids)
+        headers, cluster_infos = cls.iter_query_cluster(bk_biz_id, cls.cluster_types, cluster_ids)
 
         biz_name = AppCache.get_biz_name(bk_biz_id)
         db_type = ClusterType.cluster_type_to_db_type(cls.cluster_types[0])
-        wb = ExcelHandler.serialize(data_list, headers=headers, match_header=True)
-
-        return ExcelHandler.response(
-            wb, urlquote(_("{export_prefix}集群列表.xlsx").format(export_prefix=f"{biz_name}[{bk_biz_id}]{db_type}"))
+        return ExcelHandler.stream_response(
+            cluster_infos,
+            headers=headers,
+            excel_name=urlquote(
+                _("{export_prefix}集群列表.xlsx").format(export_prefix=f"{biz_name}[{bk_biz_id}]{db_type}")
+            ),
         )
 
     @classmethod
-    def export_instance(cls, bk_biz_id: int, bk_host_ids: list) -> HttpResponse:
+    def export_instance(cls, bk_biz_id: int, bk_host_ids: list) -> StreamingHttpResponse:
         """实例通用属性导出"""
-        headers, data_list = cls.common_query_instance(bk_biz_id, cls.cluster_types, bk_host_ids)
+        headers, instance_infos = cls.iter_query_instance(bk_biz_id, cls.cluster_types, bk_host_ids)
 
         biz_name = AppCache.get_biz_name(bk_biz_id)
         db_type = ClusterType.cluster_type_to_db_type(cls.cluster_types[0])
-        wb = ExcelHandler.serialize(data_list, headers=headers, match_header=True)
-
-        return ExcelHandler.response(
-            wb, urlquote(_("{export_prefix}实例列表.xlsx").format(export_prefix=f"{biz_name}[{bk_biz_id}]{db_type}"))
+        return ExcelHandler.stream_response(
+            instance_infos,
+            headers=headers,
+            excel_name=urlquote(
+                _("{export_prefix}实例列表.xlsx").format(export_prefix=f"{biz_name}[{bk_biz_id}]{db_type}")
+            ),
         )
 
     @classmethod
@@ -466,10 +513,14 @@ class ListRetrieveResource(BaseListRetrieveResource):
             Prefetch("storageinstance_set", queryset=storage_queryset.select_related("machine"), to_attr="storages"),
             "tag_set",
         )
-        cluster_ids = list(cluster_queryset.values_list("id", flat=True))
+        cluster_queryset = list(cluster_queryset)
+        cluster_ids = [cluster.id for cluster in cluster_queryset]
 
         # 获取集群与访问入口的映射
-        cluster_entry_map = ClusterEntry.get_cluster_entry_map([cluster.id for cluster in cluster_queryset])
+        cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids)
+
+        # 批量计算集群的访问端口，避免序列化时每个集群单独查询
+        Cluster.fill_access_ports(cluster_queryset)
 
         # 获取DB模块的映射信息
         db_module_names_map = {
@@ -526,7 +526,7 @@ class ResourceQueryHelper:
         return hosts
 
     @classmethod
-    @func_cache_decorator(cache_time=60 * 60)
+    @func_cache_decorator(cache_time=60 * 60, local_cache_size=16, local_cache_time=60)
     def search_cc_cloud(cls, fields=None):
         """
         查询云区域信息
@@ -12,7 +12,7 @@ import logging
 import typing
 from collections import defaultdict
 
-from django.core.cache import cache
+from backend.utils.cache import SingleFlight
 
 from .. import constants, types
 from ..handlers.base import BaseHandler
@@ -44,12 +44,10 @@ class TopoTool:
     def get_topo_tree_with_count(cls, bk_biz_id: int, return_all: bool = True) -> types.TreeNode:
         topo_tree: types.TreeNode = resource.ResourceQueryHelper.get_topo_tree(bk_biz_id, return_all=return_all)
 
-        # 这个接口较慢，缓存5min
-        cache_key = f"host_topo_relations:{bk_biz_id}"
-        host_topo_relations: typing.List[typing.Dict] = cache.get(cache_key)
-        if not host_topo_relations:
-            host_topo_relations = resource.ResourceQueryHelper.fetch_host_topo_relations(bk_biz_id)
-            cache.set(cache_key, host_topo_relations, cls.CACHE_5MIN)
+        # 这个接口较慢，缓存5min，缓存失效时只允许一个请求回源
+        host_topo_relations: typing.List[typing.Dict] = SingleFlight(
+            f"host_topo_relations:{bk_biz_id}", cls.CACHE_5MIN
+        ).get_or_compute(lambda: resource.ResourceQueryHelper.fetch_host_topo_relations(bk_biz_id))
 
         host_ids_gby_module_id: typing.Dict[int, typing.List[int]] = defaultdict(list)
         for host_topo_relation in host_topo_relations:
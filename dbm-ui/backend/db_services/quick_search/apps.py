@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.apps import AppConfig
+
+
+class QuickSearchConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "backend.db_services.quick_search"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from backend.db_meta.models import Cluster, Machine
+        from backend.db_services.quick_search.signals import (
+            delete_cluster_index,
+            delete_machine_index,
+            delete_task_index,
+            update_cluster_index,
+            update_machine_index,
+            update_task_index,
+        )
+        from backend.flow.models import FlowTree
+
+        # 检索字段变更时同步更新全局搜索索引
+        post_save.connect(update_cluster_index, sender=Cluster)
+        post_delete.connect(delete_cluster_index, sender=Cluster)
+        post_save.connect(update_machine_index, sender=Machine)
+        post_delete.connect(delete_machine_index, sender=Machine)
+        post_save.connect(update_task_index, sender=FlowTree)
+        post_delete.connect(delete_task_index, sender=FlowTree)
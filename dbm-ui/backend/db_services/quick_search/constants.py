@@ -26,3 +26,15 @@ class ResourceType(str, StructuredEnum):
 class FilterType(str, StructuredEnum):
     CONTAINS = EnumField("CONTAINS", _("模糊"))
     EXACT = EnumField("EXACT", _("精确"))
+
+
+# 建立了三元组索引的资源类型，实例的 IP 检索复用主机索引
+INDEXED_RESOURCE_TYPES = [
+    ResourceType.CLUSTER_NAME.value,
+    ResourceType.CLUSTER_DOMAIN.value,
+    ResourceType.MACHINE.value,
+    ResourceType.TASK.value,
+]
+# 索引全量构建完成的标记，未构建完成时检索退化为 LIKE 查询
+QUICK_SEARCH_INDEX_READY_KEY = "quick_search_index_ready"
+QUICK_SEARCH_INDEX_GRAM_SIZE = 3
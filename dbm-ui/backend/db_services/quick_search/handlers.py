@@ -8,13 +8,19 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
 from django.db.models import F, Q
-from django.forms import model_to_dict
+from django.utils.translation import get_language
 
 from backend.components.dbresource.client import DBResourceApi
+from backend.core.translation.context import RespectsLanguage
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
 from backend.db_services.quick_search.constants import FilterType, ResourceType
+from backend.db_services.quick_search.models import QuickSearchIndex
 from backend.flow.models import FlowTree
 from backend.ticket.constants import TicketType
 from backend.ticket.models import Ticket
@@ -36,26 +42,49 @@ class QSearchHandler(object):
                 self.cluster_types.extend(ClusterType.db_type_to_cluster_types(db_type))
 
     def search(self, keyword: str):
-        result = {}
+        keyword_list = split_str_to_list(keyword)
         target_resource_types = self.resource_types or ResourceType.get_values()
-        for target_resource_type in target_resource_types:
-            filter_func = getattr(self, f"filter_{target_resource_type}", None)
-            if callable(filter_func):
-                keyword_list = split_str_to_list(keyword)
-                result[target_resource_type] = filter_func(keyword_list)
+        filter_funcs = {
+            resource_type: getattr(self, f"filter_{resource_type}")
+            for resource_type in target_resource_types
+            if callable(getattr(self, f"filter_{resource_type}", None))
+        }
+        if not filter_funcs:
+            return {}
 
-        return result
+        # 各类资源的检索互不依赖，并发检索，整体耗时取决于最慢的一类而不是所有类别之和
+        with ThreadPoolExecutor(max_workers=min(len(filter_funcs), settings.CONCURRENT_NUMBER)) as ex:
+            futures = {
+                resource_type: ex.submit(
+                    RespectsLanguage(language=get_language())(self._filter_in_thread), filter_func, keyword_list
+                )
+                for resource_type, filter_func in filter_funcs.items()
+            }
+        return {resource_type: future.result() for resource_type, future in futures.items()}
 
-    def generate_filter_for_str(self, filter_key, keyword_list):
+    @staticmethod
+    def _filter_in_thread(filter_func, keyword_list):
+        try:
+            return filter_func(keyword_list)
+        finally:
+            # 子线程会单独建立数据库连接，检索结束后需要主动关闭
+            connection.close()
+
+    def generate_filter_for_str(self, filter_key, keyword_list, index_type=None, id_field="pk"):
         """
         为字符串类型生成过滤函数
+        index_type: 模糊检索时使用的全局搜索索引，索引先缩小候选范围，再由 icontains 校验结果
         """
         if self.filter_type == FilterType.EXACT.value:
             qs = Q(**{f"{filter_key}__in": keyword_list})
         else:
             qs = Q()
             for keyword in keyword_list:
-                qs |= Q(**{f"{filter_key}__icontains": keyword})
+                keyword_qs = Q(**{f"{filter_key}__icontains": keyword})
+                object_ids = QuickSearchIndex.match(index_type, keyword) if index_type else None
+                if object_ids is not None:
+                    keyword_qs &= Q(**{f"{id_field}__in": object_ids})
+                qs |= keyword_qs
         return qs
 
     def common_filter(self, objs, return_type="list", fields=None, limit=None):
@@ -76,19 +105,21 @@ class QSearchHandler(object):
 
     def filter_cluster_name(self, keyword_list: list):
         """过滤集群名"""
-        qs = self.generate_filter_for_str("name", keyword_list)
+        qs = self.generate_filter_for_str("name", keyword_list, ResourceType.CLUSTER_NAME.value)
         objs = Cluster.objects.filter(qs)
         return self.common_filter(objs)
 
     def filter_cluster_domain(self, keyword_list: list):
         """过滤集群域名"""
-        qs = self.generate_filter_for_str("immute_domain", keyword_list)
+        qs = self.generate_filter_for_str("immute_domain", keyword_list, ResourceType.CLUSTER_DOMAIN.value)
         objs = Cluster.objects.filter(qs)
         return self.common_filter(objs)
 
     def filter_instance(self, keyword_list: list):
         """过滤实例"""
-        qs = self.generate_filter_for_str("machine__ip", keyword_list)
+        qs = self.generate_filter_for_str(
+            "machine__ip", keyword_list, ResourceType.MACHINE.value, id_field="machine__bk_host_id"
+        )
         if self.bk_biz_ids:
             qs = Q(bk_biz_id__in=self.bk_biz_ids) & qs
 
@@ -135,7 +166,7 @@ class QSearchHandler(object):
 
     def filter_task(self, keyword_list: list):
         """过滤任务"""
-        qs = self.generate_filter_for_str("root_id", keyword_list)
+        qs = self.generate_filter_for_str("root_id", keyword_list, ResourceType.TASK.value)
         objs = FlowTree.objects.filter(qs)
 
         if self.bk_biz_ids:
@@ -161,7 +192,11 @@ class QSearchHandler(object):
         else:
             qs = Q()
             for keyword in keyword_list:
-                qs |= Q(ip__contains=keyword)
+                keyword_qs = Q(ip__contains=keyword)
+                bk_host_ids = QuickSearchIndex.match(ResourceType.MACHINE.value, keyword)
+                if bk_host_ids is not None:
+                    keyword_qs &= Q(bk_host_id__in=bk_host_ids)
+                qs |= keyword_qs
 
         if self.bk_biz_ids:
             qs = qs & Q(bk_biz_id__in=self.bk_biz_ids)
@@ -169,32 +204,26 @@ class QSearchHandler(object):
         if self.db_types:
             qs = qs & Q(cluster_type__in=self.cluster_types)
 
-        objs = Machine.objects.filter(qs).prefetch_related(
-            "storageinstance_set", "storageinstance_set__cluster", "proxyinstance_set", "proxyinstance_set__cluster"
+        machines = list(
+            Machine.objects.filter(qs)[: self.limit].values(
+                "bk_biz_id", "bk_host_id", "ip", "cluster_type", "spec_id", "bk_cloud_id", "bk_city"
+            )
         )
 
-        # 解析cluster
-        machines = []
-        for obj in objs[: self.limit]:
-            machine = model_to_dict(
-                obj, ["bk_biz_id", "bk_host_id", "ip", "cluster_type", "spec_id", "bk_cloud_id", "bk_city"]
-            )
+        # 一次查询出主机关联的集群，存储实例优先于接入层实例；兼容实例未绑定集群的情况
+        machine_cluster_map = {}
+        bk_host_ids = [machine["bk_host_id"] for machine in machines]
+        for instance_model in [ProxyInstance, StorageInstance]:
+            cluster_infos = instance_model.objects.filter(
+                machine__bk_host_id__in=bk_host_ids, cluster__isnull=False
+            ).values_list("machine__bk_host_id", "cluster__id", "cluster__immute_domain")
+            for bk_host_id, cluster_id, cluster_domain in cluster_infos:
+                machine_cluster_map[bk_host_id] = {"cluster_id": cluster_id, "cluster_domain": cluster_domain}
 
-            # 兼容实例未绑定集群的情况
-            cluster_info = None
-            for instances in [obj.storageinstance_set.all(), obj.proxyinstance_set.all()]:
-                if cluster_info:
-                    break
-                for inst in instances:
-                    if cluster_info:
-                        break
-                    for cluster in inst.cluster.all():
-                        cluster_info = {"cluster_id": cluster.id, "cluster_domain": cluster.immute_domain}
-
-            if cluster_info is None:
-                cluster_info = {"cluster_id": None, "cluster_domain": None}
-            machine.update(cluster_info)
-            machines.append(machine)
+        for machine in machines:
+            machine.update(
+                machine_cluster_map.get(machine["bk_host_id"], {"cluster_id": None, "cluster_domain": None})
+            )
 
         return machines
 
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.19 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="QuickSearchIndex",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "resource_type",
+                    models.CharField(
+                        choices=[
+                            ("cluster_name", "集群名"),
+                            ("cluster_domain", "集群域名"),
+                            ("instance", "实例"),
+                            ("ticket", "单号"),
+                            ("task", "任务"),
+                            ("machine", "主机"),
+                            ("resource_pool", "资源池主机"),
+                        ],
+                        max_length=32,
+                        verbose_name="资源类型",
+                    ),
+                ),
+                ("object_id", models.CharField(max_length=64, verbose_name="对象ID")),
+                ("gram", models.CharField(max_length=3, verbose_name="三元组")),
+            ],
+            options={
+                "verbose_name": "全局搜索索引(QuickSearchIndex)",
+                "verbose_name_plural": "全局搜索索引(QuickSearchIndex)",
+                "unique_together": {("resource_type", "gram", "object_id")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="quicksearchindex",
+            index=models.Index(fields=["resource_type", "object_id"], name="quick_searc_resourc_500a2e_idx"),
+        ),
+    ]
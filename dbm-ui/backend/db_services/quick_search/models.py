@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from typing import Dict, Iterable, Optional, Set
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import BigIntegerField, Count, QuerySet
+from django.db.models.functions import Cast
+from django.utils.translation import ugettext_lazy as _
+
+from backend.db_meta.models import Cluster, Machine
+from backend.db_services.quick_search.constants import (
+    INDEXED_RESOURCE_TYPES,
+    QUICK_SEARCH_INDEX_GRAM_SIZE,
+    QUICK_SEARCH_INDEX_READY_KEY,
+    ResourceType,
+)
+from backend.flow.models import FlowTree
+
+
+def make_grams(value: str) -> Set[str]:
+    """将字符串切分为小写的三元组，包含空白字符的三元组不建索引"""
+    value = (value or "").lower()
+    return {
+        value[index : index + QUICK_SEARCH_INDEX_GRAM_SIZE]
+        for index in range(len(value) - QUICK_SEARCH_INDEX_GRAM_SIZE + 1)
+        if not any(char.isspace() for char in value[index : index + QUICK_SEARCH_INDEX_GRAM_SIZE])
+    }
+
+
+class QuickSearchIndex(models.Model):
+    """
+    全局搜索的三元组倒排索引
+    模糊检索时先通过索引找到包含关键字全部三元组的对象，再用 icontains 校验，避免对大表做全量 LIKE 扫描
+    """
+
+    resource_type = models.CharField(_("资源类型"), max_length=32, choices=ResourceType.get_choices())
+    object_id = models.CharField(_("对象ID"), max_length=64)
+    gram = models.CharField(_("三元组"), max_length=QUICK_SEARCH_INDEX_GRAM_SIZE)
+
+    class Meta:
+        verbose_name = verbose_name_plural = _("全局搜索索引(QuickSearchIndex)")
+        unique_together = ("resource_type", "gram", "object_id")
+        indexes = [models.Index(fields=["resource_type", "object_id"])]
+
+    # 资源类型 -> (模型, 索引字段, 对象ID字段)
+    INDEXED_FIELDS = {
+        ResourceType.CLUSTER_NAME.value: (Cluster, "name", "id"),
+        ResourceType.CLUSTER_DOMAIN.value: (Cluster, "immute_domain", "id"),
+        ResourceType.MACHINE.value: (Machine, "ip", "bk_host_id"),
+        ResourceType.TASK.value: (FlowTree, "root_id", "root_id"),
+    }
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        return bool(cache.get(QUICK_SEARCH_INDEX_READY_KEY))
+
+    @classmethod
+    def update_index(cls, resource_type: str, objects: Dict[str, str]) -> int:
+        """
+        更新一批对象的索引，只写入有变化的对象
+        @param resource_type: 资源类型
+        @param objects: {对象ID: 索引字段的值}
+        @return: 索引发生变化的对象数量
+        """
+        objects = {str(object_id): make_grams(value) for object_id, value in objects.items()}
+        existing_grams: Dict[str, Set[str]] = {}
+        for object_id, gram in cls.objects.filter(resource_type=resource_type, object_id__in=objects).values_list(
+            "object_id", "gram"
+        ):
+            existing_grams.setdefault(object_id, set()).add(gram)
+
+        changed = {object_id: grams for object_id, grams in objects.items() if existing_grams.get(object_id) != grams}
+        if not changed:
+            return 0
+
+        with transaction.atomic():
+            cls.objects.filter(resource_type=resource_type, object_id__in=changed).delete()
+            cls.objects.bulk_create(
+                [
+                    cls(resource_type=resource_type, object_id=object_id, gram=gram)
+                    for object_id, grams in changed.items()
+                    for gram in grams
+                ],
+                batch_size=2000,
+                ignore_conflicts=True,
+            )
+        return len(changed)
+
+    @classmethod
+    def delete_index(cls, resource_type: str, object_ids: Iterable):
+        cls.objects.filter(resource_type=resource_type, object_id__in=[str(i) for i in object_ids]).delete()
+
+    @classmethod
+    def rebuild(cls, batch_size: int = 1000) -> Dict[str, int]:
+        """全量对账索引，用于初始化和兜底修正未触发信号的变更(如 queryset.update)"""
+        changed_count = {}
+        for resource_type in INDEXED_RESOURCE_TYPES:
+            model, field, id_field = cls.INDEXED_FIELDS[resource_type]
+            changed_count[resource_type] = 0
+            last_id = None
+            while True:
+                objs = model.objects.order_by(id_field)
+                if last_id is not None:
+                    objs = objs.filter(**{f"{id_field}__gt": last_id})
+                rows = list(objs.values_list(id_field, field)[:batch_size])
+                if not rows:
+                    break
+                changed_count[resource_type] += cls.update_index(resource_type, dict(rows))
+                last_id = rows[-1][0]
+
+            # 清理已删除对象的索引
+            object_ids = model.objects.annotate(object_id=Cast(id_field, models.CharField())).values("object_id")
+            cls.objects.filter(resource_type=resource_type).exclude(object_id__in=object_ids).delete()
+
+        cache.set(QUICK_SEARCH_INDEX_READY_KEY, True, None)
+        return changed_count
+
+    @classmethod
+    def match(cls, resource_type: str, keyword: str) -> Optional[QuerySet]:
+        """
+        获取可能包含关键字的对象ID子查询，结果需要再用 icontains 校验
+        索引未就绪或关键字过短无法使用索引时返回 None
+        """
+        grams = make_grams(keyword)
+        if not grams or not cls.is_ready():
+            return None
+
+        model, __, id_field = cls.INDEXED_FIELDS[resource_type]
+        object_ids = (
+            cls.objects.filter(resource_type=resource_type, gram__in=grams)
+            .values("object_id")
+            .annotate(gram_count=Count("gram"))
+            .filter(gram_count=len(grams))
+        )
+        if isinstance(model._meta.get_field(id_field), models.CharField):
+            return object_ids.values("object_id")
+        return object_ids.annotate(matched_id=Cast("object_id", BigIntegerField())).values("matched_id")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+
+from django.db import transaction
+
+from backend.db_meta.models import Cluster, Machine
+from backend.db_services.quick_search.constants import ResourceType
+from backend.db_services.quick_search.models import QuickSearchIndex
+from backend.flow.models import FlowTree
+
+logger = logging.getLogger("root")
+
+
+def _update_index_on_commit(resource_type: str, object_id, value: str):
+    """在事务提交后更新索引，索引更新失败不影响业务数据的变更，由周期任务兜底修正"""
+
+    def _update():
+        try:
+            QuickSearchIndex.update_index(resource_type, {object_id: value})
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"[quick_search] update index of {resource_type}:{object_id} failed: {e}")
+
+    transaction.on_commit(_update)
+
+
+def _delete_index_on_commit(resource_type: str, object_id):
+    def _delete():
+        try:
+            QuickSearchIndex.delete_index(resource_type, [object_id])
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"[quick_search] delete index of {resource_type}:{object_id} failed: {e}")
+
+    transaction.on_commit(_delete)
+
+
+def _is_fields_updated(fields, **kwargs) -> bool:
+    update_fields = kwargs.get("update_fields")
+    return not update_fields or bool(set(fields) & set(update_fields))
+
+
+def update_cluster_index(sender, instance: Cluster, **kwargs):
+    if _is_fields_updated(["name"], **kwargs):
+        _update_index_on_commit(ResourceType.CLUSTER_NAME.value, instance.id, instance.name)
+    if _is_fields_updated(["immute_domain"], **kwargs):
+        _update_index_on_commit(ResourceType.CLUSTER_DOMAIN.value, instance.id, instance.immute_domain)
+
+
+def delete_cluster_index(sender, instance: Cluster, **kwargs):
+    _delete_index_on_commit(ResourceType.CLUSTER_NAME.value, instance.id)
+    _delete_index_on_commit(ResourceType.CLUSTER_DOMAIN.value, instance.id)
+
+
+def update_machine_index(sender, instance: Machine, **kwargs):
+    if _is_fields_updated(["ip"], **kwargs):
+        _update_index_on_commit(ResourceType.MACHINE.value, instance.bk_host_id, instance.ip)
+
+
+def delete_machine_index(sender, instance: Machine, **kwargs):
+    _delete_index_on_commit(ResourceType.MACHINE.value, instance.bk_host_id)
+
+
+def update_task_index(sender, instance: FlowTree, created: bool = False, **kwargs):
+    # 流程ID创建后不会变化，状态更新无需刷新索引
+    if created:
+        _update_index_on_commit(ResourceType.TASK.value, instance.root_id, instance.root_id)
+
+
+def delete_task_index(sender, instance: FlowTree, **kwargs):
+    _delete_index_on_commit(ResourceType.TASK.value, instance.root_id)
@@ -14,3 +14,18 @@ MAX_AUTO_RETRY_TIMES = 5
 RETRY_INTERVAL = 30
 
 LOG_START_STRIP_PATTERN = re.compile(r"^\[.*?\] ")
+
+# 节点日志单页条数(每个日志索引)
+LOG_PAGE_SIZE = 1000
+# 节点日志排序字段，同时作为 search_after 的游标字段
+# 不同主机上报的日志排序值可能相同，末尾追加 serverIp 和 _id 保证排序值唯一，避免翻页时跳过日志
+LOG_SORT_FIELDS = ["dtEventTimeStamp", "gseIndex", "iterationIndex", "serverIp", "_id"]
+LOG_SORT_LIST = [[field, "asc"] for field in LOG_SORT_FIELDS]
+
+# 批量重试进度，按流程ID记录在 redis hash 中
+BATCH_RETRY_PROGRESS_KEY = "taskflow:batch_retry:{root_id}"
+BATCH_RETRY_ERRORS_KEY = "taskflow:batch_retry:{root_id}:errors"
+BATCH_RETRY_PROGRESS_EXPIRE = 60 * 60
+# 批量重试的执行锁，执行过程中由后台任务不断续期，任务异常退出后锁会很快过期
+BATCH_RETRY_LOCK_KEY = "taskflow:batch_retry:{root_id}:lock"
+BATCH_RETRY_LOCK_EXPIRE = 5 * 60
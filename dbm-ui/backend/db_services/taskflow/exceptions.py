@@ -41,3 +41,8 @@ class ForceFailNodeException(TaskFlowBaseException):
 class RevokePipelineException(TaskFlowBaseException):
     ERROR_CODE = "005"
     MESSAGE = _("撤销流程异常")
+
+
+class InvalidLogCursorException(TaskFlowBaseException):
+    ERROR_CODE = "006"
+    MESSAGE = _("日志游标不合法")
@@ -9,6 +9,8 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import base64
+import heapq
 import json
 import logging
 import re
@@ -16,10 +18,9 @@ import time
 from datetime import timedelta
 from json import JSONDecodeError
 from operator import itemgetter
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from bamboo_engine.api import EngineAPIResult
-from bamboo_engine.eri import NodeType
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
@@ -27,10 +28,16 @@ from backend import env
 from backend.bk_web.constants import LogLevelName
 from backend.components import BKLogApi
 from backend.db_services.taskflow import task
-from backend.db_services.taskflow.constants import LOG_START_STRIP_PATTERN
+from backend.db_services.taskflow.constants import (
+    LOG_PAGE_SIZE,
+    LOG_SORT_FIELDS,
+    LOG_SORT_LIST,
+    LOG_START_STRIP_PATTERN,
+)
 from backend.db_services.taskflow.exceptions import (
     CallbackNodeException,
     ForceFailNodeException,
+    InvalidLogCursorException,
     RevokePipelineException,
     SkipNodeException,
 )
@@ -79,14 +86,26 @@ class TaskFlowHandler:
         """重试节点"""
         return task.retry_node(root_id=self.root_id, node_id=node_id, retry_times=1)
 
-    def batch_retry_nodes(self):
-        """批量重试节点"""
+    def batch_retry_nodes(self) -> Optional[Dict[str, Any]]:
+        """
+        批量重试失败节点
+        重试在后台任务中并发执行，这里只下发任务并返回进度，进度可以通过 get_batch_retry_progress 轮询
+        """
         node_ids = self.get_failed_node_ids()
-        for node_id in node_ids:
+        progress = task.BatchRetryProgress(self.root_id)
+        # 同一流程已有批量重试在执行时，不重复下发
+        token = progress.start(node_ids) if node_ids else None
+        if token:
             try:
-                self.retry_node(node_id)
-            except Exception as err:
-                logger.error(f"{node_id} retry failed, {err}")
+                task.batch_retry_nodes.delay(root_id=self.root_id, node_ids=node_ids, token=token)
+            except Exception:
+                progress.reset(token)
+                raise
+        return progress.get()
+
+    def get_batch_retry_progress(self) -> Optional[Dict[str, Any]]:
+        """获取批量重试进度"""
+        return task.BatchRetryProgress(self.root_id).get()
 
     def skip_node(self, node_id: str):
         """跳过节点"""
@@ -120,25 +139,13 @@ class TaskFlowHandler:
     def get_failed_node_ids(self) -> List[str]:
         """
         获取失败节点ID列表
+        FlowNode 只记录活动节点，且节点状态由信号实时同步，因此直接通过 (root_id, status) 索引查询即可，无需加载流程树
         """
-        node_ids = []
-        tree_states = BambooEngine(root_id=self.root_id).get_pipeline_tree_states()
-        activities = tree_states.get("activities", {})
-
-        def recurse_activities(current_activities):
-            for act_id, activity in current_activities.items():
-                # 如果有子流程，递归检查子流程内的活动
-                if "pipeline" in activity:
-                    pipeline_activities = activity["pipeline"].get("activities", {})
-                    recurse_activities(pipeline_activities)
-                if (
-                    activity.get("status") == StateType.FAILED
-                    and activity.get("type") == NodeType.ServiceActivity.value
-                ):
-                    node_ids.append(act_id)
-
-        recurse_activities(activities)
-        return node_ids
+        return list(
+            FlowNode.objects.filter(root_id=self.root_id, status=StateType.FAILED)
+            .values_list("node_id", flat=True)
+            .distinct()
+        )
 
     def get_node_histories(self, node_id: str) -> List[Dict[str, Any]]:
         """获取节点历史版本信息"""
@@ -164,51 +171,92 @@ class TaskFlowHandler:
         return sorted(histories, key=itemgetter("started_time"), reverse=True)
 
     @staticmethod
-    def bklog_esquery_search(indices, query_string, start_time, end_time):
-        """esquery搜索"""
-        resp = BKLogApi.esquery_search(
-            {
-                "indices": indices,
-                "start_time": start_time,
-                "end_time": end_time,
-                "query_string": query_string,
-                "start": 0,
-                "size": 1000,
-            }
-        )
+    def bklog_esquery_search(indices, query_string, start_time, end_time, size=LOG_PAGE_SIZE, search_after=None):
+        """esquery搜索，按日志上报顺序排序，传入 search_after 时从该位置之后继续查询"""
+        params = {
+            "indices": indices,
+            "start_time": start_time,
+            "end_time": end_time,
+            "query_string": query_string,
+            "start": 0,
+            "size": size,
+            "sort_list": LOG_SORT_LIST,
+        }
+        if search_after:
+            params["search_after"] = search_after
+        resp = BKLogApi.esquery_search(params)
         return resp["hits"]["hits"]
 
-    def get_version_logs(self, node_id: str, version_id: str) -> List[Dict[str, Dict[str, str]]]:
-        """获取节点的日志信息"""
+    @staticmethod
+    def _get_hit_sort(hit: Dict) -> List:
+        """获取日志的排序值，即下一页的 search_after"""
+        return hit.get("sort") or [hit["_source"].get(field, hit.get(field)) for field in LOG_SORT_FIELDS]
+
+    @staticmethod
+    def _encode_log_cursor(cursor: Dict[str, List]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+    @staticmethod
+    def _decode_log_cursor(cursor: str) -> Dict[str, List]:
+        try:
+            search_afters = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            search_afters = None
+        if not isinstance(search_afters, dict):
+            raise InvalidLogCursorException(_("日志游标不合法: {}").format(cursor))
+        return search_afters
+
+    def _get_log_queries(self, node_id: str, version_id: str) -> Dict[str, Dict[str, str]]:
+        """节点日志分布在 flow 日志和 dbactuator 日志两个索引中"""
+        return {
+            "dbm_log": {
+                "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.dbm_log",
+                "query_string": f"({self.root_id} AND {node_id} AND {version_id})"
+                f" AND (__ext.io_kubernetes_pod:*worker* OR __ext.io_kubernetes_pod:*dbsimulation*)",
+            },
+            "dbm_dbactuator": {
+                "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.dbm_dbactuator",
+                "query_string": f"{self.root_id} AND {node_id} AND {version_id}",
+            },
+        }
+
+    def get_version_logs_page(
+        self, node_id: str, version_id: str, cursor: Optional[str] = None, size: int = LOG_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        """
+        分页获取节点的日志信息
+        - cursor 为上一页返回的游标，记录了每个日志索引的 search_after 位置，为空时从头开始查询
+        - 没有新日志时返回的游标不变，前端可以使用该游标持续拉取节点新增的日志(tail)
+        @return: {"logs": 本页日志, "cursor": 下一页游标, "has_more": 是否还有未拉取的日志}
+        """
         try:
             flow_node = FlowNode.objects.get(root_id=self.root_id, node_id=node_id)
         except FlowNode.DoesNotExist:
-            return [self.generate_log_record(message=_("节点尚未运行，请稍后查看"))]
+            logs = [] if cursor else [self.generate_log_record(message=_("节点尚未运行，请稍后查看"))]
+            return {"logs": logs, "cursor": cursor, "has_more": False}
         if flow_node.updated_at < timezone.now() - timedelta(days=7):
-            return [self.generate_log_record(message=_("节点日志仅保留7天"))]
+            logs = [] if cursor else [self.generate_log_record(message=_("节点日志仅保留7天"))]
+            return {"logs": logs, "cursor": cursor, "has_more": False}
 
         start_time = datetime2str(flow_node.started_at)
         end_time = datetime2str(flow_node.updated_at + timedelta(days=7))
-        dbm_logs = self.bklog_esquery_search(
-            indices=f"{env.DBA_APP_BK_BIZ_ID}_bklog.dbm_log",
-            query_string=f"({self.root_id} AND {node_id} AND {version_id})"
-            f" AND (__ext.io_kubernetes_pod:*worker* OR __ext.io_kubernetes_pod:*dbsimulation*)",
-            start_time=start_time,
-            end_time=end_time,
-        )
-        dbm_dbactuator_logs = self.bklog_esquery_search(
-            indices=f"{env.DBA_APP_BK_BIZ_ID}_bklog.dbm_dbactuator",
-            query_string=f"{self.root_id} AND {node_id} AND {version_id}",
-            start_time=start_time,
-            end_time=end_time,
-        )
-        logs = []
-        sorted_hits = sorted(
-            dbm_logs + dbm_dbactuator_logs,
-            key=lambda x: (x["_source"]["dtEventTimeStamp"], x["_source"]["gseIndex"], x["_source"]["iterationIndex"]),
-        )
+        search_afters = self._decode_log_cursor(cursor) if cursor else {}
+
+        # 每个索引各查询一页，归并后只取前 size 条，未消费的日志在下一页会被重新查询
+        index_hits, has_more = {}, False
+        for name, query in self._get_log_queries(node_id, version_id).items():
+            hits = self.bklog_esquery_search(
+                start_time=start_time, end_time=end_time, size=size, search_after=search_afters.get(name), **query
+            )
+            index_hits[name] = [(self._get_hit_sort(hit), name, hit) for hit in hits]
+            has_more = has_more or len(hits) >= size
 
-        for hit in sorted_hits:
+        merged_hits = list(heapq.merge(*index_hits.values(), key=itemgetter(0)))
+        has_more = has_more or len(merged_hits) > size
+
+        logs = []
+        for sort, name, hit in merged_hits[:size]:
+            search_afters[name] = sort
             log = self._format_log(hit["_source"]["log"], hit["_source"]["serverIp"], hit["_index"])
             if log:
                 logs.append(
@@ -216,9 +264,21 @@ class TaskFlowHandler:
                         timestamp=hit["_source"].get("time"), levelname=log["levelname"], message=log["log"]
                     )
                 )
-        if not logs:
-            return [self.generate_log_record(message=_("日志上报中，请稍后查看"))]
-        return logs
+
+        if not logs and not cursor and not has_more:
+            logs = [self.generate_log_record(message=_("日志上报中，请稍后查看"))]
+        next_cursor = self._encode_log_cursor(search_afters) if search_afters else cursor
+        return {"logs": logs, "cursor": next_cursor, "has_more": has_more}
+
+    def iter_version_logs(self, node_id: str, version_id: str, size: int = LOG_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """按页迭代节点的全部日志，内存中最多只保留一页日志，用于日志的流式下载"""
+        cursor = None
+        while True:
+            page = self.get_version_logs_page(node_id, version_id, cursor=cursor, size=size)
+            yield from page["logs"]
+            if not page["has_more"] or page["cursor"] == cursor:
+                break
+            cursor = page["cursor"]
 
     @staticmethod
     def generate_log_record(
@@ -12,6 +12,7 @@ from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
+from backend.db_services.taskflow.constants import LOG_PAGE_SIZE
 from backend.flow.consts import PipelineStatus
 from backend.flow.models import FlowTree
 from backend.utils.time import calculate_cost_time
@@ -59,6 +60,10 @@ class CallbackNodeSerializer(NodeSerializer):
 class VersionSerializer(NodeSerializer):
     version_id = serializers.CharField(help_text=_("版本ID"))
     download = serializers.BooleanField(help_text=_("是否下载日志"), default=False)
+    cursor = serializers.CharField(
+        help_text=_("日志游标，为空时返回第一页日志"), required=False, allow_blank=True
+    )
+    size = serializers.IntegerField(help_text=_("每页日志条数"), required=False, min_value=1, max_value=LOG_PAGE_SIZE)
 
 
 class BatchDownloadSerializer(serializers.Serializer):
@@ -9,16 +9,26 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import logging
-from typing import Any, Union
+import uuid
+from typing import Any, Dict, List, Optional, Union
 
 from bamboo_engine.api import EngineAPIResult
 from celery import shared_task
+from django.db import connection
 from django.utils.translation import ugettext as _
 from pipeline.eri.signals import post_set_state
 
 from backend.db_meta.exceptions import ClusterExclusiveOperateException
 from backend.db_meta.models import Cluster
-from backend.db_services.taskflow.constants import MAX_AUTO_RETRY_TIMES, RETRY_INTERVAL
+from backend.db_services.taskflow.constants import (
+    BATCH_RETRY_ERRORS_KEY,
+    BATCH_RETRY_LOCK_EXPIRE,
+    BATCH_RETRY_LOCK_KEY,
+    BATCH_RETRY_PROGRESS_EXPIRE,
+    BATCH_RETRY_PROGRESS_KEY,
+    MAX_AUTO_RETRY_TIMES,
+    RETRY_INTERVAL,
+)
 from backend.db_services.taskflow.exceptions import RetryNodeException
 from backend.flow.consts import StateType
 from backend.flow.engine.bamboo.engine import BambooEngine
@@ -27,6 +37,8 @@ from backend.flow.plugins.components.collections.common.base_service import Base
 from backend.ticket.builders.common.base import fetch_cluster_ids
 from backend.ticket.constants import FlowRetryType
 from backend.ticket.models import Flow, Ticket
+from backend.utils.batch_request import request_multi_thread
+from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("flow")
 
@@ -88,3 +100,112 @@ def retry_node(root_id: str, node_id: str, retry_times: int) -> Union[EngineAPIR
 
     service.log_info(_("重试成功"))
     return result
+
+
+class BatchRetryProgress(object):
+    """
+    批量重试的进度，记录在 redis hash 中，供前端轮询
+    - 同一流程同时只允许一个批量重试，通过 SET NX 原子抢占执行锁，锁的值为本次重试的 token
+    - 执行锁的过期时间较短，由后台任务在重试过程中续期，任务异常退出后锁自动过期，不会长期阻塞后续的批量重试
+    - 并发重试的线程只对计数器做原子自增，不需要加锁
+    """
+
+    def __init__(self, root_id: str):
+        self.progress_key = BATCH_RETRY_PROGRESS_KEY.format(root_id=root_id)
+        self.errors_key = BATCH_RETRY_ERRORS_KEY.format(root_id=root_id)
+        self.lock_key = BATCH_RETRY_LOCK_KEY.format(root_id=root_id)
+
+    def start(self, node_ids: List[str]) -> Optional[str]:
+        """抢占执行锁并初始化进度，返回本次重试的 token；同一流程已有批量重试在执行时返回 None"""
+        token = uuid.uuid4().hex
+        if not RedisConn.set(self.lock_key, token, nx=True, ex=BATCH_RETRY_LOCK_EXPIRE):
+            return None
+
+        RedisConn.delete(self.progress_key, self.errors_key)
+        RedisConn.hset(
+            self.progress_key,
+            mapping={"status": StateType.RUNNING, "total": len(node_ids), "succeeded": 0, "failed": 0},
+        )
+        RedisConn.expire(self.progress_key, BATCH_RETRY_PROGRESS_EXPIRE)
+        return token
+
+    def refresh(self, token: str) -> bool:
+        """
+        续期执行锁，锁已被其他批量重试持有时返回 False
+        任务排队时间超过锁的过期时间时，如果没有其他批量重试，重新抢占锁后继续执行
+        """
+        if RedisConn.get(self.lock_key) == token:
+            return bool(RedisConn.expire(self.lock_key, BATCH_RETRY_LOCK_EXPIRE))
+        return bool(RedisConn.set(self.lock_key, token, nx=True, ex=BATCH_RETRY_LOCK_EXPIRE))
+
+    def reset(self, token: str):
+        """任务下发失败时清理进度并释放执行锁"""
+        if RedisConn.get(self.lock_key) != token:
+            return
+        RedisConn.delete(self.progress_key, self.errors_key)
+        self._release_lock(token)
+
+    def succeed(self):
+        RedisConn.hincrby(self.progress_key, "succeeded", 1)
+
+    def fail(self, node_id: str, message: str):
+        RedisConn.hincrby(self.progress_key, "failed", 1)
+        RedisConn.hset(self.errors_key, node_id, message)
+        RedisConn.expire(self.errors_key, BATCH_RETRY_PROGRESS_EXPIRE)
+
+    def finish(self, token: str):
+        RedisConn.hset(self.progress_key, "status", StateType.FINISHED)
+        self._release_lock(token)
+
+    def _release_lock(self, token: str):
+        # 只释放自己持有的锁，避免误删其他批量重试的锁
+        if RedisConn.get(self.lock_key) == token:
+            RedisConn.delete(self.lock_key)
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """获取批量重试进度，没有批量重试记录时返回 None"""
+        progress = RedisConn.hgetall(self.progress_key)
+        if not progress:
+            return None
+
+        status = progress["status"]
+        # 执行中的进度失去执行锁，说明后台任务已异常退出
+        if status == StateType.RUNNING and not RedisConn.exists(self.lock_key):
+            status = StateType.FAILED.value
+
+        return {
+            "status": status,
+            "total": int(progress["total"]),
+            "succeeded": int(progress["succeeded"]),
+            "failed": int(progress["failed"]),
+            "errors": RedisConn.hgetall(self.errors_key),
+        }
+
+
+@shared_task
+def batch_retry_nodes(root_id: str, node_ids: List[str], token: str):
+    """并发重试流程中的失败节点，并记录重试进度"""
+    progress = BatchRetryProgress(root_id)
+    if not progress.refresh(token):
+        logger.warning(f"batch retry of {root_id} is running by another task, skip")
+        return
+
+    def _retry_node(node_id: str):
+        try:
+            result = retry_node(root_id=root_id, node_id=node_id, retry_times=1)
+            if result.result:
+                progress.succeed()
+            else:
+                progress.fail(node_id, result.message)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.error(f"{node_id} retry failed, {err}")
+            progress.fail(node_id, str(err))
+        finally:
+            progress.refresh(token)
+            # 子线程中的数据库连接不会被 celery 回收，需要主动关闭
+            connection.close()
+
+    try:
+        request_multi_thread(_retry_node, [{"node_id": node_id} for node_id in node_ids])
+    finally:
+        progress.finish(token)
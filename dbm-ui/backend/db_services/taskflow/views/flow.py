@@ -10,7 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.utils.translation import ugettext as _
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -19,6 +19,7 @@ from backend import env
 from backend.bk_web import viewsets
 from backend.bk_web.swagger import common_swagger_auto_schema
 from backend.db_services.dbbase.constants import IpSource
+from backend.db_services.taskflow.constants import LOG_PAGE_SIZE
 from backend.db_services.taskflow.handlers import TaskFlowHandler
 from backend.db_services.taskflow.serializers import (
     BatchRetryNodesSerializer,
@@ -144,6 +145,15 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
         root_id = kwargs["root_id"]
         return Response(TaskFlowHandler(root_id=root_id).batch_retry_nodes())
 
+    @common_swagger_auto_schema(
+        operation_summary=_("批量重试进度"),
+        tags=[SWAGGER_TAG],
+    )
+    @action(methods=["GET"], detail=True)
+    def batch_retry_progress(self, requests, *args, **kwargs):
+        root_id = kwargs["root_id"]
+        return Response(TaskFlowHandler(root_id=root_id).get_batch_retry_progress())
+
     @common_swagger_auto_schema(
         operation_summary=_("跳过节点"),
         tags=[SWAGGER_TAG],
@@ -186,16 +196,24 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
         validated_data = self.params_validate(self.get_serializer_class())
         node_id = validated_data["node_id"]
         version_id = validated_data["version_id"]
-        logs = TaskFlowHandler(root_id=root_id).get_version_logs(node_id, version_id)
+        handler = TaskFlowHandler(root_id=root_id)
         if validated_data["download"]:
-            # 导出下载日志
-            return HttpResponse(
+            # 导出下载日志，按页流式返回，避免一次性加载全部日志
+            logs = (f"{log['message']}\n" for log in handler.iter_version_logs(node_id, version_id))
+            return StreamingHttpResponse(
                 logs,
                 content_type="application/text charset=utf-8",
                 headers={"Content-Disposition": f'attachment; filename="{root_id}-{node_id}-{version_id}.log"'},
             )
-        else:
-            return Response(logs)
+        # 分页查询日志，不传游标时只返回第一页，前端可以使用返回的游标继续拉取后续日志和新增日志
+        return Response(
+            handler.get_version_logs_page(
+                node_id,
+                version_id,
+                cursor=validated_data.get("cursor") or None,
+                size=validated_data.get("size", LOG_PAGE_SIZE),
+            )
+        )
 
     @common_swagger_auto_schema(
         operation_summary=_("回调节点"),
@@ -60,6 +60,8 @@ BK_IAM_INNER_HOST = get_type_env(key="BK_IAM_V3_INNER_HOST", _type=str, default=
 BK_IAM_USE_APIGATEWAY = True
 BK_IAM_APIGATEWAY = get_type_env(key="BK_IAM_APIGATEWAY", _type=str, default="https://iam-apigw.example.com")
 BK_IAM_API_VERSION = get_type_env(key="BK_IAM_API_VERSION", _type=str, default="v1")
+# 用户权限策略的缓存时间(秒)，为0时不缓存
+BK_IAM_POLICY_CACHE_TIME = get_type_env(key="BK_IAM_POLICY_CACHE_TIME", _type=int, default=60)
 IAM_APP_URL = get_type_env(key="IAM_APP_URL", _type=str, default="https://iam.example.com")
 BK_IAM_RESOURCE_API_HOST = get_type_env(key="BK_IAM_RESOURCE_API_HOST", _type=str, default="https://bkdbm.example.com")
 
@@ -85,6 +87,11 @@ BK_SAAS_CALLBACK_URL = (
     or BK_SAAS_HOST.replace("https", "http")
 )
 
+# DataAPI 连接池配置：缓存的主机连接池数量、单个主机的最大连接数，以及是否保持长连接
+DATA_API_POOL_CONNECTIONS = get_type_env(key="DATA_API_POOL_CONNECTIONS", _type=int, default=20)
+DATA_API_POOL_MAXSIZE = get_type_env(key="DATA_API_POOL_MAXSIZE", _type=int, default=100)
+DATA_API_KEEP_ALIVE = get_type_env(key="DATA_API_KEEP_ALIVE", _type=bool, default=True)
+
 # 其他系统访问地址
 BK_DOMAIN = get_type_env(key="BK_DOMAIN", _type=str, default=".example.com")
 BK_PAAS_URL = get_type_env(key="BK_PAAS_URL", _type=str, default="http://paas.example.com")
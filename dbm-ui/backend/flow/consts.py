@@ -128,6 +128,17 @@ FAILED_FORCIBLY_TERMINATED = 12
 
 SUCCESS_LIST = [SUCCESS, IGNORE_ERROR, SKIPPED, MANUAL_TERMINAL, SUCCESS_FORCIBLY_TERMINATED]
 FAILED_LIST = [FAILED, ABNORMAL_STATE, FAILED_FORCIBLY_TERMINATED]
+
+# JOB主机执行成功的状态
+JOB_IP_SUCCESS = 9
+# JOB批量查询主机日志单次的主机数上限
+JOB_IP_LOG_BATCH_SIZE = 500
+# JOB任务失败时，单个节点转载的日志总字节数上限
+JOB_FAILURE_LOG_BYTES_BUDGET = 64 * 1024
+# JOB任务失败时，单台主机转载的日志字节数上限(保留日志末尾)
+JOB_FAILURE_LOG_IP_MAX_BYTES = 4 * 1024
+# JOB任务失败时，汇总展示的错误类型数量
+JOB_FAILURE_LOG_TOP_N = 5
 DBA_SYSTEM_USER = "mysql"
 DBA_ROOT_USER = "root"
 
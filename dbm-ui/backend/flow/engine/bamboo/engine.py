@@ -8,17 +8,17 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
-from typing import Any, Dict, List, Optional
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
 
 from bamboo_engine import api, builder, states
 from bamboo_engine.api import EngineAPIResult
 from bamboo_engine.builder import Data
 from django.utils.translation import ugettext as _
-from pipeline.eri.runtime import BambooDjangoRuntime
 
 from backend.flow.engine.bamboo.builder import Builder
+from backend.flow.engine.bamboo.runtime import get_runtime
 from backend.flow.engine.exceptions import PipelineError
 from backend.flow.models import FlowNode, FlowTree, StateType
 from backend.utils.string import i18n_str
@@ -27,12 +27,24 @@ from backend.utils.time import datetime2timestamp
 logger = logging.getLogger("json")
 
 
+def hide_sensitive_data(data: Dict) -> Dict:
+    """
+    隐藏pipeline中敏感数据，返回去掉所有 inputs 的新结构，不修改原数据
+    只重建路径上的 dict，其余的值与原数据共享引用，因此无需预先深拷贝整个流程树
+    """
+    return {
+        key: hide_sensitive_data(value) if type(value) == dict else value
+        for key, value in data.items()
+        if key != "inputs"
+    }
+
+
 class BambooEngine:
     builder_cls = Builder
 
     def __init__(self, root_id: str, data: Optional[Dict] = None, pipeline_data: Optional[Data] = None):
         self.builder = self.builder_cls(root_id, data, pipeline_data=pipeline_data)
-        self.runtime = BambooDjangoRuntime()
+        self.runtime = get_runtime()
         self.root_id = root_id
         self.data = data
 
@@ -44,8 +56,7 @@ class BambooEngine:
         if not start:
             return None
         pipeline = builder.build_tree(start_elem=start, id=self.root_id, data=pipeline_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        insensitive_data = self.hide_sensitive_data(pipeline)
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
         tree = FlowTree.objects.create(
@@ -65,52 +76,73 @@ class BambooEngine:
         """
         暂停 pipeline 的执行
         """
-        result = api.pause_pipeline(runtime=BambooDjangoRuntime(), pipeline_id=self.root_id)
+        result = api.pause_pipeline(runtime=self.runtime, pipeline_id=self.root_id)
         return result
 
     def resume_pipeline(self) -> EngineAPIResult:
-        result = api.resume_pipeline(runtime=BambooDjangoRuntime(), pipeline_id=self.root_id)
+        result = api.resume_pipeline(runtime=self.runtime, pipeline_id=self.root_id)
         return result
 
     def revoke_pipeline(self) -> EngineAPIResult:
-        result = api.revoke_pipeline(runtime=BambooDjangoRuntime(), pipeline_id=self.root_id)
+        result = api.revoke_pipeline(runtime=self.runtime, pipeline_id=self.root_id)
         return result
 
     def force_fail_pipeline(self, node_id: str) -> EngineAPIResult:
-        result = api.forced_fail_activity(runtime=BambooDjangoRuntime(), node_id=node_id, ex_data="force failed")
+        result = api.forced_fail_activity(runtime=self.runtime, node_id=node_id, ex_data="force failed")
         return result
 
     def retry_node(self, node_id: str, data: Optional[dict] = None) -> EngineAPIResult:
-        result = api.retry_node(runtime=BambooDjangoRuntime(), node_id=node_id, data=data)
+        result = api.retry_node(runtime=self.runtime, node_id=node_id, data=data)
         return result
 
     def skip_node(self, node_id: str) -> EngineAPIResult:
-        result = api.skip_node(runtime=BambooDjangoRuntime(), node_id=node_id)
+        result = api.skip_node(runtime=self.runtime, node_id=node_id)
         return result
 
     def force_fail_node(self, node_id: str, ex_data: str) -> EngineAPIResult:
-        result = api.forced_fail_activity(runtime=BambooDjangoRuntime(), node_id=node_id, ex_data=ex_data)
+        result = api.forced_fail_activity(runtime=self.runtime, node_id=node_id, ex_data=ex_data)
         return result
 
     def get_node_input_data(self, node_id: str) -> EngineAPIResult:
-        result = api.get_execution_data_inputs(runtime=BambooDjangoRuntime(), node_id=node_id)
+        result = api.get_execution_data_inputs(runtime=self.runtime, node_id=node_id)
         return result
 
     def get_node_histories(self, node_id: str) -> EngineAPIResult:
-        result = api.get_node_histories(runtime=BambooDjangoRuntime(), node_id=node_id)
+        result = api.get_node_histories(runtime=self.runtime, node_id=node_id)
         return result
 
     def get_pipeline_states(self) -> EngineAPIResult:
-        result = api.get_pipeline_states(runtime=BambooDjangoRuntime(), root_id=self.root_id)
+        result = api.get_pipeline_states(runtime=self.runtime, root_id=self.root_id)
         self.format_bamboo_engine_status(result.data)
         return result
 
+    def get_root_state(self) -> Optional[str]:
+        """
+        获取流程的汇总状态，只查询根节点状态和 FlowNode 中的异常节点，不加载整个状态树
+        与 get_pipeline_states + format_bamboo_engine_status 的根节点状态保持一致
+        """
+        root_state = self.runtime.get_state_or_none(self.root_id)
+        if not root_state or root_state.name != StateType.RUNNING:
+            return root_state.name if root_state else None
+
+        abnormal_states = set(
+            FlowNode.objects.filter(
+                root_id=self.root_id, status__in=[StateType.FAILED, StateType.REVOKED, StateType.SUSPENDED]
+            )
+            .values_list("status", flat=True)
+            .distinct()
+        )
+        for state in [StateType.FAILED, StateType.REVOKED, StateType.SUSPENDED]:
+            if state in abnormal_states:
+                return state
+        return root_state.name
+
     def get_children_states(self, node_id: str) -> EngineAPIResult:
-        result = api.get_children_states(runtime=BambooDjangoRuntime(), node_id=node_id)
+        result = api.get_children_states(runtime=self.runtime, node_id=node_id)
         return result
 
     def get_execution_data(self, node_id: str) -> EngineAPIResult:
-        result = api.get_execution_data(runtime=BambooDjangoRuntime(), node_id=node_id)
+        result = api.get_execution_data(runtime=self.runtime, node_id=node_id)
         return result
 
     def format_bamboo_engine_status(self, pipeline_status_tree: Dict[str, Any]):
@@ -134,98 +166,77 @@ class BambooEngine:
                 elif StateType.SUSPENDED in child_status:
                     status_tree["state"] = StateType.SUSPENDED
 
-    def hide_sensitive_data(self, copy_data: Dict):
+    def hide_sensitive_data(self, data: Dict) -> Dict:
         """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
-
-    def get_subprocess_state(self, children: Dict, children_status: List):
-        """获取指定子流程结点状态"""
-        for key, __ in children.items():
-            children_status.append(children[key]["state"])
-
-    def recursion_subprocess_status(self, activities: Dict, node_maps: Dict):
-        """为子流程添加状态"""
-        raw_data = copy.deepcopy(activities)
-        for node_id, activity in raw_data.items():
-            for key, value in activity.items():
-                if value == "SubProcess":
-                    children_status_list = []
-                    children_states = self.get_children_states(node_id=node_id).data
-                    try:
-                        children = children_states[node_id]["children"]
-                        self.get_subprocess_state(children, children_status_list)
-                        status = children_states[node_id]["state"]
-                        if status == states.RUNNING and states.FAILED in children_status_list:
-                            status = states.FAILED
-                        elif status == states.RUNNING and states.REVOKED in children_status_list:
-                            status = states.REVOKED
-                    except KeyError:
-                        status = states.CREATED
-
-                    act_status = []
-                    self.recursion_subprocess_activity_status(
-                        self.root_id, activity["pipeline"]["activities"], act_status, node_maps
-                    )
-                    if states.FAILED in act_status:
-                        status = states.FAILED
-                    elif states.REVOKED in act_status:
-                        status = states.REVOKED
-
-                    activities[node_id]["status"] = status
-                elif key == "pipeline":
-                    self.recursion_subprocess_status(activities[node_id]["pipeline"]["activities"], node_maps)
-
-    def recursion_nodes_status(self, node: FlowNode, status: str, raw_data: Dict):
-        for key, values in raw_data.items():
-            if key == node.node_id:
-                raw_data[key]["status"] = status
-                raw_data[key]["created_at"] = int(datetime2timestamp(node.created_at))
-                raw_data[key]["started_at"] = int(datetime2timestamp(node.started_at))
-                raw_data[key]["updated_at"] = int(datetime2timestamp(node.updated_at))
-                raw_data[key]["hosts"] = node.hosts
-                continue
-
-            if isinstance(values, dict):
-                self.recursion_nodes_status(node, status, values)
-
-    def recursion_subprocess_activity_status(self, root_id: str, activities: Dict, act_status: List, node_maps: Dict):
+        return hide_sensitive_data(data)
+
+    def aggregate_activities_status(
+        self,
+        activities: Dict,
+        flow_nodes: Dict[str, FlowNode],
+        state_names: Dict[str, str],
+        children_state_names: Dict[str, Set[str]],
+    ) -> List[str]:
+        """
+        自底向上一次遍历流程树: 翻译节点名称、填充活动节点的状态信息、汇总子流程的状态
+        @param activities: 流程树中的活动节点
+        @param flow_nodes: 节点ID -> FlowNode
+        @param state_names: 节点ID -> bamboo 节点状态
+        @param children_state_names: 节点ID -> 直接子节点的 bamboo 状态集合
+        @return: 当前层级及所有子流程中活动节点的 FlowNode 状态
+        """
+        act_status: List[str] = []
         for node_id, activity in activities.items():
-            for key, value in activity.items():
-                if key == "type" and value == "SubProcess":
-                    self.recursion_subprocess_activity_status(
-                        root_id, activity["pipeline"]["activities"], act_status, node_maps
-                    )
-                elif key == "type" and value == "ServiceActivity":
-                    status = node_maps[node_id]
-                    act_status.append(status)
-
-    def recursion_translate_activity(self, activities: Dict):
-        """递归翻译节点名称"""
-        for activity in activities.values():
             activity["name"] = i18n_str(activity["name"])
-            if "pipeline" in activity:
-                self.recursion_translate_activity(activity["pipeline"]["activities"])
+
+            if activity.get("type") == "SubProcess":
+                sub_act_status = self.aggregate_activities_status(
+                    activity["pipeline"]["activities"], flow_nodes, state_names, children_state_names
+                )
+                act_status.extend(sub_act_status)
+
+                # 子流程未开始执行时没有状态；运行中的子流程以直接子节点的失败/撤销状态为准
+                status = state_names.get(node_id, states.CREATED)
+                if status == states.RUNNING and states.FAILED in children_state_names[node_id]:
+                    status = states.FAILED
+                elif status == states.RUNNING and states.REVOKED in children_state_names[node_id]:
+                    status = states.REVOKED
+                # 任意层级的活动节点失败/撤销时，子流程也认为失败/撤销
+                if states.FAILED in sub_act_status:
+                    status = states.FAILED
+                elif states.REVOKED in sub_act_status:
+                    status = states.REVOKED
+                activity["status"] = status
+            elif activity.get("type") == "ServiceActivity":
+                act_status.append(flow_nodes[node_id].status if node_id in flow_nodes else None)
+
+            if node_id in flow_nodes:
+                node = flow_nodes[node_id]
+                activity["status"] = node.status
+                activity["created_at"] = int(datetime2timestamp(node.created_at))
+                activity["started_at"] = int(datetime2timestamp(node.started_at))
+                activity["updated_at"] = int(datetime2timestamp(node.updated_at))
+                activity["hosts"] = node.hosts
+
+        return act_status
 
     def get_pipeline_tree_states(self) -> Optional[Dict]:
-        """获取流程数据包括状态"""
+        """
+        获取流程数据包括状态
+        FlowNode 和 bamboo 节点状态各查询一次，然后一次遍历流程树完成状态汇总，查询次数与节点数量无关
+        """
         tree = self.get_pipeline_tree()
         if not tree:
             return None
-        activities = tree["activities"]
-        node_maps = {}
-        nodes = FlowNode.objects.filter(root_id=self.root_id)
-        for node in nodes:
-            node_maps[node.node_id] = node.status
-        self.recursion_subprocess_status(activities, node_maps)
-        self.recursion_translate_activity(activities)
-        for node in nodes:
-            self.recursion_nodes_status(node, node.status, tree)
+
+        flow_nodes = {node.node_id: node for node in FlowNode.objects.filter(root_id=self.root_id)}
+        state_names: Dict[str, str] = {}
+        children_state_names: Dict[str, Set[str]] = defaultdict(set)
+        for state in self.runtime.get_state_by_root(self.root_id):
+            state_names[state.node_id] = state.name
+            children_state_names[state.parent_id].add(state.name)
+
+        self.aggregate_activities_status(tree["activities"], flow_nodes, state_names, children_state_names)
         return tree
 
     def get_pipeline_tree(self) -> Optional[Dict]:
@@ -236,7 +247,7 @@ class BambooEngine:
             return None
 
     def get_node_short_histories(self, node_id) -> List[Dict[str, Any]]:
-        result = api.get_node_short_histories(runtime=BambooDjangoRuntime(), node_id=node_id)
+        result = api.get_node_short_histories(runtime=self.runtime, node_id=node_id)
         return result.data
 
     def callback(self, node_id: str, desc: Any) -> EngineAPIResult:
@@ -249,7 +260,5 @@ class BambooEngine:
         version = children.get("version", None)
         if version is None:
             raise PipelineError(_("获取节点运行版本失败"))
-        result = api.callback(
-            runtime=BambooDjangoRuntime(), node_id=node_id, version=version, data={"description": desc}
-        )
+        result = api.callback(runtime=self.runtime, node_id=node_id, version=version, data={"description": desc})
         return result
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import threading
+from typing import Optional
+
+from pipeline.eri.runtime import BambooDjangoRuntime
+
+
+class RuntimeHolder(object):
+    """
+    进程级的 BambooDjangoRuntime 持有者
+    - BambooDjangoRuntime 本身不保存请求态数据(数据库连接由 django 按线程/协程管理，celery 连接按调用创建)，
+      因此同一进程内可以在线程和 gevent 协程间共享一个实例，避免每次调用引擎接口都重新构造并校验 eri 版本
+    - threading.Lock 在 gevent monkey patch 之后为协程锁；celery prefork 子进程 fork 后会重建实例
+    """
+
+    def __init__(self, runtime_cls=BambooDjangoRuntime):
+        self.runtime_cls = runtime_cls
+        self._lock = threading.Lock()
+        self._runtime: Optional[BambooDjangoRuntime] = None
+
+    def get(self) -> BambooDjangoRuntime:
+        runtime = self._runtime
+        if runtime is not None:
+            return runtime
+
+        with self._lock:
+            if self._runtime is None:
+                self._runtime = self.runtime_cls()
+            return self._runtime
+
+    def reset(self):
+        """丢弃当前实例，fork 后的子进程重新构造"""
+        self._lock = threading.Lock()
+        self._runtime = None
+
+
+runtime_holder = RuntimeHolder()
+
+# celery prefork 模式下，子进程需要重新构造 runtime
+os.register_at_fork(after_in_child=runtime_holder.reset)
+
+
+def get_runtime() -> BambooDjangoRuntime:
+    """获取当前进程共享的 BambooDjangoRuntime"""
+    return runtime_holder.get()
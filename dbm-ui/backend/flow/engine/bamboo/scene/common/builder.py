@@ -8,9 +8,8 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from bamboo_engine import api, builder
 from bamboo_engine.builder import (
@@ -25,16 +24,21 @@ from bamboo_engine.builder import (
     SubProcess,
     Var,
 )
+from django.db import transaction
 from django.utils import translation
 from django.utils.translation import ugettext as _
-from pipeline.eri.runtime import BambooDjangoRuntime
 
+from backend.flow.engine.bamboo.engine import hide_sensitive_data
+from backend.flow.engine.bamboo.runtime import get_runtime
 from backend.flow.models import FlowNode, FlowTree, StateType
 from backend.flow.plugins.components.collections.common.create_random_job_user import AddTempUserForClusterComponent
 from backend.flow.plugins.components.collections.common.drop_random_job_user import DropTempUserForClusterComponent
 
 logger = logging.getLogger("json")
 
+# 流程节点记录批量写入时每批的数量
+FLOW_NODE_BATCH_SIZE = 500
+
 
 class Builder(object):
     """
@@ -75,6 +79,9 @@ class Builder(object):
         # 定义流程数据上下文参数trans_data
         self.rewritable_node_source_keys = []
 
+        # 编排过程中产生的节点记录(包括子流程的节点)，在运行流程时统一批量写入
+        self.flow_nodes: List[FlowNode] = []
+
         # 判断是否添加临时账号的流程逻辑
         if self.need_random_pass_cluster_ids:
             self.create_random_pass_act()
@@ -136,7 +143,7 @@ class Builder(object):
 
         self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-        FlowNode.objects.create(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id)
+        self.flow_nodes.append(FlowNode(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id))
         if extend:
             self.pipe = self.pipe.extend(act)
         return act
@@ -149,7 +156,6 @@ class Builder(object):
         pg = ParallelGateway()
         cg = ConvergeGateway()
         acts = []
-        flow_node_list = []
 
         # 增加对传入的acts_list做合法判断
         if not isinstance(acts_list, list) or len(acts_list) == 0:
@@ -157,6 +163,7 @@ class Builder(object):
 
         for act_info in acts_list:
             if type(act_info) == SubProcess:
+                self.collect_sub_flow_nodes(act_info)
                 acts.append(act_info)
                 continue
             act = ServiceActivity(name=act_info["act_name"], component_code=act_info["act_component_code"])
@@ -173,10 +180,9 @@ class Builder(object):
 
             self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-            flow_node_list.append(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
+            self.flow_nodes.append(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
             acts.append(act)
 
-        FlowNode.objects.bulk_create(flow_node_list)
         self.pipe = self.pipe.extend(pg).connect(*acts).to(pg).converge(cg)
 
     def add_sub_pipeline(self, sub_flow):
@@ -185,6 +191,7 @@ class Builder(object):
         @param sub_flow: 子流程
         """
 
+        self.collect_sub_flow_nodes(sub_flow)
         self.pipe = self.pipe.extend(sub_flow)
         # return self
 
@@ -197,10 +204,24 @@ class Builder(object):
         if not isinstance(sub_flow_list, list) or len(sub_flow_list) == 0:
             raise Exception(_("传入的sub_flow_list参数不合法，请检测"))
 
+        for sub_flow in sub_flow_list:
+            self.collect_sub_flow_nodes(sub_flow)
         pg = ParallelGateway()
         cg = ConvergeGateway()
         self.pipe = self.pipe.extend(pg).connect(*sub_flow_list).to(pg).converge(cg)
 
+    def collect_sub_flow_nodes(self, sub_flow: SubProcess):
+        """
+        收集子流程编排时产生的节点记录，随主流程一起写入
+        @param sub_flow: 由 SubBuilder.build_sub_process 构建的子流程
+        """
+        self.flow_nodes.extend(getattr(sub_flow, "flow_nodes", []))
+
+    def save_flow_nodes(self):
+        """批量写入流程节点记录，同一个子流程被多次引用时只写入一次"""
+        flow_nodes = list({flow_node.node_id: flow_node for flow_node in self.flow_nodes}.values())
+        FlowNode.objects.bulk_create(flow_nodes, batch_size=FLOW_NODE_BATCH_SIZE)
+
     def run_pipeline(self, init_trans_data_class: Optional[Any] = None, is_drop_random_user: bool = True) -> bool:
         """
         开始运行 pipeline
@@ -218,35 +239,30 @@ class Builder(object):
         )
         self.pipe.extend(self.end_act)
         pipeline = builder.build_tree(self.start_act, id=self.root_id, data=self.global_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        insensitive_data = self.hide_sensitive_data(pipeline)
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
-        FlowTree.objects.create(
-            uid=uid,
-            ticket_type=self.data["ticket_type"],
-            root_id=self.root_id,
-            tree=insensitive_data,
-            bk_biz_id=self.data["bk_biz_id"],
-            status=StateType.CREATED,
-            created_by=self.data["created_by"],
-        )
+        with transaction.atomic():
+            self.save_flow_nodes()
+            FlowTree.objects.create(
+                uid=uid,
+                ticket_type=self.data["ticket_type"],
+                root_id=self.root_id,
+                tree=insensitive_data,
+                bk_biz_id=self.data["bk_biz_id"],
+                status=StateType.CREATED,
+                created_by=self.data["created_by"],
+            )
 
-        if not api.run_pipeline(runtime=BambooDjangoRuntime(), pipeline=pipeline).result:
+        if not api.run_pipeline(runtime=get_runtime(), pipeline=pipeline).result:
             logger.error(_("部署bamboo流程任务创建失败，任务结束"))
             return False
 
         return True
 
-    def hide_sensitive_data(self, copy_data: Optional[Dict]) -> Optional[Dict]:
+    def hide_sensitive_data(self, data: Optional[Dict]) -> Optional[Dict]:
         """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
+        return hide_sensitive_data(data)
 
     @staticmethod
     def get_ip_list(ips: list) -> list:
@@ -272,7 +288,10 @@ class SubBuilder(Builder):
         # sub_data.inputs['${trans_data}'] = DataInput(type=Var.SPLICE, value='${trans_data}')
         sub_params = Params({"${trans_data}": Var(type=Var.SPLICE, value="${trans_data}")})
         self.pipe.extend(self.end_act)
-        return SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        sub_process = SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        # 子流程的节点记录随子流程传递，在挂载到父流程时被收集
+        sub_process.flow_nodes = self.flow_nodes
+        return sub_process
 
 
 class RewritableNode(RewritableNodeOutput):
@@ -79,6 +79,7 @@ from backend.flow.plugins.components.collections.redis.redis_dts import (
     RedisDtsDisconnectSyncComponent,
 )
 from backend.flow.plugins.components.collections.redis.trans_flies import TransFileComponent
+from backend.flow.utils.base.payload_handler import PayloadHandler
 from backend.flow.utils.redis.redis_act_playload import RedisActPayload
 from backend.flow.utils.redis.redis_context_dataclass import ActKwargs, RedisDtsContext, RedisDtsOnlineSwitchContext
 from backend.flow.utils.redis.redis_db_meta import RedisDBMeta
@@ -357,6 +358,10 @@ class RedisClusterDataCopyFlow(object):
     def shard_num_or_cluster_type_update_precheck(self):
         src_cluster_set: set = set()
         bk_biz_id = self.data["bk_biz_id"]
+        # 批量预取所有源集群的密码，逐个集群检查 proxy backends 时直接命中缓存
+        PayloadHandler.redis_batch_get_password_by_cluster_ids(
+            [int(info["src_cluster"]) for info in self.data["infos"]]
+        )
         for info in self.data["infos"]:
             if info["src_cluster"] in src_cluster_set:
                 raise Exception(_("源集群{}重复了").format(info["src_cluster"]))
@@ -191,6 +191,8 @@ class RedisClusterAutoFixSceneFlow(object):
     def start_redis_auotfix(self):
         redis_pipeline, act_kwargs = self.__init_builder(_("REDIS-故障自愈"))
         sub_pipelines = []
+        # 批量预取所有集群的密码，逐个集群构造时直接命中缓存
+        PayloadHandler.redis_batch_get_password_by_cluster_ids([info["cluster_id"] for info in self.data["infos"]])
         for cluster_fix in self.data["infos"]:
             cluster_kwargs = deepcopy(act_kwargs)
             cluster_info = self.get_cluster_info(self.data["bk_biz_id"], cluster_fix["cluster_id"])
@@ -205,6 +205,8 @@ class RedisClusterCMRSceneFlow(object):
     def complete_machine_replace(self):
         redis_pipeline, act_kwargs = self.__init_builder(_("REDIS-整机替换"))
         sub_pipelines = []
+        # 批量预取所有集群的密码，逐个集群构造时直接命中缓存
+        PayloadHandler.redis_batch_get_password_by_cluster_ids([info["cluster_id"] for info in self.data["infos"]])
         for cluster_replacement in self.data["infos"]:
 
             cluster_kwargs = deepcopy(act_kwargs)
@@ -34,6 +34,7 @@ from backend.flow.plugins.components.collections.redis.get_redis_payload import
 from backend.flow.plugins.components.collections.redis.redis_config import RedisConfigComponent
 from backend.flow.plugins.components.collections.redis.redis_db_meta import RedisDBMetaComponent
 from backend.flow.plugins.components.collections.redis.trans_flies import TransFileComponent
+from backend.flow.utils.base.payload_handler import PayloadHandler
 from backend.flow.utils.redis.redis_act_playload import RedisActPayload
 from backend.flow.utils.redis.redis_context_dataclass import ActKwargs, CommonContext
 from backend.flow.utils.redis.redis_db_meta import RedisDBMeta
@@ -75,6 +76,11 @@ class RedisClusterVersionUpdateOnline(object):
         7. 是否所有master 都有 slave;
         """
         bk_biz_id = self.data["bk_biz_id"]
+        # 批量预取所有集群的密码，逐个集群检查版本时直接命中缓存
+        cluster_ids = [input_item["cluster_id"] for input_item in self.data["infos"]]
+        PayloadHandler.redis_batch_get_cluster_password(
+            list(Cluster.objects.filter(bk_biz_id=bk_biz_id, id__in=cluster_ids))
+        )
         for input_item in self.data["infos"]:
             if not input_item["target_version"]:
                 raise Exception(_("redis集群 {} 目标版本为空?").format(input_item["cluster_id"]))
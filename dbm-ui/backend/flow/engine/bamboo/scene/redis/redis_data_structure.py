@@ -65,7 +65,7 @@ from backend.flow.plugins.components.collections.redis.redis_db_meta import Redi
 from backend.flow.plugins.components.collections.redis.trans_flies import TransFileComponent
 from backend.flow.utils.common_act_dataclass import DownloadBackupClientKwargs
 from backend.flow.utils.redis.redis_act_playload import RedisActPayload
-from backend.flow.utils.redis.redis_cluster_nodes import convert_slot_to_str
+from backend.flow.utils.redis.redis_cluster_nodes import SlotRangeSet
 from backend.flow.utils.redis.redis_context_dataclass import ActKwargs, RedisDataStructureContext
 from backend.flow.utils.redis.redis_db_meta import RedisDBMeta
 from backend.utils.time import str2datetime
@@ -579,7 +579,7 @@ class RedisDataStructureFlow(object):
 
         instance_shard_dict = {}
         duplicate_instances = []
-        missing_ranges = []
+        backup_ranges = []
         for item in cluster_full_instance_backup:
             source_ip = item["source_ip"]
             server_port = item["server_port"]
@@ -592,27 +592,30 @@ class RedisDataStructureFlow(object):
             else:
                 instance_shard_dict[instance] = shard_value
             shard_start, shard_end = map(int, shard_value.split("-"))
-            missing_ranges.extend(range(shard_start, shard_end + 1))
+            backup_ranges.append((shard_start, shard_end))
 
         logger.info(_("实例 segment 对应关系，instance_shard_dict: {}".format(instance_shard_dict)))
         if duplicate_instances:
             logger.warning(_("重复的instance值，duplicate_instances: {}".format(duplicate_instances)))
         else:
             logger.info(_("没有重复的instance值，cluster_id: {}".format(info["cluster_id"])))
+        # 按区间计算缺失的 segment，无需展开为单个 segment
+        backup_slots = SlotRangeSet(backup_ranges)
+        missing_ranges = backup_slots
         # ssd、cache
         if cluster_type in [ClusterType.TendisTwemproxyRedisInstance, ClusterType.TwemproxyTendisSSDInstance]:
-            missing_ranges = set(range(DEFAULT_TWEMPROXY_SEG_MIN_NUM, DEFAULT_TWEMPROXY_SEG_TOTOL_NUM)) - set(
-                missing_ranges
+            missing_ranges = (
+                SlotRangeSet.full(DEFAULT_TWEMPROXY_SEG_MIN_NUM, DEFAULT_TWEMPROXY_SEG_TOTOL_NUM - 1) - backup_slots
             )
         # tendisplus
         if cluster_type == ClusterType.TendisPredixyTendisplusCluster:
-            missing_ranges = set(range(RedisSlotNum.MIN_SLOT, RedisSlotNum.TOTAL_SLOT)) - set(missing_ranges)
+            missing_ranges = SlotRangeSet.full(RedisSlotNum.MIN_SLOT, RedisSlotNum.TOTAL_SLOT - 1) - backup_slots
 
         if missing_ranges:
             raise Exception(
                 _(
                     "cluster_id:{},缺失的shard_value值missing_ranges:{}，可以从instance_shard_dict中看出:{}".format(
-                        info["cluster_id"], convert_slot_to_str(list(missing_ranges)), instance_shard_dict
+                        info["cluster_id"], missing_ranges, instance_shard_dict
                     )
                 )
             )
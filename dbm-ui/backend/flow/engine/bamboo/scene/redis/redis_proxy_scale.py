@@ -128,6 +128,8 @@ class RedisProxyScaleFlow(object):
         """
         redis_pipeline = Builder(root_id=self.root_id, data=self.data)
         sub_pipelines = []
+        # 批量预取所有集群的密码，逐个集群构造时直接命中缓存
+        PayloadHandler.redis_batch_get_password_by_cluster_ids([info["cluster_id"] for info in self.data["infos"]])
         for info in self.data["infos"]:
             proxy_ips = []
             for proxy_info in info["proxy"]:
@@ -115,6 +115,8 @@ class RedisSlotsMigrateFlow(object):
         redis_pipeline_all = Builder(root_id=self.root_id, data=self.data)
 
         sub_pipelines_multi_cluster = []
+        # 批量预取所有集群的密码，逐个集群构造时直接命中缓存
+        PayloadHandler.redis_batch_get_password_by_cluster_ids([info["cluster_id"] for info in self.data["infos"]])
         # 支持多集群操作
         for info in self.data["infos"]:
             redis_pipeline, act_kwargs = self.__init_builder(_("REDIS_SLOTS_MIGRATE"), info)
@@ -176,6 +178,8 @@ class RedisSlotsMigrateFlow(object):
         redis_pipeline_all = Builder(root_id=self.root_id, data=self.data)
 
         sub_pipelines_multi_cluster = []
+        # 批量预取所有集群的密码，逐个集群构造时直接命中缓存
+        PayloadHandler.redis_batch_get_password_by_cluster_ids([info["cluster_id"] for info in self.data["infos"]])
         # 支持多集群操作
         for info in self.data["infos"]:
             redis_pipeline, act_kwargs = self.__init_builder(_("REDIS_SLOTS_MIGRATE"), info)
@@ -221,6 +225,8 @@ class RedisSlotsMigrateFlow(object):
         redis_pipeline_all = Builder(root_id=self.root_id, data=self.data)
 
         sub_pipelines_multi_cluster = []
+        # 批量预取所有集群的密码，逐个集群构造时直接命中缓存
+        PayloadHandler.redis_batch_get_password_by_cluster_ids([info["cluster_id"] for info in self.data["infos"]])
         # 支持多集群操作
         for info in self.data["infos"]:
             redis_pipeline, act_kwargs = self.__init_builder(_("REDIS_SLOTS_MIGRATE"), info)
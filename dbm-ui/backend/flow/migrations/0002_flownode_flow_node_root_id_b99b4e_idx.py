@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flow", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flownode",
+            index=models.Index(fields=["root_id", "status"], name="flow_node_root_id_b99b4e_idx"),
+        ),
+    ]
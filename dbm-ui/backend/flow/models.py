@@ -48,4 +48,5 @@ class FlowNode(models.Model):
 
     class Meta:
         unique_together = ["root_id", "node_id", "version_id"]
+        indexes = [models.Index(fields=["root_id", "status"])]
         db_table = "flow_node"
@@ -8,13 +8,12 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import json
 import logging
 import re
 from abc import ABCMeta
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from bamboo_engine import states
 from django.utils import translation
@@ -27,9 +26,20 @@ from backend.components.sops.client import BkSopsApi
 from backend.core.encrypt.constants import AsymmetricCipherConfigType
 from backend.core.encrypt.handlers import AsymmetricHandler
 from backend.core.translation.constants import Language
-from backend.flow.consts import DEFAULT_FLOW_CACHE_EXPIRE_TIME, SUCCESS_LIST, WriteContextOpType
+from backend.flow.consts import (
+    DEFAULT_FLOW_CACHE_EXPIRE_TIME,
+    JOB_FAILURE_LOG_BYTES_BUDGET,
+    JOB_FAILURE_LOG_IP_MAX_BYTES,
+    JOB_FAILURE_LOG_TOP_N,
+    JOB_IP_LOG_BATCH_SIZE,
+    JOB_IP_SUCCESS,
+    SUCCESS_LIST,
+    WriteContextOpType,
+)
+from backend.flow.utils.job_status_poller import JobAgeIntervalGenerator, JobStatusPoller
 from backend.ticket.constants import TicketFlowStatus
 from backend.ticket.models import Flow
+from backend.utils.batch_request import request_multi_thread
 from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("flow")
@@ -212,41 +222,111 @@ class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
 
 class BkJobService(BaseService, metaclass=ABCMeta):
     __need_schedule__ = True
-    interval = StaticIntervalGenerator(5)
+    # 调度间隔随作业运行时长退避，与共享轮询器的轮询间隔保持一致
+    interval = JobAgeIntervalGenerator()
 
-    @staticmethod
-    def __status__(instance_id: str) -> Optional[Dict]:
-        """
-        获取任务状态
-        """
-        payload = {
-            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
-            "job_instance_id": instance_id,
-            "return_ip_result": True,
-        }
-        resp = JobApi.get_job_instance_status(payload, raw=True)
-        return resp
-
-    def __log__(
+    def __batch_log__(
         self,
         job_instance_id: int,
         step_instance_id: int,
-        ip_dict: dict,
-    ):
+        ip_dicts: List[dict],
+    ) -> Dict[Tuple[int, str], str]:
         """
-        获取任务日志
+        批量获取多台主机的任务日志，按 JOB 接口的主机数上限分批并发请求
+        @return: {(bk_cloud_id, ip): log_content}，获取失败的主机不在结果中
         """
         payload = {
             "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
             "job_instance_id": job_instance_id,
             "step_instance_id": step_instance_id,
         }
-        return JobApi.get_job_instance_ip_log({**payload, **ip_dict}, raw=True)
+
+        def _batch_log(ip_list: List[dict]) -> Dict:
+            try:
+                return JobApi.batch_get_job_instance_ip_log({**payload, "ip_list": ip_list}, raw=True)
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning(f"batch get log of job {job_instance_id} failed: {err}")
+                return {"result": False}
+
+        ip_list = [{"bk_cloud_id": int(ip_dict["bk_cloud_id"]), "ip": ip_dict["ip"]} for ip_dict in ip_dicts]
+        params_list = [
+            {"ip_list": ip_list[i : i + JOB_IP_LOG_BATCH_SIZE]} for i in range(0, len(ip_list), JOB_IP_LOG_BATCH_SIZE)
+        ]
+        logs: Dict[Tuple[int, str], str] = {}
+        for resp in request_multi_thread(_batch_log, params_list, get_data=lambda x: x):
+            if not resp.get("result"):
+                continue
+            for ip_log in resp["data"].get("script_task_logs") or []:
+                logs[(int(ip_log["bk_cloud_id"]), ip_log["ip"])] = ip_log.get("log_content") or ""
+        return logs
+
+    @staticmethod
+    def __error_signature(log_content: str) -> str:
+        """取日志最后一行非空内容(去掉行首的时间等[]前缀)作为错误类型，用于汇总失败主机"""
+        for line in reversed(log_content.splitlines()):
+            line = re.sub(r"^(\[.*?\])+\s*", "", line.strip())
+            if line:
+                return line[:200]
+        return _("无日志输出")
+
+    @staticmethod
+    def __tail_log(log_content: str, max_bytes: int) -> str:
+        """只保留日志末尾 max_bytes 字节，错误信息一般在日志末尾"""
+        content = log_content.encode()
+        if len(content) <= max_bytes:
+            return log_content
+        return "...\n" + content[-max_bytes:].decode(errors="ignore")
+
+    def __log_failed_ips(self, resp: Dict, job_instance_id: int, step_instance_id: int, ip_dicts: List[dict]):
+        """
+        转载失败主机的报错日志，耗时和日志量与主机数量无关
+        - 只拉取执行失败的主机日志，并批量并发获取
+        - 按错误类型汇总，优先输出影响主机数最多的 top N 错误
+        - 每台主机只保留日志末尾，且整个节点转载的日志总量不超过字节预算
+        """
+        step_ip_results = resp["data"]["step_instance_list"][0].get("step_ip_result_list") or []
+        failed_ips = {
+            (int(ip_result["bk_cloud_id"]), ip_result["ip"])
+            for ip_result in step_ip_results
+            if ip_result.get("status") != JOB_IP_SUCCESS
+        }
+        failed_ip_dicts = [d for d in ip_dicts if (int(d["bk_cloud_id"]), d["ip"]) in failed_ips]
+        # 无法获取主机的执行结果时，转载所有主机的日志
+        ip_dicts = failed_ip_dicts or ip_dicts
+        logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
+
+        error_ips: Dict[str, List[str]] = defaultdict(list)
+        for ip_dict in ip_dicts:
+            log_content = logs.get((int(ip_dict["bk_cloud_id"]), ip_dict["ip"]))
+            if log_content is not None:
+                error_ips[self.__error_signature(log_content)].append(ip_dict["ip"])
+
+        top_errors = sorted(error_ips.items(), key=lambda x: len(x[1]), reverse=True)[:JOB_FAILURE_LOG_TOP_N]
+        if top_errors:
+            self.log_error(_("{}台主机执行失败，主要错误如下:").format(len(ip_dicts)))
+        for signature, ips in top_errors:
+            sample_ips = ",".join(ips[:5]) + ("..." if len(ips) > 5 else "")
+            self.log_error(_("[{}台主机] {} ({})").format(len(ips), signature, sample_ips))
+
+        budget, omitted = JOB_FAILURE_LOG_BYTES_BUDGET, 0
+        for ip_dict in ip_dicts:
+            log_content = logs.get((int(ip_dict["bk_cloud_id"]), ip_dict["ip"]))
+            if log_content is None:
+                continue
+            log_content = self.__tail_log(log_content, JOB_FAILURE_LOG_IP_MAX_BYTES)
+            size = len(log_content.encode())
+            if size > budget:
+                omitted += 1
+                continue
+            budget -= size
+            self.log_error(f"{ip_dict}:{log_content}")
+
+        if omitted:
+            self.log_warning(_("日志量超出转载上限，已省略{}台主机的日志").format(omitted))
 
     def __get_target_ip_context(
         self,
-        job_instance_id: int,
-        step_instance_id: int,
+        log_content: Optional[str],
         ip_dict: dict,
         data,
         trans_data,
@@ -257,26 +337,21 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         对单个节点获取执行后log，并赋值给定义好流程上下文的trans_data
         write_op 控制写入变量的方式，rewrite是默认值，代表覆盖写入；append代表以{"ip":xxx} 形式追加里面变量里面
         """
-        resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-        if not resp["result"]:
+        if log_content is None:
             # 结果返回异常，则异常退出
             return False
         try:
-            # 以dict形式追加写入
-            result = json.loads(re.search(cpl, resp["data"]["log_content"]).group("context"))
+            # 日志解析出的结果是新对象，无需再深拷贝
+            result = json.loads(re.search(cpl, log_content).group("context"))
             if write_op == WriteContextOpType.APPEND.value:
-                context = copy.deepcopy(getattr(trans_data, write_payload_var))
-                ip = ip_dict["ip"]
-                if context:
-                    context[ip] = copy.deepcopy(result)
-                else:
-                    context = {ip: copy.deepcopy(result)}
-
-                setattr(trans_data, write_payload_var, copy.deepcopy(context))
+                # 以dict形式追加写入，浅拷贝一层避免修改原有的上下文对象
+                context = dict(getattr(trans_data, write_payload_var) or {})
+                context[ip_dict["ip"]] = result
+                setattr(trans_data, write_payload_var, context)
 
             else:
                 # 默认覆盖写入
-                setattr(trans_data, write_payload_var, copy.deepcopy(result))
+                setattr(trans_data, write_payload_var, result)
             data.outputs["trans_data"] = trans_data
 
             return True
@@ -310,16 +385,19 @@ class BkJobService(BaseService, metaclass=ABCMeta):
             return False
 
         job_instance_id = ext_result["data"]["job_instance_id"]
-        resp = self.__status__(job_instance_id)
+        # 通过共享轮询器批量获取作业状态，作业未结束时返回 None
+        job_status_poller = JobStatusPoller(job_api=JobApi)
+        resp = job_status_poller.get_status(job_instance_id)
 
         # 获取任务状态：
         # """
         # 1.未执行; 2.正在执行; 3.执行成功; 4.执行失败; 5.跳过; 6.忽略错误;
         # 7.等待用户; 8.手动结束; 9.状态异常; 10.步骤强制终止中; 11.步骤强制终止成功; 12.步骤强制终止失败
         # """
-        if not (resp["result"] and resp["data"]["finished"]):
+        if not resp:
             self.log_info(_("[{}] 任务正在执行🤔").format(node_name))
             return True
+        job_status_poller.release(job_instance_id)
 
         # 获取job的状态
         job_status = resp["data"]["job_instance"]["status"]
@@ -346,10 +424,7 @@ class BkJobService(BaseService, metaclass=ABCMeta):
 
             # 转载job脚本节点报错日志，兼容多IP执行场景的日志输出
             if ip_dicts:
-                for ip_dict in ip_dicts:
-                    resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-                    if resp.get("result"):
-                        self.log_error(f"{ip_dict}:{resp['data']['log_content']}")
+                self.__log_failed_ips(resp, job_instance_id, step_instance_id, ip_dicts)
 
             self.finish_schedule()
             return False
@@ -366,10 +441,10 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         self.log_info(_("[{}]该节点需要获取执行后日志，赋值到流程上下文").format(node_name))
 
         is_false = False
+        logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
         for ip_dict in ip_dicts:
             if not self.__get_target_ip_context(
-                job_instance_id=job_instance_id,
-                step_instance_id=step_instance_id,
+                log_content=logs.get((int(ip_dict["bk_cloud_id"]), ip_dict["ip"])),
                 ip_dict=ip_dict,
                 data=data,
                 trans_data=trans_data,
@@ -52,9 +52,8 @@ from backend.flow.models import FlowTree
 from backend.flow.plugins.components.collections.common.base_service import BaseService
 from backend.flow.utils.redis.redis_cluster_nodes import (
     ClusterNodeData,
+    ClusterNodes,
     decode_cluster_info,
-    get_masters_with_slots,
-    group_slaves_by_master_id,
 )
 from backend.flow.utils.redis.redis_context_dataclass import ActKwargs, RedisDtsContext
 from backend.flow.utils.redis.redis_proxy_util import get_twemproxy_cluster_hash_tag
@@ -259,7 +258,8 @@ class RedisDtsPrecheckService(BaseService):
         self.log_info("src_cluster:{} cluster_nodes_str:\n {}".format(src_data["cluster_addr"], cluster_nodes_str))
         # 确保所有负责slots的master都至少有一个running的slave
         # 如果有多个running slave,则选择其中一个保存到nice_slaves中
-        masters_with_slots = get_masters_with_slots(cluster_nodes_str)
+        cluster_nodes = ClusterNodes.parse(cluster_nodes_str)
+        masters_with_slots = cluster_nodes.masters_with_slots
         if len(masters_with_slots) == 0:
             self.log_error(
                 "src_cluster:{} not found masters(with_slots),master:{}".format(src_data["cluster_addr"], master_addr)
@@ -267,7 +267,7 @@ class RedisDtsPrecheckService(BaseService):
             raise Exception(
                 "src_cluster:{} not found masters(with_slots),master:{}".format(src_data["cluster_addr"], master_addr)
             )
-        slaves_by_masterid = group_slaves_by_master_id(cluster_nodes_str)
+        slaves_by_masterid = cluster_nodes.slaves_by_master_id
         meta_slaves = {}
         for src_slave in src_data["slave_instances"]:
             addr = src_slave["ip"] + ":" + str(src_slave["port"])
@@ -28,37 +28,42 @@ logger = logging.getLogger("flow")
 
 
 def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *args, **kwargs):
-    engine = BambooEngine(root_id=root_id)
-    pipeline_states = engine.get_pipeline_states().data
-
     now = timezone.now()
     logger.debug(_("【状态信号捕获】{} root_id={}, node_id={}, status:{}").format(now, root_id, node_id, to_state))
+
+    # 只更新当前节点的状态，开始运行时同时记录开始时间
+    node_fields = {"version_id": version, "status": to_state, "updated_at": now}
     if to_state == StateType.RUNNING:
-        # 记录开始时间
-        FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(started_at=now)
+        node_fields["started_at"] = now
+    FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(**node_fields)
 
-    FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(
-        version_id=version, status=to_state, updated_at=now
-    )
     try:
-        tree = FlowTree.objects.get(root_id=root_id)
+        # 流程树可能很大，这里只需要流转状态，不加载树结构
+        tree = FlowTree.objects.defer("tree").get(root_id=root_id)
     except FlowTree.DoesNotExist:
         logger.debug(_("【状态信号捕获】未查找到FlowTree root_id={}").format(root_id))
         return
 
+    # 获取流程的汇总状态：根节点自身状态变更(开始/结束/暂停/撤销)时通过完整状态树对账，其余节点变更时只做增量汇总
+    engine = BambooEngine(root_id=root_id)
+    if node_id == root_id:
+        pipeline_state = engine.get_pipeline_states().data[root_id]["state"]
+    else:
+        pipeline_state = engine.get_root_state()
+
     # 流转当前的flow状态
     origin_tree_status = tree.status
     # 如果当前节点或者流程已失败，则状态为失败
-    if to_state == StateType.FAILED or pipeline_states[root_id]["state"] == StateType.FAILED:
+    if to_state == StateType.FAILED or pipeline_state == StateType.FAILED:
         target_tree_status = StateType.FAILED
     # 如果流程已撤销，则状态为撤销
-    elif pipeline_states[root_id]["state"] == StateType.REVOKED:
+    elif pipeline_state == StateType.REVOKED:
         target_tree_status = StateType.REVOKED
     # 如果当前节点和流程都已完成，则状态为完成
-    elif to_state == StateType.FINISHED and pipeline_states[root_id]["state"] == StateType.FINISHED:
+    elif to_state == StateType.FINISHED and pipeline_state == StateType.FINISHED:
         target_tree_status = StateType.FINISHED
     # 如果当前节点已完成，流程不处于完成态，则状态为进行
-    elif to_state == StateType.FINISHED and pipeline_states[root_id]["state"] != StateType.FINISHED:
+    elif to_state == StateType.FINISHED and pipeline_state != StateType.FINISHED:
         target_tree_status = StateType.RUNNING
     else:
         target_tree_status = to_state
@@ -68,7 +73,7 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
         try:
             # 更新flow tree和inner flow的状态
             tree.updated_at, tree.status = now, target_tree_status
-            tree.save()
+            tree.save(update_fields=["status", "updated_at"])
             DBDirtyMachineHandler.handle_dirty_machine(tree.uid, root_id, origin_tree_status, target_tree_status)
             callback_ticket(tree.uid, root_id)
         except Exception as e:  # pylint: disable=broad-except
@@ -0,0 +1,161 @@
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import itertools
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from backend.components import DBConfigApi, DBPrivManagerApi
+from backend.utils.batch_request import request_multi_thread
+
+# 单次查询密码服务的实例数上限
+PASSWORD_QUERY_BATCH_SIZE = 100
+
+
+class CredentialResolver(object):
+    """
+    密码服务/配置中心的批量查询器
+    - 多个实例的密码合并为一次 get_password 请求(超过上限时分批并发)，并按 (实例, 账号, 组件) 去重
+    - 配置中心的查询按参数去重，多个查询并发执行
+    - 查询结果只在解析器的生命周期内缓存，解析器通过 credential_scope 绑定到一次流程构造，构造结束后即丢弃
+    """
+
+    def __init__(self):
+        self._passwords: Dict[Tuple, Optional[Dict]] = {}
+        self._confs: Dict[str, Dict] = {}
+        self._memo: Dict[Hashable, Any] = {}
+
+    @staticmethod
+    def _instance_key(instance: Dict) -> Tuple[str, int, int]:
+        return str(instance["ip"]), int(instance["port"]), int(instance["bk_cloud_id"])
+
+    @staticmethod
+    def _user_key(user: Dict) -> Tuple[str, str]:
+        return user["username"], user["component"]
+
+    def _fetch_passwords(self, instances: List[Dict], users: List[Dict]):
+        # 先标记为不存在，密码服务没有返回的组合不会重复查询
+        for instance, user in itertools.product(instances, users):
+            self._passwords[self._instance_key(instance) + self._user_key(user)] = None
+
+        params_list = [
+            {"instances": instances[i : i + PASSWORD_QUERY_BATCH_SIZE]}
+            for i in range(0, len(instances), PASSWORD_QUERY_BATCH_SIZE)
+        ]
+        results = request_multi_thread(
+            lambda instances: DBPrivManagerApi.get_password({"instances": instances, "users": users})["items"],
+            params_list,
+            get_data=lambda x: x,
+            in_order=True,
+        )
+        user_keys = [self._user_key(user) for user in users]
+        for params, items in results:
+            for item in items:
+                # 单实例查询时无需依赖返回记录中的实例信息
+                if len(params["instances"]) == 1:
+                    instance_key = self._instance_key(params["instances"][0])
+                else:
+                    instance_key = self._instance_key(item)
+                item_user_keys = [
+                    user_key
+                    for user_key in user_keys
+                    if user_key[0] == item.get("username") and item.get("component", user_key[1]) == user_key[1]
+                ]
+                # 单账号查询时与直接调用密码服务保持一致，直接使用返回的记录
+                if not item_user_keys and len(user_keys) == 1:
+                    item_user_keys = user_keys
+                for user_key in item_user_keys:
+                    if not self._passwords.get(instance_key + user_key):
+                        self._passwords[instance_key + user_key] = item
+
+    def get_password(self, instances: List[Dict], users: List[Dict]) -> List[Dict]:
+        """
+        批量获取实例账号的密码，返回结果与 DBPrivManagerApi.get_password 的 items 一致(密码未解码)
+        @param instances: 实例列表，[{"ip": "127.0.0.1", "port": 0, "bk_cloud_id": 0}]
+        @param users: 账号列表，[{"username": "xxx", "component": "xxx"}]
+        """
+        missing_instances = {
+            self._instance_key(instance): instance
+            for instance, user in itertools.product(instances, users)
+            if self._instance_key(instance) + self._user_key(user) not in self._passwords
+        }
+        if missing_instances:
+            self._fetch_passwords(list(missing_instances.values()), users)
+
+        items = []
+        for instance, user in itertools.product(instances, users):
+            item = self._passwords[self._instance_key(instance) + self._user_key(user)]
+            if item:
+                items.append(item)
+        return items
+
+    @staticmethod
+    def _conf_key(params: Dict) -> str:
+        return json.dumps(params, sort_keys=True, default=str)
+
+    def batch_query_conf_item(self, params_list: List[Dict]) -> List[Dict]:
+        """并发查询配置中心，相同参数只查询一次，结果与 params_list 的顺序一致"""
+        missing_params = {
+            self._conf_key(params): params for params in params_list if self._conf_key(params) not in self._confs
+        }
+        results = request_multi_thread(
+            lambda params: DBConfigApi.query_conf_item(params=params),
+            # request_multi_thread 会往 params 中注入 _request，这里传入副本避免影响去重的参数
+            [{"params": dict(params)} for params in missing_params.values()],
+            get_data=lambda x: x,
+            in_order=True,
+        )
+        for conf_key, (__, conf) in zip(missing_params.keys(), results):
+            self._confs[conf_key] = conf
+        return [self._confs[self._conf_key(params)] for params in params_list]
+
+    def query_conf_item(self, params: Dict) -> Dict:
+        return self.batch_query_conf_item([params])[0]
+
+    def clear(self):
+        """密码或配置变更后丢弃已缓存的结果"""
+        self._passwords.clear()
+        self._confs.clear()
+        self._memo.clear()
+
+    def memoize(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """缓存由密码/配置派生的其他数据，如系统管理账号"""
+        if key not in self._memo:
+            self._memo[key] = func()
+        return self._memo[key]
+
+
+_current_resolver: ContextVar[Optional[CredentialResolver]] = ContextVar("credential_resolver", default=None)
+
+
+@contextmanager
+def credential_scope():
+    """
+    在一次流程构造内共享同一个 CredentialResolver，嵌套使用时复用外层的解析器
+    >>> with credential_scope():
+    >>>     controller.xxx_scene()
+    """
+    resolver = _current_resolver.get()
+    if resolver is not None:
+        yield resolver
+        return
+
+    resolver = CredentialResolver()
+    token = _current_resolver.set(resolver)
+    try:
+        yield resolver
+    finally:
+        _current_resolver.reset(token)
+
+
+def get_credential_resolver() -> CredentialResolver:
+    """获取当前流程构造的解析器，不在 credential_scope 内时返回一个新的解析器，即不做缓存"""
+    return _current_resolver.get() or CredentialResolver()
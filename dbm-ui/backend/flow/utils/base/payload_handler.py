@@ -9,11 +9,13 @@ specific language governing permissions and limitations under the License.
 """
 
 import base64
+import copy
 import logging
 import re
+from typing import Dict, List
 
 from backend import env
-from backend.components import DBConfigApi, DBPrivManagerApi
+from backend.components import DBPrivManagerApi
 from backend.components.dbconfig.constants import FormatType, LevelName, ReqType
 from backend.constants import IP_RE_PATTERN
 from backend.core.encrypt.constants import AsymmetricCipherConfigType
@@ -23,6 +25,7 @@ from backend.db_meta.models import Cluster
 from backend.db_proxy.constants import ExtensionType
 from backend.db_proxy.models import DBExtension
 from backend.flow.consts import DEFAULT_INSTANCE, ConfigTypeEnum, LevelInfoEnum, MySQLPrivComponent, UserName
+from backend.flow.utils.base.credential_resolver import get_credential_resolver
 from backend.flow.utils.mysql.get_mysql_sys_user import generate_mysql_tmp_user
 from backend.ticket.constants import TicketType
 from backend.utils.string import base64_encode
@@ -64,12 +67,10 @@ class PayloadHandler(object):
         """
         获取proxy实例内置帐户密码
         """
-        data = DBPrivManagerApi.get_password(
-            {
-                "instances": [DEFAULT_INSTANCE],
-                "users": [{"username": UserName.PROXY.value, "component": MySQLPrivComponent.PROXY.value}],
-            }
-        )["items"]
+        data = get_credential_resolver().get_password(
+            instances=[DEFAULT_INSTANCE],
+            users=[{"username": UserName.PROXY.value, "component": MySQLPrivComponent.PROXY.value}],
+        )
         return {
             "proxy_admin_pwd": base64.b64decode(data[0]["password"]).decode("utf-8"),
             "proxy_admin_user": data[0]["username"],
@@ -80,12 +81,10 @@ class PayloadHandler(object):
         """
         获取tbinlogdumper实例内置帐户密码
         """
-        data = DBPrivManagerApi.get_password(
-            {
-                "instances": [DEFAULT_INSTANCE],
-                "users": [{"username": UserName.ADMIN.value, "component": MySQLPrivComponent.TBINLOGDUMPER.value}],
-            }
-        )["items"]
+        data = get_credential_resolver().get_password(
+            instances=[DEFAULT_INSTANCE],
+            users=[{"username": UserName.ADMIN.value, "component": MySQLPrivComponent.TBINLOGDUMPER.value}],
+        )
         return {
             "tbinlogdumper_admin_pwd": base64.b64decode(data[0]["password"]).decode("utf-8"),
             "tbinlogdumper_admin_user": data[0]["username"],
@@ -97,20 +96,18 @@ class PayloadHandler(object):
         """
         user_map = {}
         value_to_name = {member.value: member.name.lower() for member in UserName}
-        data = DBPrivManagerApi.get_password(
-            {
-                "instances": [DEFAULT_INSTANCE],
-                "users": [
-                    {"username": UserName.BACKUP.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.MONITOR.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.MONITOR_ACCESS_ALL.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.OS_MYSQL.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.REPL.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.YW.value, "component": MySQLPrivComponent.MYSQL.value},
-                ],
-            }
+        data = get_credential_resolver().get_password(
+            instances=[DEFAULT_INSTANCE],
+            users=[
+                {"username": UserName.BACKUP.value, "component": MySQLPrivComponent.MYSQL.value},
+                {"username": UserName.MONITOR.value, "component": MySQLPrivComponent.MYSQL.value},
+                {"username": UserName.MONITOR_ACCESS_ALL.value, "component": MySQLPrivComponent.MYSQL.value},
+                {"username": UserName.OS_MYSQL.value, "component": MySQLPrivComponent.MYSQL.value},
+                {"username": UserName.REPL.value, "component": MySQLPrivComponent.MYSQL.value},
+                {"username": UserName.YW.value, "component": MySQLPrivComponent.MYSQL.value},
+            ],
         )
-        for user in data["items"]:
+        for user in data:
             user_map[value_to_name[user["username"]] + "_user"] = (
                 "MONITOR" if user["username"] == UserName.MONITOR_ACCESS_ALL.value else user["username"]
             )
@@ -151,12 +148,19 @@ class PayloadHandler(object):
 
     def get_super_account(self):
         """
-        获取mysql机器系统管理账号信息
+        获取mysql机器系统管理账号信息，同一次流程构造内按云区域缓存
         """
 
         if env.DRS_USERNAME and env.DBHA_USERNAME:
             return self.__get_super_account_bypass()
 
+        super_account = get_credential_resolver().memoize(
+            ("super_account", self.bk_cloud_id), self.__get_super_account_from_extension
+        )
+        return copy.deepcopy(super_account)
+
+    def __get_super_account_from_extension(self):
+        """从 DRS/DBHA 扩展中获取系统管理账号"""
         bk_cloud_name = AsymmetricCipherConfigType.get_cipher_cloud_name(self.bk_cloud_id)
         drs = DBExtension.get_latest_extension(bk_cloud_id=self.bk_cloud_id, extension_type=ExtensionType.DRS)
         drs_account_data = {
@@ -179,39 +183,87 @@ class PayloadHandler(object):
         return drs_account_data, dbha_account_data
 
     @staticmethod
-    def redis_get_cluster_pass_from_dbconfig(cluster: Cluster):
-        proxy_conf = DBConfigApi.query_conf_item(
-            params={
-                "bk_biz_id": str(cluster.bk_biz_id),
-                "level_name": LevelName.CLUSTER.value,
-                "level_value": cluster.immute_domain,
-                "level_info": {"module": str(cluster.db_module_id)},
-                "conf_file": cluster.proxy_version,
-                "conf_type": ConfigTypeEnum.ProxyConf,
-                "namespace": cluster.cluster_type,
-                "format": FormatType.MAP,
+    def redis_batch_get_cluster_pass_from_dbconfig(clusters: List[Cluster]) -> Dict[int, Dict[str, str]]:
+        """
+        从dbconfig中批量获取redis集群的密码，proxy和redis的配置并发查询
+        @return: {cluster_id: {"redis_password": "", "redis_proxy_password": "", "redis_proxy_admin_password": ""}}
+        """
+        params_list = []
+        for cluster in clusters:
+            for conf_file, conf_type in [
+                (cluster.proxy_version, ConfigTypeEnum.ProxyConf),
+                (cluster.major_version, ConfigTypeEnum.DBConf),
+            ]:
+                params_list.append(
+                    {
+                        "bk_biz_id": str(cluster.bk_biz_id),
+                        "level_name": LevelName.CLUSTER.value,
+                        "level_value": cluster.immute_domain,
+                        "level_info": {"module": str(cluster.db_module_id)},
+                        "conf_file": conf_file,
+                        "conf_type": conf_type,
+                        "namespace": cluster.cluster_type,
+                        "format": FormatType.MAP,
+                    }
+                )
+
+        confs = get_credential_resolver().batch_query_conf_item(params_list)
+        cluster_passwords = {}
+        for index, cluster in enumerate(clusters):
+            proxy_content = confs[2 * index].get("content", {})
+            redis_content = confs[2 * index + 1].get("content", {})
+            cluster_passwords[cluster.id] = {
+                "redis_password": redis_content.get("requirepass", ""),
+                "redis_proxy_password": proxy_content.get("password", ""),
+                "redis_proxy_admin_password": proxy_content.get("predixy_admin_passwd", ""),
             }
-        )
-        proxy_content = proxy_conf.get("content", {})
-
-        redis_conf = DBConfigApi.query_conf_item(
-            params={
-                "bk_biz_id": str(cluster.bk_biz_id),
-                "level_name": LevelName.CLUSTER.value,
-                "level_value": cluster.immute_domain,
-                "level_info": {"module": str(cluster.db_module_id)},
-                "conf_file": cluster.major_version,
-                "conf_type": ConfigTypeEnum.DBConf,
-                "namespace": cluster.cluster_type,
-                "format": FormatType.MAP,
-            }
-        )
-        redis_content = redis_conf.get("content", {})
-        return {
-            "redis_password": redis_content.get("requirepass", ""),
-            "redis_proxy_password": proxy_content.get("password", ""),
-            "redis_proxy_admin_password": proxy_content.get("predixy_admin_passwd", ""),
+        return cluster_passwords
+
+    @staticmethod
+    def redis_get_cluster_pass_from_dbconfig(cluster: Cluster):
+        return PayloadHandler.redis_batch_get_cluster_pass_from_dbconfig([cluster])[cluster.id]
+
+    @staticmethod
+    def redis_batch_get_cluster_password(clusters: List[Cluster]) -> Dict[int, Dict[str, str]]:
+        """
+        批量获取redis集群的密码，所有集群的密码合并查询，并在同一次流程构造内缓存
+        - 优先从密码服务中获取
+        - 如果密码服务为空,则从dbconfig中获取
+        @return: {cluster_id: {"redis_password": "", "redis_proxy_password": "", "redis_proxy_admin_password": ""}}
+        """
+        component_password_keys = {
+            MySQLPrivComponent.REDIS_PROXY_ADMIN.value: "redis_proxy_admin_password",
+            MySQLPrivComponent.REDIS_PROXY.value: "redis_proxy_password",
+            MySQLPrivComponent.REDIS.value: "redis_password",
         }
+        users = [
+            {"username": UserName.REDIS_DEFAULT.value, "component": component} for component in component_password_keys
+        ]
+        # cluster_port 先全部统一设置为 0,便于DBHA获取密码
+        instances = {
+            cluster.id: {"ip": str(cluster.id), "port": 0, "bk_cloud_id": cluster.bk_cloud_id} for cluster in clusters
+        }
+
+        resolver = get_credential_resolver()
+        # 先合并查询所有集群的密码，之后逐个集群获取时直接命中缓存
+        resolver.get_password(instances=list(instances.values()), users=users)
+
+        cluster_passwords, dbconfig_clusters = {}, []
+        for cluster in clusters:
+            ret = {"redis_password": "", "redis_proxy_admin_password": "", "redis_proxy_password": ""}
+            for item in resolver.get_password(instances=[instances[cluster.id]], users=users):
+                if item["username"] == UserName.REDIS_DEFAULT.value and item["component"] in component_password_keys:
+                    ret[component_password_keys[item["component"]]] = base64.b64decode(item["password"]).decode(
+                        "utf-8"
+                    )
+            if not any(ret.values()):
+                # 密码服务为空,从dbconfig中获取
+                dbconfig_clusters.append(cluster)
+            cluster_passwords[cluster.id] = ret
+
+        if dbconfig_clusters:
+            cluster_passwords.update(PayloadHandler.redis_batch_get_cluster_pass_from_dbconfig(dbconfig_clusters))
+        return cluster_passwords
 
     @staticmethod
     def redis_get_cluster_password(cluster: Cluster):
@@ -220,42 +272,7 @@ class PayloadHandler(object):
         - 优先从密码服务中获取
         - 如果密码服务为空,则从dbconfig中获取
         """
-        # cluster_port 先全部统一设置为 0,便于DBHA获取密码
-        cluster_port = 0
-        query_params = {
-            "instances": [{"ip": str(cluster.id), "port": cluster_port, "bk_cloud_id": cluster.bk_cloud_id}],
-            "users": [
-                {"username": UserName.REDIS_DEFAULT.value, "component": MySQLPrivComponent.REDIS_PROXY_ADMIN.value},
-                {"username": UserName.REDIS_DEFAULT.value, "component": MySQLPrivComponent.REDIS_PROXY.value},
-                {"username": UserName.REDIS_DEFAULT.value, "component": MySQLPrivComponent.REDIS.value},
-            ],
-        }
-        data = DBPrivManagerApi.get_password(query_params)
-        ret = {"redis_password": "", "redis_proxy_admin_password": "", "redis_proxy_password": ""}
-        for item in data["items"]:
-            if (
-                item["username"] == UserName.REDIS_DEFAULT.value
-                and item["component"] == MySQLPrivComponent.REDIS_PROXY_ADMIN.value
-            ):
-                ret["redis_proxy_admin_password"] = base64.b64decode(item["password"]).decode("utf-8")
-            elif (
-                item["username"] == UserName.REDIS_DEFAULT.value
-                and item["component"] == MySQLPrivComponent.REDIS_PROXY.value
-            ):
-                ret["redis_proxy_password"] = base64.b64decode(item["password"]).decode("utf-8")
-            elif (
-                item["username"] == UserName.REDIS_DEFAULT.value
-                and item["component"] == MySQLPrivComponent.REDIS.value
-            ):
-                ret["redis_password"] = base64.b64decode(item["password"]).decode("utf-8")
-        if (
-            ret["redis_password"] == ""
-            and ret["redis_proxy_password"] == ""
-            and ret["redis_proxy_admin_password"] == ""
-        ):
-            # 密码服务为空,从dbconfig中获取
-            ret = PayloadHandler.redis_get_cluster_pass_from_dbconfig(cluster)
-        return ret
+        return PayloadHandler.redis_batch_get_cluster_password([cluster])[cluster.id]
 
     @staticmethod
     def redis_get_password_by_cluster_id(cluster_id: int):
@@ -265,6 +282,14 @@ class PayloadHandler(object):
         cluster = Cluster.objects.get(id=cluster_id)
         return PayloadHandler.redis_get_cluster_password(cluster)
 
+    @staticmethod
+    def redis_batch_get_password_by_cluster_ids(cluster_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """
+        根据集群ID批量获取redis集群的密码
+        多集群的流程在逐个集群构造前先调用，之后逐个集群获取密码时直接命中 credential_scope 内的缓存
+        """
+        return PayloadHandler.redis_batch_get_cluster_password(list(Cluster.objects.filter(id__in=cluster_ids)))
+
     @staticmethod
     def redis_get_password_by_domain(immute_domain: str):
         """
@@ -296,6 +321,9 @@ class PayloadHandler(object):
             "security_rule_name": "",
         }
 
+        # 密码变更后丢弃当前流程构造内缓存的密码
+        get_credential_resolver().clear()
+
         if redis_password and (not redis_password.isspace()):
             query_params["component"] = MySQLPrivComponent.REDIS.value
             query_params["password"] = base64_encode(redis_password)
@@ -374,6 +402,7 @@ class PayloadHandler(object):
             ],
         }
         DBPrivManagerApi.delete_password(delete_params)
+        get_credential_resolver().clear()
 
     @staticmethod
     def redis_delete_password_by_cluster(cluster: Cluster):
@@ -396,15 +425,11 @@ class PayloadHandler(object):
         获取redis os内置帐户密码
         """
         user_map = {}
-        data = DBPrivManagerApi.get_password(
-            {
-                "instances": [DEFAULT_INSTANCE],
-                "users": [
-                    {"username": UserName.OS_MYSQL.value, "component": MySQLPrivComponent.REDIS.value},
-                ],
-            }
+        data = get_credential_resolver().get_password(
+            instances=[DEFAULT_INSTANCE],
+            users=[{"username": UserName.OS_MYSQL.value, "component": MySQLPrivComponent.REDIS.value}],
         )
-        for user in data["items"]:
+        for user in data:
             user_map["os_user"] = user["username"]
             user_map["os_password"] = base64.b64decode(user["password"]).decode("utf-8")
             break
@@ -438,19 +463,16 @@ class PayloadHandler(object):
         """
         通过密码服务 获取大数据集群单条认证信息(用户名/密码/token等)
         """
-        query_params = {
-            "instances": [{"ip": cluster.immute_domain, "port": port, "bk_cloud_id": cluster.bk_cloud_id}],
-            "users": [
-                {"username": username, "component": cluster.cluster_type},
-            ],
-        }
-        data = DBPrivManagerApi.get_password(query_params)
+        data = get_credential_resolver().get_password(
+            instances=[{"ip": cluster.immute_domain, "port": port, "bk_cloud_id": cluster.bk_cloud_id}],
+            users=[{"username": username, "component": cluster.cluster_type}],
+        )
         # 判断密码服务是否有对应item
-        if not data["items"]:
+        if not data:
             return ""
         else:
             # 默认返回第一个item
-            return base64.b64decode(data["items"][0]["password"]).decode("utf-8")
+            return base64.b64decode(data[0]["password"]).decode("utf-8")
 
     @staticmethod
     def get_bigdata_auth_by_cluster(cluster: Cluster, port: int) -> dict:
@@ -471,7 +493,7 @@ class PayloadHandler(object):
         # 判断auth是否有一个为空, 为空则从dbconfig获取
         if not auth["username"] or not auth["password"]:
             logger.error("cannot get auth info from password service")
-            cluster_config_data = DBConfigApi.query_conf_item(
+            cluster_config_data = get_credential_resolver().query_conf_item(
                 {
                     "bk_biz_id": str(cluster.bk_biz_id),
                     "level_name": LevelName.CLUSTER,
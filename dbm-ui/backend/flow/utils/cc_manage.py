@@ -21,6 +21,7 @@ from backend.configuration.models import BizSettings, DBAdministrator
 from backend.db_meta.enums import ClusterType, ClusterTypeMachineTypeDefine
 from backend.db_meta.models import AppMonitorTopo, Cluster, ClusterMonitorTopo, Machine, StorageInstance
 from backend.db_meta.models.cluster_monitor import INSTANCE_MONITOR_PLUGINS, SET_NAME_TEMPLATE
+from backend.db_meta.signals import record_host_dbmeta_pushed
 from backend.db_monitor.models import CollectInstance
 from backend.db_services.cmdb.biz import get_or_create_cmdb_module_with_name, get_or_create_set_with_name
 from backend.db_services.ipchooser.constants import IDLE_HOST_MODULE
@@ -192,7 +193,17 @@ class CcManage(object):
             else:
                 host_info_list = [{"bk_host_id": bk_host_id} for bk_host_id in bk_host_ids]
 
-        __, failed_updates = self.batch_update_host(host_info_list, need_monitor)
+        updated_hosts, failed_updates = self.batch_update_host(host_info_list, need_monitor)
+
+        # 记录已推送的 dbm_meta，避免 sync_dirty_host_dbmeta 重复推送
+        failed_host_ids = {fail_update["bk_host_id"] for fail_update in failed_updates}
+        record_host_dbmeta_pushed(
+            {
+                host["bk_host_id"]: host["properties"][CC_HOST_DBM_ATTR]
+                for host in updated_hosts
+                if host["bk_host_id"] not in failed_host_ids and CC_HOST_DBM_ATTR in host["properties"]
+            }
+        )
 
         # 容错处理：逐台机器、逐个属性更新，避免批量更新误伤有效ip
         for fail_update in failed_updates:
@@ -201,6 +212,9 @@ class CcManage(object):
                     CCApi.update_host({"bk_host_id": fail_update["bk_host_id"], "data": {key: value}}, use_admin=True)
                 except Exception as e:  # pylint: disable=wildcard-import
                     logger.error("[update_host_dbmeta] single update error: %s:%s (%s)", key, value, e)
+                else:
+                    if key == CC_HOST_DBM_ATTR:
+                        record_host_dbmeta_pushed({fail_update["bk_host_id"]: value})
 
     def transfer_host_to_idlemodule(
         self, bk_biz_id: int, bk_host_ids: List[int], biz_idle_module: int = None, host_topo: List[Dict] = None
@@ -391,7 +405,6 @@ class CcManage(object):
         return bk_instance_ids[0]
 
     def add_label_for_service_instance(self, bk_instance_ids: list, labels_dict: dict):
-
         # 添加集群信息标签
         if labels_dict:
             CCApi.add_label_for_service_instance(
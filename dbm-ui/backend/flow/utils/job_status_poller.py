@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from pipeline.core.flow.activity import AbstractIntervalGenerator
+
+from backend import env
+from backend.components import JobApi
+from backend.utils.batch_request import request_multi_thread
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("flow")
+
+# 按作业运行时长退避的轮询间隔：(作业运行时长上限, 轮询间隔)，单位秒
+JOB_POLL_BACKOFF_POLICY: List[Tuple[int, int]] = [(60, 5), (5 * 60, 10), (30 * 60, 30)]
+JOB_POLL_MAX_INTERVAL = 60
+
+
+def get_poll_interval(age: float) -> int:
+    """根据作业已运行时长获取轮询间隔"""
+    for max_age, interval in JOB_POLL_BACKOFF_POLICY:
+        if age < max_age:
+            return interval
+    return JOB_POLL_MAX_INTERVAL
+
+
+class JobAgeIntervalGenerator(AbstractIntervalGenerator):
+    """
+    节点调度间隔生成器，调度间隔与 JobStatusPoller 的退避策略保持一致
+    count 为节点已调度次数，由 bamboo 在每次调度前设置，因此可以从中推算作业已运行的时长
+    """
+
+    def next(self):
+        super(JobAgeIntervalGenerator, self).next()
+        age, interval = 0, get_poll_interval(0)
+        for __ in range(self.count):
+            interval = get_poll_interval(age)
+            age += interval
+        return interval
+
+
+class JobStatusPoller(object):
+    """
+    JOB 作业状态的共享轮询器
+    - 各节点调度时只登记在途的作业实例并读取 redis 中的结果，不直接请求 JOB
+    - 同一时刻只有一个调用方(抢到锁的节点)负责轮询，一次批量并发查询所有到期的作业实例，
+      作业实例的下一次轮询时间按运行时长退避，因此 JOB 的请求量与节点数量和调度频率无关
+    - 作业结束后将状态结果写入 redis，节点读取到结果后才会继续后续的处理
+    """
+
+    IN_FLIGHT_KEY = "job_status_poller:in_flight"
+    NEXT_POLL_KEY = "job_status_poller:next_poll"
+    RESULT_KEY = "job_status_poller:result"
+    LOCK_KEY = "job_status_poller:lock"
+
+    def __init__(
+        self,
+        job_api=JobApi,
+        redis_conn=RedisConn,
+        lock_timeout: int = 60,
+        batch_size: int = 500,
+        max_age: int = 24 * 60 * 60,
+    ):
+        """
+        @param job_api: JOB 接口，测试时可以替换为 fake 实现
+        @param redis_conn: redis 连接
+        @param lock_timeout: 轮询锁的过期时间，防止持锁的进程异常退出后锁无法释放
+        @param batch_size: 单次批量轮询的作业实例上限
+        @param max_age: 在途作业的最长保留时间，超时(如节点被撤销)的作业会被清理
+        """
+        self.job_api = job_api
+        self.redis = redis_conn
+        self.lock_timeout = lock_timeout
+        self.batch_size = batch_size
+        self.max_age = max_age
+
+    def register(self, job_instance_id: int):
+        """登记在途作业实例，重复登记不会刷新登记时间"""
+        now = time.time()
+        self.redis.zadd(self.IN_FLIGHT_KEY, {job_instance_id: now}, nx=True)
+        self.redis.zadd(self.NEXT_POLL_KEY, {job_instance_id: now}, nx=True)
+
+    def release(self, job_instance_id: int):
+        """节点处理完成后清理作业实例"""
+        self.redis.zrem(self.IN_FLIGHT_KEY, job_instance_id)
+        self.redis.zrem(self.NEXT_POLL_KEY, job_instance_id)
+        self.redis.hdel(self.RESULT_KEY, job_instance_id)
+
+    def get_result(self, job_instance_id: int) -> Optional[Dict]:
+        """获取已结束作业的状态结果，作业未结束时返回 None"""
+        result = self.redis.hget(self.RESULT_KEY, job_instance_id)
+        return json.loads(result) if result else None
+
+    def get_status(self, job_instance_id: int) -> Optional[Dict]:
+        """
+        节点调度入口：登记作业，按需触发一次批量轮询，然后返回作业结束后的状态结果
+        返回结果与 JobApi.get_job_instance_status(raw=True) 一致，作业未结束时返回 None
+        """
+        self.register(job_instance_id)
+        self.poll()
+        return self.get_result(job_instance_id)
+
+    def _fetch_status(self, job_instance_id: int) -> Dict:
+        payload = {
+            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+            "job_instance_id": job_instance_id,
+            "return_ip_result": True,
+        }
+        try:
+            return self.job_api.get_job_instance_status(payload, raw=True)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(f"[job_status_poller] get status of job {job_instance_id} failed: {err}")
+            return {"result": False, "message": str(err)}
+
+    def poll(self) -> int:
+        """
+        批量轮询所有到期的在途作业，未抢到轮询锁时直接返回
+        @return: 本次轮询的作业数量
+        """
+        token = uuid.uuid4().hex
+        if not self.redis.set(self.LOCK_KEY, token, nx=True, ex=self.lock_timeout):
+            return 0
+
+        try:
+            return self._poll_due_jobs()
+        finally:
+            self._release_lock(token)
+
+    def _release_lock(self, token: str):
+        # 只释放自己持有的锁，避免轮询超时后误删其他调用方的锁
+        if self.redis.get(self.LOCK_KEY) == token:
+            self.redis.delete(self.LOCK_KEY)
+
+    def _poll_due_jobs(self) -> int:
+        now = time.time()
+        self._clean_expired(now)
+
+        due_ids = [int(job_id) for job_id in self.redis.zrangebyscore(self.NEXT_POLL_KEY, 0, now, 0, self.batch_size)]
+        if not due_ids:
+            return 0
+
+        # 先根据作业运行时长推迟下一次轮询时间，避免轮询耗时过长时被其他调用方重复轮询
+        pipeline = self.redis.pipeline(transaction=False)
+        for job_id in due_ids:
+            pipeline.zscore(self.IN_FLIGHT_KEY, job_id)
+        next_poll = {
+            job_id: now + get_poll_interval(now - (registered_at or now))
+            for job_id, registered_at in zip(due_ids, pipeline.execute())
+        }
+        self.redis.zadd(self.NEXT_POLL_KEY, next_poll, xx=True)
+
+        results = request_multi_thread(
+            self._fetch_status,
+            [{"job_instance_id": job_id} for job_id in due_ids],
+            get_data=lambda x: x,
+            in_order=True,
+        )
+        finished = {}
+        for params, resp in results:
+            if resp.get("result") and resp["data"]["finished"]:
+                finished[params["job_instance_id"]] = json.dumps(resp)
+
+        # 已结束的作业不再轮询，等待节点读取结果后清理
+        if finished:
+            self.redis.hset(self.RESULT_KEY, mapping=finished)
+            self.redis.zrem(self.NEXT_POLL_KEY, *finished.keys())
+
+        return len(due_ids)
+
+    def _clean_expired(self, now: float):
+        expired_ids = self.redis.zrangebyscore(self.IN_FLIGHT_KEY, 0, now - self.max_age)
+        if not expired_ids:
+            return
+        self.redis.zrem(self.IN_FLIGHT_KEY, *expired_ids)
+        self.redis.zrem(self.NEXT_POLL_KEY, *expired_ids)
+        self.redis.hdel(self.RESULT_KEY, *expired_ids)
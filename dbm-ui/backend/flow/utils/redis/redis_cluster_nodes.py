@@ -9,30 +9,220 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
-from typing import Dict, List, Tuple
+import bisect
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from backend.flow.consts import ClusterNodeFailStatus, RedisLinkStatus, RedisRole, RedisSlotNum, RedisSlotSep
 from backend.utils.redis import is_valid_ip
 
 
-def decode_slots_from_str(
-    slot_str: str, seq: str
-) -> Tuple[List[int], Dict[int, bool], Dict[int, str], Dict[int, str]]:
+class SlotRangeSet:
     """
-    DecodeSlotsFromStr 解析 slot 字符串,如 0-10,12,100-200,seq为','
+    slot 集合，按有序、不相交且不相邻的闭区间 [(start, end), ...] 存储
+    - 集合运算、计数和 in 判断的复杂度只与区间数量相关，与 slot 数量无关
+    - 不限制 slot 的取值范围，因此也可以用于 twemproxy 的 segment
+    >>> SlotRangeSet.from_str("0-100,200") - SlotRangeSet.from_str("50-60")
+    SlotRangeSet('0-49,61-100,200')
+    """
+
+    __slots__ = ("_ranges", "_starts")
+
+    def __init__(self, ranges: Iterable[Tuple[int, int]] = ()):
+        self._ranges: List[Tuple[int, int]] = self._normalize(ranges)
+        self._starts: Optional[List[int]] = None
+
+    @staticmethod
+    def _normalize(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """排序并合并重叠或相邻的区间"""
+        merged = []
+        for start, end in sorted(ranges):
+            if start > end:
+                raise ValueError(f"invalid slot range: {start}-{end}")
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    @classmethod
+    def _from_sorted_ranges(cls, ranges: List[Tuple[int, int]]) -> "SlotRangeSet":
+        """由已经规范化的区间直接构造，跳过排序合并"""
+        slot_set = cls.__new__(cls)
+        slot_set._ranges = ranges
+        slot_set._starts = None
+        return slot_set
+
+    @classmethod
+    def from_slots(cls, slots: Iterable[int]) -> "SlotRangeSet":
+        """由单个 slot 列表构造，如 [0,1,2,3,10] -> 0-3,10"""
+        ranges = []
+        for slot in sorted(set(slots)):
+            if ranges and slot == ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], slot)
+            else:
+                ranges.append((slot, slot))
+        return cls._from_sorted_ranges(ranges)
+
+    @classmethod
+    def from_str(cls, slot_str: str, seq: str = ",") -> "SlotRangeSet":
+        """解析 0-10,12,100-200 格式的字符串，seq 为空白字符时按任意空白分隔"""
+        items = slot_str.split() if seq.strip() == "" else slot_str.split(seq)
+        ranges = []
+        for item in items:
+            item = item.strip()
+            if not item:
+                continue
+            start, __, end = item.partition(RedisSlotSep.SLOT_SEPARATOR.value)
+            ranges.append((int(start), int(end or start)))
+        return cls(ranges)
+
+    @classmethod
+    def full(cls, start: int = RedisSlotNum.MIN_SLOT.value, end: int = RedisSlotNum.MAX_SLOT.value) -> "SlotRangeSet":
+        return cls._from_sorted_ranges([(int(start), int(end))])
+
+    @property
+    def ranges(self) -> List[Tuple[int, int]]:
+        return list(self._ranges)
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in self._ranges)
+
+    def __bool__(self) -> bool:
+        return bool(self._ranges)
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self._ranges:
+            yield from range(start, end + 1)
+
+    def __contains__(self, slot: int) -> bool:
+        if self._starts is None:
+            self._starts = [start for start, __ in self._ranges]
+        index = bisect.bisect_right(self._starts, slot) - 1
+        return index >= 0 and slot <= self._ranges[index][1]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SlotRangeSet) and self._ranges == other._ranges
+
+    def __hash__(self):
+        return hash(tuple(self._ranges))
+
+    def __str__(self) -> str:
+        return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in self._ranges)
+
+    def __repr__(self) -> str:
+        return f"SlotRangeSet('{self}')"
+
+    def union(self, *others: "SlotRangeSet") -> "SlotRangeSet":
+        ranges = list(self._ranges)
+        for other in others:
+            ranges.extend(other._ranges)
+        return SlotRangeSet(ranges)
+
+    def difference(self, other: "SlotRangeSet") -> "SlotRangeSet":
+        result, other_ranges, index = [], other._ranges, 0
+        for start, end in self._ranges:
+            # 跳过完全位于当前区间左侧的区间
+            while index < len(other_ranges) and other_ranges[index][1] < start:
+                index += 1
+            cursor, probe = start, index
+            while probe < len(other_ranges) and other_ranges[probe][0] <= end:
+                other_start, other_end = other_ranges[probe]
+                if other_start > cursor:
+                    result.append((cursor, other_start - 1))
+                cursor = max(cursor, other_end + 1)
+                probe += 1
+            if cursor <= end:
+                result.append((cursor, end))
+        return SlotRangeSet._from_sorted_ranges(result)
+
+    def intersection(self, other: "SlotRangeSet") -> "SlotRangeSet":
+        result, i, j = [], 0, 0
+        while i < len(self._ranges) and j < len(other._ranges):
+            start = max(self._ranges[i][0], other._ranges[j][0])
+            end = min(self._ranges[i][1], other._ranges[j][1])
+            if start <= end:
+                result.append((start, end))
+            if self._ranges[i][1] < other._ranges[j][1]:
+                i += 1
+            else:
+                j += 1
+        return SlotRangeSet._from_sorted_ranges(result)
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+
+    def split(self, count: int) -> Tuple["SlotRangeSet", "SlotRangeSet"]:
+        """从头部切分出 count 个 slot，返回 (切分出的 slot, 剩余的 slot)"""
+        taken, index = [], 0
+        while count > 0 and index < len(self._ranges):
+            start, end = self._ranges[index]
+            if end - start + 1 <= count:
+                taken.append((start, end))
+                count -= end - start + 1
+                index += 1
+                continue
+            taken.append((start, start + count - 1))
+            rest = [(start + count, end)] + self._ranges[index + 1 :]
+            return SlotRangeSet._from_sorted_ranges(taken), SlotRangeSet._from_sorted_ranges(rest)
+        return SlotRangeSet._from_sorted_ranges(taken), SlotRangeSet._from_sorted_ranges(self._ranges[index:])
+
+
+def plan_slots_migration(
+    node_slots: Dict[str, SlotRangeSet], target_nodes: List[str]
+) -> List[Tuple[str, str, SlotRangeSet]]:
+    """
+    生成 slot 均衡迁移计划，将 node_slots 中所有 slot 平均分配到 target_nodes
+    不在 target_nodes 中的节点(如待下架节点)的 slot 会全部迁出
+    @param node_slots: 节点当前负责的 slot，如 {"1.1.1.1:30000": SlotRangeSet.from_str("0-8191")}
+    @param target_nodes: 迁移后负责 slot 的节点
+    @return: [(源节点, 目标节点, 迁移的 slot)]
+    """
+    if not target_nodes:
+        return []
+
+    total = sum(len(slots) for slots in node_slots.values())
+    per_node, remainder = divmod(total, len(target_nodes))
+    # 已经持有较多 slot 的节点优先分配余数，减少迁移量
+    ordered_targets = sorted(target_nodes, key=lambda node: -len(node_slots.get(node, SlotRangeSet())))
+    expected = {node: per_node + (1 if index < remainder else 0) for index, node in enumerate(ordered_targets)}
+
+    surplus: List[Tuple[str, SlotRangeSet]] = []
+    for node, slots in node_slots.items():
+        extra = len(slots) - expected.get(node, 0)
+        if extra > 0:
+            # 从尾部的区间开始迁出，保持节点剩余 slot 的连续性
+            __, migrate = slots.split(len(slots) - extra)
+            surplus.append((node, migrate))
+
+    plans = []
+    for node in ordered_targets:
+        need = expected[node] - len(node_slots.get(node, SlotRangeSet()))
+        while need > 0 and surplus:
+            src_node, src_slots = surplus[0]
+            migrate, rest = src_slots.split(need)
+            plans.append((src_node, node, migrate))
+            need -= len(migrate)
+            if rest:
+                surplus[0] = (src_node, rest)
+            else:
+                surplus.pop(0)
+    return plans
+
+
+def parse_slots(slot_str: str, seq: str) -> Tuple[SlotRangeSet, Dict[int, str], Dict[int, str]]:
+    """
+    解析 slot 字符串,如 0-10,12,100-200,seq为','
     同时可以解析:
     migrating slot: ex: [42->-67ed2db8d677e59ec4a4cefb06858cf2a1a89fa1]
     importing slot: ex: [42-<-67ed2db8d677e59ec4a4cefb06858cf2a1a89fa1]
+    @return: (slot 集合, migrating slots, importing slots)
     """
-    slot_map = {}
+    ranges = []
     migrating_slots = {}
     importing_slots = {}
-    items = []
-    slot = 0
-    if seq == "" or seq == " " or seq == "\t" or seq == "\n":
-        items = slot_str.split()
-    else:
-        items = slot_str.split(seq)
+    items = slot_str.split() if seq.strip() == "" else slot_str.split(seq)
     for slot_item in items:
         slot_item = slot_item.strip()
         list02 = slot_item.split(RedisSlotSep.SLOT_SEPARATOR.value)
@@ -41,76 +231,46 @@ def decode_slots_from_str(
             slot = int(list02[0].lstrip("[").rstrip("]"))
             if separator == RedisSlotSep.IMPORTING_SEPARATOR.value:
                 importing_slots[slot] = list02[2].rstrip("]")
-            elif separator == RedisSlotSep.MIGRATING_SEPARATOR:
+            elif separator == RedisSlotSep.MIGRATING_SEPARATOR.value:
                 migrating_slots[slot] = list02[2].rstrip("]")
             else:
                 raise Exception("impossible to decode slotStr:{}".format(slot_item))
-        elif len(list02) == 1:
-            num01 = int(list02[0])
-            if num01 < RedisSlotNum.MIN_SLOT.value or num01 > RedisSlotNum.MAX_SLOT.value:
-                raise Exception(
-                    "slot:{} in param:{} not correct,valid range [{},{}]".format(
-                        num01,
-                        slot_str,
-                        RedisSlotNum.MIN_SLOT.value,
-                        RedisSlotNum.MAX_SLOT.value,
-                    )
-                )
-            slot_map[num01] = True
-        elif len(list02) == 2:
+        elif len(list02) in [1, 2]:
             start = int(list02[0])
-            end = int(list02[1])
-            if start < RedisSlotNum.MIN_SLOT.value or start > RedisSlotNum.MAX_SLOT.value:
-                raise Exception(
-                    "slot:{} in param:{} not correct,valid range [{},{}]".format(
-                        start,
-                        slot_str,
-                        RedisSlotNum.MIN_SLOT.value,
-                        RedisSlotNum.MAX_SLOT.value,
+            end = int(list02[-1])
+            for num01 in [start, end]:
+                if num01 < RedisSlotNum.MIN_SLOT.value or num01 > RedisSlotNum.MAX_SLOT.value:
+                    raise Exception(
+                        "slot:{} in param:{} not correct,valid range [{},{}]".format(
+                            num01,
+                            slot_str,
+                            RedisSlotNum.MIN_SLOT.value,
+                            RedisSlotNum.MAX_SLOT.value,
+                        )
                     )
-                )
-            if end < RedisSlotNum.MIN_SLOT.value or end > RedisSlotNum.MAX_SLOT.value:
-                raise Exception(
-                    "slot:{} in param:{} not correct,valid range [{},{}]".format(
-                        end,
-                        slot_str,
-                        RedisSlotNum.MIN_SLOT.value,
-                        RedisSlotNum.MAX_SLOT.value,
-                    )
-                )
-            for num01 in range(start, end + 1):
-                slot_map[num01] = True
-    return list(slot_map.keys()), slot_map, migrating_slots, importing_slots
+            ranges.append((start, end))
+    return SlotRangeSet(ranges), migrating_slots, importing_slots
+
+
+def decode_slots_from_str(
+    slot_str: str, seq: str
+) -> Tuple[List[int], Dict[int, bool], Dict[int, str], Dict[int, str]]:
+    """
+    DecodeSlotsFromStr 解析 slot 字符串,如 0-10,12,100-200,seq为','
+    会展开为单个 slot 的列表和字典，新代码请直接使用 parse_slots 返回的 SlotRangeSet
+    """
+    slot_set, migrating_slots, importing_slots = parse_slots(slot_str, seq)
+    slots = list(slot_set)
+    return slots, dict.fromkeys(slots, True), migrating_slots, importing_slots
 
 
-def convert_slot_to_str(slots: List[int]) -> str:
+def convert_slot_to_str(slots: Union[Iterable[int], SlotRangeSet]) -> str:
     """
     将slots:[0,1,2,3,4,10,11,12,13,17] 按照 0-4,10-13,17 打印
     """
-    if len(slots) == 0:
-        return ""
-    str01 = ""
-    start = slots[0]
-    curr = slots[0]
-    for item in slots:
-        next = item
-        if next == curr:
-            continue
-        if curr == next - 1:
-            curr = next
-            continue
-        if start == curr:
-            str01 = "{},{}".format(str01, start)
-        else:
-            str01 = "{},{}-{}".format(str01, start, curr)
-        start = next
-        curr = next
-    if start == curr:
-        str01 = "{},{}".format(str01, start)
-    else:
-        str01 = "{},{}-{}".format(str01, start, curr)
-    str01 = str01.strip(",")
-    return str01
+    if not isinstance(slots, SlotRangeSet):
+        slots = SlotRangeSet.from_slots(slots)
+    return str(slots)
 
 
 class ClusterNodeData:
@@ -134,8 +294,7 @@ class ClusterNodeData:
         self.pong_recv = 0
         self.config_epoch = 0
         self.slot_src_str = ""
-        self.slots = []
-        self.slots_map = {}
+        self.slot_set = SlotRangeSet()
         self.migrating_slots = {}
         self.importing_slots = {}
 
@@ -149,12 +308,25 @@ class ClusterNodeData:
                 self.master_id,
                 self.link_state,
                 self.fail_status,
-                convert_slot_to_str(self.slots),
+                self.slot_set,
                 len(self.migrating_slots),
                 len(self.importing_slots),
             )
         )
 
+    @property
+    def slots(self) -> List[int]:
+        """展开后的 slot 列表，判断 slot 数量或归属时请使用 slot_cnt 和 slot_set"""
+        return list(self.slot_set)
+
+    @slots.setter
+    def slots(self, slots: Iterable[int]):
+        self.slot_set = SlotRangeSet.from_slots(slots)
+
+    @property
+    def slots_map(self) -> Dict[int, bool]:
+        return dict.fromkeys(self.slot_set, True)
+
     def set_role(self, flags):
         self.role = ""
         vals = flags.split(",")
@@ -175,14 +347,14 @@ class ClusterNodeData:
         else:
             if self.master_id != "":
                 return RedisRole.SLAVE.value
-            if len(self.slots) > 0:
+            if self.slot_set:
                 return RedisRole.MASTER.value
 
         return RedisRole.UNKNOWN.value
 
     @property
     def slot_cnt(self):
-        return len(self.slots)
+        return len(self.slot_set)
 
     def set_link_status(self, status):
         self.link_state = ""
@@ -219,92 +391,108 @@ class ClusterNodeData:
         return len(self.fail_status) == 0 and self.link_state == RedisLinkStatus.CONNECTED.value
 
 
+class ClusterNodes:
+    """
+    redis 'cluster nodes' 命令结果的解析模型，文本只解析一次，按地址、节点ID、角色等维度建立索引
+    """
+
+    def __init__(self, nodes: List[ClusterNodeData]):
+        self.nodes = nodes
+        self.addr_to_node: Dict[str, ClusterNodeData] = {node.addr: node for node in nodes}
+        self.node_id_to_node: Dict[str, ClusterNodeData] = {node.node_id: node for node in nodes}
+
+    @classmethod
+    def parse(cls, input: Union[str, "ClusterNodes"]) -> "ClusterNodes":
+        if isinstance(input, ClusterNodes):
+            return input
+
+        nodes = []
+        for line in input.split("\n"):
+            values = line.split()
+            if len(values) < 8:
+                # last line is always empty
+                # not enough values in line split, skip line
+                continue
+            nodes.append(cls._parse_node(values))
+        return cls(nodes)
+
+    @staticmethod
+    def _parse_node(values: List[str]) -> ClusterNodeData:
+        node = ClusterNodeData()
+
+        node.node_id = values[0]
+        # remove trailing port for cluster internal protocol
+        ipPort: list = values[1].split("@")
+        node.addr = ipPort[0]
+        if node.addr != "":
+            list02 = node.addr.split(":")
+            if is_valid_ip(list02[0]):
+                node.ip = list02[0]
+            else:
+                l01 = node.addr.split(".")
+                if len(l01) > 0:
+                    node.ip = l01[0]
+            node.port = int(list02[1])
+        node.cport = int(ipPort[1])
+        node.set_role(values[2])
+        node.set_failure_status(values[2])
+        node.set_referent_master(values[3])
+        node.ping_sent = int(values[4])
+        node.pong_recv = int(values[5])
+        node.config_epoch = int(values[6])
+        node.set_link_status(values[7])
+
+        node.slot_src_str = " ".join(values[8:])
+        node.slot_set, node.migrating_slots, node.importing_slots = parse_slots(node.slot_src_str, " ")
+
+        if values[2].startswith("myself"):
+            node.is_myself = True
+        return node
+
+    @property
+    def masters_with_slots(self) -> List[ClusterNodeData]:
+        return [node for node in self.nodes if node.get_role() == RedisRole.MASTER.value and node.slot_set]
+
+    @property
+    def slaves_by_master_id(self) -> Dict[str, List[ClusterNodeData]]:
+        masters = {}
+        for node in self.nodes:
+            if node.get_role() == RedisRole.SLAVE.value:
+                masters.setdefault(node.master_id, []).append(node)
+        return masters
+
+    @property
+    def assigned_slots(self) -> SlotRangeSet:
+        """所有 master 负责的 slot"""
+        return SlotRangeSet().union(*[node.slot_set for node in self.masters_with_slots])
+
+    @property
+    def missing_slots(self) -> SlotRangeSet:
+        """没有 master 负责的 slot"""
+        return SlotRangeSet.full() - self.assigned_slots
+
+
 def decode_cluster_nodes(input: str) -> Tuple[List[ClusterNodeData], Dict[str, ClusterNodeData]]:
     """
     解析redis cluster nodes命令返回的信息
     与'cluster nodes'命令返回的信息对应
     """
-    node_list = []
-    node_map = {}
-    lines = input.split("\n")
-    for line in lines:
-        values = line.split()
-        if len(values) < 8:
-            # last line is always empty
-            # not enough values in line split, skip line
-            continue
-        else:
-            node = ClusterNodeData()
-
-            node.node_id = values[0]
-            # remove trailing port for cluster internal protocol
-            ipPort: list = values[1].split("@")
-            node.addr = ipPort[0]
-            if node.addr != "":
-                list02 = node.addr.split(":")
-                if is_valid_ip(list02[0]):
-                    node.ip = list02[0]
-                else:
-                    l01 = node.addr.split(".")
-                    if len(l01) > 0:
-                        node.ip = l01[0]
-                node.port = int(list02[1])
-            node.cport = int(ipPort[1])
-            node.set_role(values[2])
-            node.set_failure_status(values[2])
-            node.set_referent_master(values[3])
-            node.ping_sent = int(values[4])
-            node.pong_recv = int(values[5])
-            node.config_epoch = int(values[6])
-            node.set_link_status(values[7])
-
-            for slot in values[8:]:
-                if node.slot_src_str == "":
-                    node.slot_src_str = slot
-                else:
-                    node.slot_src_str = f"{node.slot_src_str} {slot}"
-                slots01, _, importing_slots, migrating_slots = decode_slots_from_str(slot, " ")
-                node.slots.extend(slots01)
-                for s01 in slots01:
-                    node.slots_map[s01] = True
-                for s01, nodeid in importing_slots.items():
-                    node.importing_slots[s01] = nodeid
-                for s01, nodeid in migrating_slots.items():
-                    node.migrating_slots[s01] = nodeid
-
-            if values[2].startswith("myself"):
-                node.is_myself = True
-            node_list.append(node)
-            node_map[node.addr] = node
-
-    return node_list, node_map
-
-
-def get_masters_with_slots(input: str) -> List[ClusterNodeData]:
+    cluster_nodes = ClusterNodes.parse(input)
+    return cluster_nodes.nodes, cluster_nodes.addr_to_node
+
+
+def get_masters_with_slots(input: Union[str, ClusterNodes]) -> List[ClusterNodeData]:
     """
     获取所有有slots的master节点
     """
-    nodes, _ = decode_cluster_nodes(input)
-    masters = []
-    for node in nodes:
-        if node.get_role() == RedisRole.MASTER.value and node.slot_cnt > 0:
-            masters.append(node)
-    return masters
+    return ClusterNodes.parse(input).masters_with_slots
 
 
-def group_slaves_by_master_id(input: str) -> Dict[str, List[ClusterNodeData]]:
+def group_slaves_by_master_id(input: Union[str, ClusterNodes]) -> Dict[str, List[ClusterNodeData]]:
     """
     按照master id分组slave节点
     """
-    nodes, _ = decode_cluster_nodes(input)
-    masters = {}
-    for node in nodes:
-        if node.get_role() == RedisRole.SLAVE.value:
-            if node.master_id in masters:
-                masters[node.master_id].append(node)
-            else:
-                masters[node.master_id] = [node]
-    return masters
+    return ClusterNodes.parse(input).slaves_by_master_id
 
 
 class CmdClusterInfo:
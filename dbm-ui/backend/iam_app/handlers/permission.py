@@ -16,6 +16,7 @@ from typing import Any, Callable, Dict, List, Tuple, Union
 
 from blueapps.account.models import User
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import ugettext as _
 from iam import IAM, DummyIAM, MultiActionRequest, ObjectSet, Request, Resource, Subject, make_expression
 from iam.apply.models import (
@@ -164,6 +165,90 @@ class Permission(object):
 
         return multi_request
 
+    @staticmethod
+    def _policy_cache_key(username: str, action_id: str) -> str:
+        return f"iam_policy:{username}:{action_id}"
+
+    @classmethod
+    def invalidate_policy_cache(cls, username: str, actions: List[Union[ActionMeta, str]] = None):
+        """
+        清理用户的权限策略缓存，在用户权限发生变更(如新建实例关联授权)后调用
+        :param username: 用户名
+        :param actions: 动作列表，为空时清理所有动作
+        """
+        action_ids = [ActionEnum.get_action_by_id(action).id for action in actions] if actions else _all_actions
+        cache.delete_many([cls._policy_cache_key(username, action_id) for action_id in action_ids])
+
+    def get_actions_policies(self, actions: List[Union[ActionMeta, str]]) -> Dict[str, List]:
+        """
+        获取用户在一批动作下的全部策略(不带资源查询)，策略会按用户+动作短时间缓存
+        同一用户的列表页翻页、批量鉴权可以复用策略在本地计算，无需每次都请求权限中心
+        缓存中缺失的动作合并为一次 policy_query_by_actions 请求
+        :param actions: 动作列表
+        :return: {action_id: policies}
+        """
+        action_ids = [ActionEnum.get_action_by_id(action).id for action in actions]
+        cache_keys = {action_id: self._policy_cache_key(self.username, action_id) for action_id in action_ids}
+        cached_policies = cache.get_many(list(cache_keys.values())) if env.BK_IAM_POLICY_CACHE_TIME else {}
+        action_policies = {
+            action_id: cached_policies[cache_key]
+            for action_id, cache_key in cache_keys.items()
+            if cache_key in cached_policies
+        }
+
+        missing_action_ids = [action_id for action_id in cache_keys if action_id not in action_policies]
+        if missing_action_ids:
+            action_policies.update({action_id: [] for action_id in missing_action_ids})
+            results = self._iam._do_policy_query_by_actions(
+                self.make_multi_request(missing_action_ids), with_resources=False
+            )
+            for result in results or []:
+                if result["action"]["id"] in action_policies:
+                    action_policies[result["action"]["id"]] = result["condition"] or []
+            if env.BK_IAM_POLICY_CACHE_TIME:
+                cache.set_many(
+                    {cache_keys[action_id]: action_policies[action_id] for action_id in missing_action_ids},
+                    env.BK_IAM_POLICY_CACHE_TIME,
+                )
+        return {action_id: action_policies[action_id] for action_id in cache_keys}
+
+    def get_action_policies(self, action: Union[ActionMeta, str]) -> List:
+        """
+        获取用户在某个动作下的全部策略(不带资源查询)
+        :param action: 动作ID or ActionMeta实例
+        """
+        action = ActionEnum.get_action_by_id(action)
+        return self.get_actions_policies([action])[action.id]
+
+    @staticmethod
+    def _is_local_resources(resources: List[Resource]) -> bool:
+        return not env.BK_IAM_SKIP and all(resource.system == env.BK_IAM_SYSTEM_ID for resource in resources or [])
+
+    def _eval_action_policies(self, action: ActionMeta, obj_set: ObjectSet) -> bool:
+        policies = self.get_action_policies(action)
+        if not policies:
+            return False
+        return self._iam._eval_expr(make_expression(policies), obj_set)
+
+    def _batch_eval_action_policies(
+        self, actions: List[ActionMeta], resources: List[List[Resource]]
+    ) -> Dict[str, Dict[str, bool]]:
+        """使用缓存的策略对一批资源进行本地鉴权，返回格式与 batch_resource_multi_actions_allowed 一致"""
+        # 每个动作的策略表达式只生成一次
+        expressions = {
+            action_id: make_expression(policies) if policies else None
+            for action_id, policies in self.get_actions_policies(actions).items()
+        }
+
+        batch_permission = {}
+        for resource_list in resources:
+            obj_set, resource_id = self._iam._build_object_set(env.BK_IAM_SYSTEM_ID, resource_list, only_local=False)
+            batch_permission[resource_id] = {
+                action_id: bool(expression and self._iam._eval_expr(expression, obj_set))
+                for action_id, expression in expressions.items()
+            }
+        return batch_permission
+
     def is_allowed(
         self, action: Union[ActionMeta, str], resources: List[Resource], is_raise_exception: bool = False
     ) -> bool:
@@ -183,9 +268,14 @@ class Permission(object):
         if not action.related_resource_types:
             resources = []
 
-        request = self.make_request(action, resources)
         try:
-            permission = self._iam.is_allowed(request)
+            if self._is_local_resources(resources):
+                # 本系统的资源可以直接使用缓存的策略在本地计算
+                obj_set, __ = self._iam._build_object_set(env.BK_IAM_SYSTEM_ID, resources, only_local=True)
+                permission = self._eval_action_policies(action, obj_set)
+            else:
+                # 跨系统资源依赖需要权限中心进行两阶段计算
+                permission = self._iam.is_allowed(self.make_request(action, resources))
         except AuthAPIError as e:
             logger.exception(f"IAM AuthAPIError: {e}")
             permission = False
@@ -233,10 +323,15 @@ class Permission(object):
         :param is_raise_exception: 鉴权失败时是否抛出异常
         """
 
-        multi_request = self.make_multi_request(actions)
+        actions = [ActionEnum.get_action_by_id(action) for action in actions]
         batch_permission = {}
         try:
-            batch_permission = self._iam.batch_resource_multi_actions_allowed(multi_request, resources)
+            if env.BK_IAM_SKIP:
+                batch_permission = self._iam.batch_resource_multi_actions_allowed(
+                    self.make_multi_request(actions), resources
+                )
+            else:
+                batch_permission = self._batch_eval_action_policies(actions, resources)
         except Exception as e:  # pylint: disable=broad-except
             logger.exception(f"IAM AuthAPIError: {e}")
             for index in range(len(resources)):
@@ -268,8 +363,7 @@ class Permission(object):
 
         # 获得策略数据
         try:
-            request = self.make_request(action=action)
-            policies = self._iam._do_policy_query(request)
+            policies = self.get_action_policies(action)
         except AuthAPIError as e:
             logger.exception(f"IAM AuthAPIError: {e}")
             return []
@@ -434,7 +528,9 @@ class Permission(object):
             "name": resource.attribute.get("name", resource.id) if resource.attribute else resource.id,
             "creator": creator or self.username,
         }
-        return self._grant_actions(resource, application, self._iam.grant_resource_creator_actions)
+        grant_result = self._grant_actions(resource, application, self._iam.grant_resource_creator_actions)
+        self.invalidate_policy_cache(creator or self.username)
+        return grant_result
 
     def grant_creator_actions_attr(self, resource: Resource, creator: str = None):
         """
@@ -453,7 +549,9 @@ class Permission(object):
             "creator": creator or self.username,
             "attributes": attributes,
         }
-        return self._grant_actions(resource, application, self._iam.grant_resource_creator_action_attributes)
+        grant_result = self._grant_actions(resource, application, self._iam.grant_resource_creator_action_attributes)
+        self.invalidate_policy_cache(creator or self.username)
+        return grant_result
 
     @classmethod
     def insert_permission_field(
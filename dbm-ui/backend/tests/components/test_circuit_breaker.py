@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from backend.components.base import DataAPI
+from backend.components.circuit_breaker import CircuitBreaker, CircuitState
+from backend.exceptions import ApiError, ApiRequestError
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # 注入的响应延迟(秒)
+    latency = 0
+    hits = 0
+
+    def do_POST(self):
+        _StubHandler.hits += 1
+        time.sleep(_StubHandler.latency)
+        body = json.dumps({"result": True, "code": 0, "data": {"ok": True}, "message": ""}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _StubHandler.latency, _StubHandler.hits = 0, 0
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _make_api(base, circuit_breaker, max_retry_times=3):
+    return DataAPI(
+        method="POST",
+        base=base,
+        url="stub/",
+        module="stub",
+        freeze_params=True,
+        default_timeout=0.2,
+        max_retry_times=max_retry_times,
+        circuit_breaker=circuit_breaker,
+    )
+
+
+class TestCircuitBreaker:
+    def test_success_keeps_closed(self, stub_server):
+        breaker = CircuitBreaker(name="stub", failure_threshold=2)
+        api = _make_api(stub_server, breaker)
+        assert api({}) == {"ok": True}
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_open_after_timeouts_and_fast_fail(self, stub_server):
+        breaker = CircuitBreaker(name="stub", failure_threshold=2, recovery_timeout=60, min_retries=10)
+        api = _make_api(stub_server, breaker)
+        _StubHandler.latency = 0.5
+
+        with pytest.raises((ApiError, ApiRequestError)):
+            api({})
+        assert breaker.state == CircuitState.OPEN
+
+        # 熔断打开后不再请求上游，直接失败
+        hits = _StubHandler.hits
+        start = time.monotonic()
+        with pytest.raises(ApiRequestError):
+            api({})
+        assert time.monotonic() - start < 0.2
+        assert _StubHandler.hits == hits
+
+    def test_half_open_probe_recovers(self, stub_server):
+        breaker = CircuitBreaker(name="stub", failure_threshold=1, recovery_timeout=0.1)
+        api = _make_api(stub_server, breaker, max_retry_times=1)
+        _StubHandler.latency = 0.5
+        with pytest.raises((ApiError, ApiRequestError)):
+            api({})
+        assert breaker.state == CircuitState.OPEN
+
+        _StubHandler.latency = 0
+        time.sleep(0.15)
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert api({}) == {"ok": True}
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_half_open_probe_released_on_unexpected_error(self, stub_server):
+        breaker = CircuitBreaker(name="stub", failure_threshold=1, recovery_timeout=0.1)
+        api = _make_api(stub_server, breaker, max_retry_times=1)
+        _StubHandler.latency = 0.5
+        with pytest.raises((ApiError, ApiRequestError)):
+            api({})
+
+        _StubHandler.latency = 0
+        time.sleep(0.15)
+        # 探测请求抛出非 requests 异常(如代码缺陷)，不计入失败，但需要释放探测名额
+        with patch.object(DataAPI, "_send", side_effect=KeyError("unexpected")):
+            with pytest.raises(Exception):
+                api({})
+        assert breaker.state == CircuitState.HALF_OPEN
+
+        # 下一个请求可以继续作为探测请求，成功后恢复
+        assert api({}) == {"ok": True}
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_retry_budget_exhausted(self, stub_server):
+        breaker = CircuitBreaker(name="stub", failure_threshold=100, retry_ratio=0, min_retries=1)
+        api = _make_api(stub_server, breaker, max_retry_times=5)
+        _StubHandler.latency = 0.5
+
+        # 预算只允许一次重试，因此只会请求上游两次
+        with pytest.raises(ApiRequestError):
+            api({})
+        assert _StubHandler.hits == 2
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from backend.components import transport
+from backend.components.base import DataAPI
+from backend.components.transport import SessionPool, get_endpoint_metrics
+from backend.exceptions import ApiResultError
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # 使用 HTTP/1.1 才能保持长连接
+    protocol_version = "HTTP/1.1"
+    # 每次请求的客户端地址，用于判断是否复用了连接
+    client_addresses = []
+    result = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        _StubHandler.client_addresses.append(self.client_address)
+        body = json.dumps({"result": _StubHandler.result, "code": 0, "data": {"ok": True}, "message": ""}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "bk_token=stub; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _StubHandler.client_addresses, _StubHandler.result = [], True
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session_pool():
+    # 使用独立的会话池和指标，避免受其他用例建立的连接影响
+    pool = SessionPool(pool_connections=1, pool_maxsize=2)
+    with patch("backend.components.base.session_pool", pool), patch.object(transport.endpoint_metrics, "_metrics", {}):
+        yield pool
+
+
+def _make_api(base, url="stub/"):
+    return DataAPI(method="POST", base=base, url=url, module="stub", default_timeout=1, max_retry_times=1)
+
+
+class TestSessionPool:
+    def test_share_session_by_host(self):
+        pool = SessionPool(pool_connections=1, pool_maxsize=2)
+        session = pool.get_session("http://127.0.0.1:8000/api/a/")
+
+        # 同一主机共享会话，不同主机或 ssl 配置使用不同的会话
+        assert pool.get_session("http://127.0.0.1:8000/api/b/?a=1") is session
+        assert pool.get_session("http://127.0.0.1:8001/api/a/") is not session
+        assert pool.get_session("http://127.0.0.1:8000/api/a/", ssl=True) is not session
+
+        # fork 后的子进程丢弃父进程的会话
+        pool.reset()
+        assert pool.get_session("http://127.0.0.1:8000/api/a/") is not session
+
+    def test_disable_keep_alive(self):
+        pool = SessionPool(pool_connections=1, pool_maxsize=2, keep_alive=False)
+        assert pool.get_session("http://127.0.0.1:8000/").headers["Connection"] == "close"
+
+    def test_reuse_connection(self, stub_server, session_pool):
+        api = _make_api(stub_server)
+        assert api({}) == {"ok": True}
+        assert api({}) == {"ok": True}
+
+        # 多次请求复用同一个长连接，且共享会话不保存响应的 cookie
+        assert len(set(_StubHandler.client_addresses)) == 1
+        assert not session_pool.get_session(stub_server).cookies
+
+
+class TestEndpointMetrics:
+    def test_record_by_endpoint(self, stub_server, session_pool):
+        api, other_api = _make_api(stub_server), _make_api(stub_server, url="other/")
+        api({})
+        other_api({})
+        _StubHandler.result = False
+        with pytest.raises(ApiResultError):
+            api({})
+
+        # 按模块+请求方法+地址模板分别统计调用次数、失败次数和耗时
+        metrics = get_endpoint_metrics()
+        assert set(metrics) == {api.endpoint, other_api.endpoint}
+        assert metrics[api.endpoint]["count"] == 2 and metrics[api.endpoint]["error_count"] == 1
+        assert metrics[other_api.endpoint]["count"] == 1 and metrics[other_api.endpoint]["error_count"] == 0
+        assert metrics[api.endpoint]["max_cost"] >= metrics[api.endpoint]["avg_cost"] > 0
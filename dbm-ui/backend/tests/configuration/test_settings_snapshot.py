@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.configuration.models.system import BizSettings, SettingsSnapshot
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeRedis:
+    """只实现 SettingsSnapshot 用到的 redis 命令"""
+
+    def __init__(self):
+        self.strings = {}
+
+    def get(self, name):
+        return self.strings.get(name)
+
+    def incr(self, name):
+        self.strings[name] = str(int(self.strings.get(name, 0)) + 1)
+        return self.strings[name]
+
+
+class TestSettingsSnapshot:
+    def test_cache_until_version_changed(self):
+        redis = FakeRedis()
+        snapshot = SettingsSnapshot("version", check_interval=0, redis_conn=redis)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return len(loads)
+
+        assert snapshot.get({"key": "a"}, loader) == 1
+        assert snapshot.get({"key": "a"}, loader) == 1
+        assert len(loads) == 1
+
+        # 其他进程修改配置后自增版本号，本进程的快照随之失效
+        redis.incr("version")
+        assert snapshot.get({"key": "a"}, loader) == 2
+
+    def test_version_checked_by_interval(self):
+        redis = FakeRedis()
+        snapshot = SettingsSnapshot("version", check_interval=60, redis_conn=redis)
+        snapshot.get({"key": "a"}, lambda: "old")
+        redis.incr("version")
+        assert snapshot.get({"key": "a"}, lambda: "new") == "old"
+
+        snapshot.bump()
+        assert snapshot.get({"key": "a"}, lambda: "new") == "new"
+
+    def test_setting_value_refresh_on_save(self):
+        assert BizSettings.get_setting_value(bk_biz_id=1, key="test", default=[]) == []
+
+        BizSettings.insert_setting_value(bk_biz_id=1, key="test", value=["a"], value_type="list")
+        value = BizSettings.get_setting_value(bk_biz_id=1, key="test")
+        assert value == ["a"]
+
+        # 修改返回值不影响快照
+        value.append("b")
+        assert BizSettings.get_setting_value(bk_biz_id=1, key="test") == ["a"]
@@ -16,9 +16,11 @@ import pytest
 from django.contrib.auth import get_user_model
 from django.utils.crypto import get_random_string
 
+from backend.configuration.models.system import BizSettings, SystemSettings
 from backend.db_meta import models
 from backend.db_meta.enums import AccessLayer, ClusterType, MachineType
 from backend.db_meta.models import BKCity, Cluster, DBModule, LogicalCity, Machine
+from backend.db_package.models import Package
 from backend.tests.constants import TEST_ADMIN_USERNAME
 from backend.tests.mock_data import constant
 from backend.tests.mock_data.components import cc
@@ -36,6 +38,15 @@ def mock_bk_user(username):
     return user
 
 
+@pytest.fixture(autouse=True)
+def clear_settings_snapshot():
+    # 测试结束时数据库会回滚，但不会触发配置变更信号，需要手动丢弃配置快照和介质包清单
+    yield
+    SystemSettings.snapshot().clear()
+    BizSettings.snapshot().clear()
+    Package.manifest_snapshot().clear()
+
+
 @pytest.fixture
 def bk_user():
     return mock_bk_user(get_random_string(6))
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceStatus
+from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def init_clusters(init_proxy_machine, init_cluster):
+    machine = Machine.objects.first()
+    normal_cluster = Cluster.objects.first()
+    abnormal_cluster = Cluster.objects.create(
+        bk_biz_id=constant.BK_BIZ_ID,
+        name="abnormal",
+        db_module_id=constant.DB_MODULE_ID,
+        immute_domain="abnormal.db.com",
+        cluster_type=ClusterType.TenDBHA.value,
+    )
+
+    for port, cluster, status in [
+        (10000, normal_cluster, InstanceStatus.RUNNING.value),
+        (10001, abnormal_cluster, InstanceStatus.UNAVAILABLE.value),
+    ]:
+        proxy = ProxyInstance.objects.create(
+            machine=machine, port=port, bk_biz_id=constant.BK_BIZ_ID, cluster_type=cluster.cluster_type, status=status
+        )
+        proxy.cluster.add(cluster)
+
+    for port, cluster, inner_role, status in [
+        (20000, normal_cluster, InstanceInnerRole.MASTER.value, InstanceStatus.RUNNING.value),
+        (20001, abnormal_cluster, InstanceInnerRole.MASTER.value, InstanceStatus.RUNNING.value),
+        (20002, abnormal_cluster, InstanceInnerRole.SLAVE.value, InstanceStatus.UNAVAILABLE.value),
+    ]:
+        storage = StorageInstance.objects.create(
+            machine=machine,
+            port=port,
+            bk_biz_id=constant.BK_BIZ_ID,
+            cluster_type=cluster.cluster_type,
+            instance_inner_role=inner_role,
+            status=status,
+        )
+        storage.cluster.add(cluster)
+
+    return [normal_cluster, abnormal_cluster]
+
+
+class TestCluster:
+    def test_fill_status_flags(self, init_clusters):
+        # 批量计算的状态位与逐个集群查询的结果一致
+        expected = {cluster.id: cluster.status_flag for cluster in Cluster.objects.all()}
+        clusters = list(Cluster.objects.all())
+        status_flags = Cluster.fill_status_flags(clusters)
+
+        assert {cluster_id: flag.value for cluster_id, flag in status_flags.items()} == expected
+        assert {cluster.id: cluster.status_flag for cluster in clusters} == expected
+        assert expected[init_clusters[0].id] == 0
+        assert expected[init_clusters[1].id] != 0
+
+    def test_fill_access_ports(self, init_clusters):
+        expected = {cluster.id: cluster.access_port for cluster in Cluster.objects.all()}
+        clusters = list(Cluster.objects.all())
+
+        assert Cluster.fill_access_ports(clusters) == expected
+        assert {cluster.id: cluster.access_port for cluster in clusters} == expected
+        assert expected == {init_clusters[0].id: 10000, init_clusters[1].id: 10001}
@@ -14,8 +14,11 @@ import json
 from unittest.mock import patch
 
 import pytest
+from django.core.cache.backends.locmem import LocMemCache
 
+from backend.constants import QUERY_CMDB_LIMIT
 from backend.db_meta import api
+from backend.db_meta.exceptions import HostDoseNotExistInCmdbException
 from backend.db_meta.models import Cluster, Machine
 from backend.tests.db_meta.api.dbha.test_apis import TEST_PROXY_PORT1, TEST_PROXY_PORT2
 from backend.tests.mock_data.components import cc
@@ -82,3 +85,64 @@ class TestMachine:
                 },
             ],
         }
+
+
+class FakeHostCCApi:
+    """按 bk_host_id 过滤返回主机，记录每次查询的主机ID"""
+
+    def __init__(self, bk_host_ids):
+        self.hosts = {
+            bk_host_id: {"bk_host_id": bk_host_id, "idc_name": "idc", "idc_id": 1} for bk_host_id in bk_host_ids
+        }
+        self.queried_host_ids = []
+
+    def list_hosts_without_biz(self, params, **kwargs):
+        bk_host_ids = params["host_property_filter"]["rules"][0]["value"]
+        assert params["page"]["limit"] == QUERY_CMDB_LIMIT >= len(bk_host_ids)
+        self.queried_host_ids.append(bk_host_ids)
+        return {"info": [self.hosts[bk_host_id] for bk_host_id in bk_host_ids if bk_host_id in self.hosts]}
+
+
+@pytest.fixture
+def host_cache():
+    # 同名的 LocMemCache 共享存储，每个用例开始前清空
+    local_cache = LocMemCache("cmdb_host_info", {})
+    local_cache.clear()
+    with patch("backend.db_meta.models.machine.cache", local_cache):
+        yield
+
+
+class TestMachineHostInfo:
+    def test_dedupe_and_cache(self, host_cache):
+        cc_api = FakeHostCCApi([1, 2, 3])
+        with patch("backend.db_meta.models.machine.CCApi", cc_api):
+            host_infos = Machine.batch_get_host_info_from_cmdb([1, 2, "2", 1])
+            assert cc_api.queried_host_ids == [[1, 2]]
+            assert host_infos[1] == {"bk_host_id": 1, "bk_idc_name": "idc", "bk_idc_id": 1}
+
+            # 命中缓存的主机不再查询 CMDB，只查询未命中的主机
+            host_infos = Machine.batch_get_host_info_from_cmdb([1, 2, 3])
+            assert cc_api.queried_host_ids == [[1, 2], [3]]
+            assert sorted(host_infos) == [1, 2, 3]
+
+            # 不读取缓存时重新查询全部主机
+            Machine.batch_get_host_info_from_cmdb([1, 3], use_cache=False)
+            assert cc_api.queried_host_ids[-1] == [1, 3]
+
+    def test_chunk_by_query_limit(self, host_cache):
+        bk_host_ids = list(range(1, QUERY_CMDB_LIMIT * 2 + 2))
+        cc_api = FakeHostCCApi(bk_host_ids)
+        with patch("backend.db_meta.models.machine.CCApi", cc_api):
+            host_infos = Machine.batch_get_host_info_from_cmdb(bk_host_ids)
+
+        assert sorted(len(host_ids) for host_ids in cc_api.queried_host_ids) == [1, QUERY_CMDB_LIMIT, QUERY_CMDB_LIMIT]
+        assert sorted(host_infos) == bk_host_ids
+
+    def test_host_not_exist(self, host_cache):
+        cc_api = FakeHostCCApi([1])
+        with patch("backend.db_meta.models.machine.CCApi", cc_api):
+            # 批量查询时忽略 CMDB 中不存在的主机
+            assert sorted(Machine.batch_get_host_info_from_cmdb([1, 2])) == [1]
+            assert Machine.get_host_info_from_cmdb(1)["bk_host_id"] == 1
+            with pytest.raises(HostDoseNotExistInCmdbException):
+                Machine.get_host_info_from_cmdb(2)
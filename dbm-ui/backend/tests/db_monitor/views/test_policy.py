@@ -8,6 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import copy
 from unittest.mock import patch
 
 import pytest
@@ -28,6 +29,17 @@ client = APIClient()
 client.login(username="admin")
 
 
+def bkm_save_alarm_strategy(details):
+    # 监控返回的策略详情会回填策略ID、更新时间等字段
+    res = copy.deepcopy(details)
+    res.update(id=3, update_time="2024-01-01 00:00:00")
+    for index, item in enumerate(res["items"]):
+        item["id"] = index + 1
+        for algorithm in item["algorithms"]:
+            algorithm["id"] = index + 1
+    return res
+
+
 @pytest.fixture
 @patch.object(MonitorPolicyViewSet, "permission_classes", [AllowAny])
 @patch.object(MonitorPolicyViewSet, "get_permissions", lambda x: [])
@@ -94,3 +106,43 @@ class TestMonitorPolicyViewSet:
         url = "/apis/monitor/policy/db_module_list/?dbtype=mysql"
         response = client.get(url)
         assert response.status_code == 200
+
+    @patch("backend.db_monitor.models.alarm.BKMonitorV3Api", BKMonitorV3MockApi)
+    @patch("backend.db_monitor.models.alarm.bkm_save_alarm_strategy", side_effect=bkm_save_alarm_strategy)
+    def test_skip_unchanged_policy(self, mocked_bkm_save_alarm_strategy):
+        def sync_policy(template):
+            # 模拟平台策略同步：按模板重新渲染策略，保留已同步的字段
+            policy = MonitorPolicy(**copy.deepcopy(template))
+            synced_policy = MonitorPolicy.objects.filter(name=policy.name).first()
+            if synced_policy:
+                for keeped_field in MonitorPolicy.KEEPED_FIELDS:
+                    setattr(policy, keeped_field, getattr(synced_policy, keeped_field))
+                policy.details["id"] = synced_policy.monitor_policy_id
+            policy.save()
+
+        sync_policy(CREATE_POLICY[0])
+        sync_policy(CREATE_POLICY[0])
+        assert mocked_bkm_save_alarm_strategy.call_count == 1
+
+        # 模板变更后才会重新同步到监控
+        template = copy.deepcopy(CREATE_POLICY[0])
+        template["details"]["name"] = "changed"
+        sync_policy(template)
+        assert mocked_bkm_save_alarm_strategy.call_count == 2
+
+    @patch("backend.db_monitor.models.alarm.BKMonitorV3Api", BKMonitorV3MockApi)
+    @patch("backend.db_monitor.models.alarm.bkm_save_alarm_strategy", side_effect=bkm_save_alarm_strategy)
+    def test_skip_unchanged_saved_policy(self, mocked_bkm_save_alarm_strategy):
+        MonitorPolicy(**copy.deepcopy(CREATE_POLICY[0])).save()
+        assert mocked_bkm_save_alarm_strategy.call_count == 1
+
+        # 本地详情已被监控返回的详情覆盖，加载后未做修改重新保存时不再同步到监控
+        policy = MonitorPolicy.objects.get(name=CREATE_POLICY[0]["name"])
+        policy.save()
+        assert mocked_bkm_save_alarm_strategy.call_count == 1
+
+        # 通知规则变更后重新同步到监控
+        policy = MonitorPolicy.objects.get(name=CREATE_POLICY[0]["name"])
+        policy.notify_rules = ["abnormal"]
+        policy.save()
+        assert mocked_bkm_save_alarm_strategy.call_count == 2
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from backend.configuration.constants import DBType
+from backend.db_package.constants import PackageType
+from backend.db_package.exceptions import PackageNotExistException
+from backend.db_package.models import Package
+from backend.flow.consts import MediumEnum
+
+pytestmark = pytest.mark.django_db
+
+
+def create_package(name, version, days_ago=0, **kwargs):
+    return Package.objects.create(
+        name=name,
+        version=version,
+        pkg_type=PackageType.MySQL.value,
+        db_type=DBType.MySQL.value,
+        path=f"mysql/{name}",
+        size=0,
+        md5="",
+        update_at=timezone.now() - datetime.timedelta(days=days_ago),
+        **kwargs,
+    )
+
+
+class TestPackageManifest:
+    def test_get_latest_package(self):
+        create_package("mysql-5.7.20-old.tar.gz", "MySQL-5.7", days_ago=1)
+        create_package("mysql-5.7.20-new.tar.gz", "MySQL-5.7")
+        create_package("mysql-8.0.30.tar.gz", "MySQL-8.0", days_ago=2)
+        create_package("mysql-5.7.20-gray.tar.gz", "MySQL-5.7", allow_biz_ids=[100])
+
+        assert Package.get_latest_package("MySQL-8.0", PackageType.MySQL).name == "mysql-8.0.30.tar.gz"
+        assert Package.get_latest_package(MediumEnum.Latest, PackageType.MySQL, bk_biz_id=1).name == (
+            "mysql-5.7.20-new.tar.gz"
+        )
+        # 灰度的介质包只对指定业务可用
+        assert Package.get_latest_package("MySQL-5.7", PackageType.MySQL, bk_biz_id=100).name == (
+            "mysql-5.7.20-gray.tar.gz"
+        )
+        with pytest.raises(PackageNotExistException):
+            Package.get_latest_package("MySQL-5.6", PackageType.MySQL)
+
+    def test_manifest_loaded_once(self, django_assert_num_queries):
+        create_package("mysql-5.7.20.tar.gz", "MySQL-5.7")
+        with django_assert_num_queries(1):
+            for __ in range(10):
+                Package.get_latest_package("MySQL-5.7", PackageType.MySQL)
+                Package.get_latest_package(MediumEnum.Latest, PackageType.MySQL)
+
+    def test_manifest_refresh_on_save(self):
+        package = create_package("mysql-5.7.20.tar.gz", "MySQL-5.7")
+        assert Package.get_latest_package("MySQL-5.7", PackageType.MySQL).id == package.id
+
+        package.enable = False
+        package.save()
+        with pytest.raises(PackageNotExistException):
+            Package.get_latest_package("MySQL-5.7", PackageType.MySQL)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import datetime
+import importlib
+import json
+import re
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+pytestmark = pytest.mark.django_db
+
+BACKUP_LOG_FIELDS = [
+    "bk_biz_id",
+    "backup_id",
+    "cluster_id",
+    "backup_host",
+    "backup_port",
+    "mysql_role",
+    "backup_type",
+    "file_list",
+    "data_schema_grant",
+    "is_full_backup",
+    "total_filesize",
+    "encrypt_enable",
+    "mysql_version",
+    "backup_begin_time",
+    "backup_end_time",
+    "backup_consistent_time",
+    "shard_value",
+]
+
+
+def make_backup_log(domain: str, backup_id: str) -> dict:
+    """日志平台中的全备记录，字段为大驼峰格式"""
+    log = {field: "" for field in BACKUP_LOG_FIELDS}
+    log.update(cluster_address=domain, backup_id=backup_id)
+    return {"".join(word.capitalize() for word in key.split("_")): value for key, value in log.items()}
+
+
+class FakeBKLogApi:
+    """记录每次查询的集群域名，按域名子串匹配返回记录，模拟日志平台的模糊匹配"""
+
+    def __init__(self, backup_logs):
+        self.backup_logs = backup_logs
+        self.queried_domains = []
+
+    def esquery_search(self, params, use_admin=False):
+        domains = re.findall(r'cluster_address: \\"(.*?)\\"', params["query_string"])
+        self.queried_domains.append(domains)
+        hits = [
+            {"_source": {"log": json.dumps(log)}}
+            for log in self.backup_logs
+            if any(domain in log["ClusterAddress"] for domain in domains)
+        ]
+        return {"hits": {"hits": hits[: params["size"]]}}
+
+
+@pytest.fixture
+def bklog_query(db):
+    # 导入周期任务时会注册任务并写入数据库，因此在用例中导入
+    return importlib.import_module("backend.db_periodic_task.local_tasks.mysql_backup.bklog_query")
+
+
+def patch_bklog_api(bklog_query, backup_logs):
+    bklog_api = FakeBKLogApi(backup_logs)
+    return bklog_api, patch.object(bklog_query, "BKLogApi", bklog_api)
+
+
+def query_backup_ids(bklog_query, domains):
+    end_time = timezone.now()
+    domain_backup_logs = bklog_query._query_backup_log_by_domains(
+        domains, end_time - datetime.timedelta(days=1), end_time
+    )
+    return {domain: [log["backup_id"] for log in logs] for domain, logs in domain_backup_logs.items()}
+
+
+class TestQueryBackupLogByDomains:
+    def test_group_by_domain(self, bklog_query):
+        bklog_api, patcher = patch_bklog_api(
+            bklog_query,
+            [
+                make_backup_log("a.db.com", "a1"),
+                make_backup_log("b.db.com", "b1"),
+                make_backup_log("a.db.com", "a2"),
+                # 模糊匹配到的其他集群需要忽略
+                make_backup_log("backup.a.db.com", "x1"),
+            ],
+        )
+        with patcher:
+            backup_ids = query_backup_ids(bklog_query, ["a.db.com", "b.db.com", "c.db.com"])
+
+        # 多个集群合并为一次 OR 查询，没有备份记录的集群返回空列表
+        assert bklog_api.queried_domains == [["a.db.com", "b.db.com", "c.db.com"]]
+        assert backup_ids == {"a.db.com": ["a1", "a2"], "b.db.com": ["b1"], "c.db.com": []}
+
+    def test_split_when_reach_query_size(self, bklog_query):
+        bklog_api, patcher = patch_bklog_api(
+            bklog_query,
+            [make_backup_log(domain, f"{domain}-{index}") for domain in ["a.db.com", "b.db.com"] for index in range(2)]
+            + [make_backup_log("c.db.com", "c.db.com-0")],
+        )
+        with patcher, patch.object(bklog_query, "BKLOG_QUERY_SIZE", 3):
+            backup_ids = query_backup_ids(bklog_query, ["a.db.com", "b.db.com", "c.db.com"])
+
+        # 查询结果达到上限时可能被截断，将集群拆成两半重新查询，单个集群时不再拆分
+        assert bklog_api.queried_domains == [
+            ["a.db.com", "b.db.com", "c.db.com"],
+            ["a.db.com"],
+            ["b.db.com", "c.db.com"],
+            ["b.db.com"],
+            ["c.db.com"],
+        ]
+        assert backup_ids == {
+            "a.db.com": ["a.db.com-0", "a.db.com-1"],
+            "b.db.com": ["b.db.com-0", "b.db.com-1"],
+            "c.db.com": ["c.db.com-0"],
+        }
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import importlib
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import AppCache, BKCity, Cluster, Machine, StorageInstance
+from backend.db_meta.signals import (
+    HOST_DBMETA_DIRTY_KEY,
+    HOST_DBMETA_HASH_KEY,
+    mark_host_dbmeta_dirty,
+    record_host_dbmeta_pushed,
+)
+from backend.dbm_init.constants import CC_HOST_DBM_ATTR
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeRedis:
+    """只实现脏主机集合与推送摘要用到的命令，取值与 decode_responses=True 时一致"""
+
+    def __init__(self):
+        self.sets, self.hashes = {}, {}
+
+    def sadd(self, key, *values):
+        self.sets.setdefault(key, set()).update(str(value) for value in values)
+
+    def spop(self, key, count):
+        members = self.sets.get(key, set())
+        return [members.pop() for __ in range(min(count, len(members)))]
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        self.hashes.setdefault(key, {}).update({str(k): v for k, v in (mapping or {field: value}).items()})
+
+    def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(str(field)) for field in fields]
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(str(field), None)
+
+
+@pytest.fixture
+def tasks(db):
+    # 导入周期任务时会注册任务并写入数据库，因此在用例中导入
+    return importlib.import_module("backend.db_periodic_task.local_tasks.db_meta.update_host_dbmeta")
+
+
+@pytest.fixture
+def redis(tasks):
+    fake_redis = FakeRedis()
+    with patch("backend.db_meta.signals.RedisConn", fake_redis), patch.object(tasks, "RedisConn", fake_redis):
+        yield fake_redis
+
+
+@pytest.fixture
+def cc_api(tasks):
+    api = MagicMock()
+    api.batch_update_host.return_value = {"code": 0}
+    with patch.object(tasks, "CCApi", api):
+        yield api
+
+
+@pytest.fixture
+def machines(create_city, redis):
+    bk_city = BKCity.objects.first()
+    for bk_host_id in [1, 2, 3]:
+        Machine.objects.create(
+            ip=f"127.0.0.{bk_host_id}", bk_biz_id=constant.BK_BIZ_ID, bk_city=bk_city, bk_host_id=bk_host_id
+        )
+    # 忽略创建主机时的标记，由用例自行标记
+    redis.sets.clear()
+
+
+def get_pushed_host_ids(cc_api):
+    return sorted(
+        update["bk_host_id"] for call in cc_api.batch_update_host.call_args_list for update in call[0][0]["update"]
+    )
+
+
+class TestSyncDirtyHostDbmeta:
+    def test_drain_dirty_hosts(self, tasks, machines, redis, cc_api):
+        # 99 为已下架的主机，其推送记录需要清理
+        redis.hset(HOST_DBMETA_HASH_KEY, 99, "hash")
+        mark_host_dbmeta_dirty([1, 2, 3, 99])
+
+        tasks.sync_dirty_host_dbmeta(batch_size=3)
+        tasks.sync_dirty_host_dbmeta(batch_size=3)
+
+        assert not redis.sets[HOST_DBMETA_DIRTY_KEY]
+        assert get_pushed_host_ids(cc_api) == [1, 2, 3]
+        assert sorted(redis.hashes[HOST_DBMETA_HASH_KEY]) == ["1", "2", "3"]
+
+        # 没有脏主机时不做任何查询和推送
+        cc_api.reset_mock()
+        tasks.sync_dirty_host_dbmeta()
+        cc_api.batch_update_host.assert_not_called()
+
+    def test_skip_unchanged_hosts(self, tasks, machines, redis, cc_api):
+        mark_host_dbmeta_dirty([1, 2, 3])
+        tasks.sync_dirty_host_dbmeta()
+        cc_api.reset_mock()
+
+        # 内容未变化的主机不再推送，摘要不一致的主机重新推送
+        redis.hset(HOST_DBMETA_HASH_KEY, 2, "stale")
+        mark_host_dbmeta_dirty([1, 2, 3])
+        tasks.sync_dirty_host_dbmeta()
+        assert get_pushed_host_ids(cc_api) == [2]
+
+        # CcManage 已推送过相同内容的主机同样会被跳过
+        cc_api.reset_mock()
+        machine = Machine.objects.get(bk_host_id=3)
+        redis.hashes[HOST_DBMETA_HASH_KEY].pop("3")
+        record_host_dbmeta_pushed({3: json.dumps(machine.dbm_meta)})
+        mark_host_dbmeta_dirty([3])
+        tasks.sync_dirty_host_dbmeta()
+        cc_api.batch_update_host.assert_not_called()
+
+    def test_remark_dirty_on_error(self, tasks, machines, redis, cc_api):
+        cc_api.batch_update_host.side_effect = Exception("cmdb unavailable")
+        mark_host_dbmeta_dirty([1, 2])
+
+        with pytest.raises(Exception):
+            tasks.sync_dirty_host_dbmeta()
+
+        # 推送异常的主机重新标记，等待下一轮同步
+        assert redis.sets[HOST_DBMETA_DIRTY_KEY] == {"1", "2"}
+        assert not redis.hashes.get(HOST_DBMETA_HASH_KEY)
+
+    def test_fallback_single_update(self, tasks, machines, redis, cc_api):
+        cc_api.batch_update_host.return_value = {"code": -1}
+        mark_host_dbmeta_dirty([1])
+
+        tasks.sync_dirty_host_dbmeta()
+
+        # 批量推送失败时逐台推送，成功后记录摘要
+        update = cc_api.update_host.call_args[0][0]
+        assert update["bk_host_id"] == 1 and CC_HOST_DBM_ATTR in update["data"]
+        assert "1" in redis.hashes[HOST_DBMETA_HASH_KEY]
+
+
+class TestUpdateHostDbmeta:
+    def test_push_drift_only(self, tasks, machines, redis, cc_api):
+        AppCache.objects.create(bk_biz_id=constant.BK_BIZ_ID, db_app_abbr="dba")
+        cluster = Cluster.objects.create(
+            bk_biz_id=constant.BK_BIZ_ID,
+            name="order-db",
+            db_module_id=constant.DB_MODULE_ID,
+            immute_domain="order.db.com",
+            cluster_type=ClusterType.TenDBHA.value,
+        )
+        StorageInstance.objects.create(port=20000, machine=Machine.objects.get(bk_host_id=2)).cluster.add(cluster)
+        tasks.update_host_dbmeta()
+        assert get_pushed_host_ids(cc_api) == [1, 2, 3]
+
+        # 定期全量对账只推送内容有变化的主机
+        cc_api.reset_mock()
+        tasks.update_host_dbmeta()
+        cc_api.batch_update_host.assert_not_called()
+
+        # queryset.update 不会触发信号，由全量对账推送
+        Cluster.objects.filter(id=cluster.id).update(immute_domain="pay.db.com")
+        tasks.update_host_dbmeta()
+        assert get_pushed_host_ids(cc_api) == [2]
+
+    def test_force_push_specified_dbmeta(self, tasks, machines, redis, cc_api):
+        tasks.update_host_dbmeta()
+        cc_api.reset_mock()
+
+        # 指定 dbm_meta 时忽略内容摘要强制推送
+        tasks.update_host_dbmeta(bk_host_ids=[1], dbm_meta=[])
+        assert get_pushed_host_ids(cc_api) == [1]
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import BKCity, Cluster, Machine, ProxyInstance, StorageInstance
+from backend.db_services.quick_search.constants import FilterType, ResourceType
+from backend.db_services.quick_search.handlers import QSearchHandler
+from backend.db_services.quick_search.models import QuickSearchIndex, make_grams
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def index_cache():
+    # 同名的 LocMemCache 共享存储，每个用例开始前清空
+    local_cache = LocMemCache("quick_search", {})
+    local_cache.clear()
+    with patch("backend.db_services.quick_search.models.cache", local_cache):
+        yield
+
+
+def create_cluster(name: str, domain: str) -> Cluster:
+    return Cluster.objects.create(
+        bk_biz_id=constant.BK_BIZ_ID,
+        name=name,
+        db_module_id=constant.DB_MODULE_ID,
+        immute_domain=domain,
+        cluster_type=ClusterType.TenDBHA.value,
+    )
+
+
+def get_indexed_grams(resource_type: str, object_id) -> set:
+    return set(
+        QuickSearchIndex.objects.filter(resource_type=resource_type, object_id=str(object_id)).values_list(
+            "gram", flat=True
+        )
+    )
+
+
+def search_cluster_names(keyword: str):
+    handler = QSearchHandler(filter_type=FilterType.CONTAINS.value)
+    return sorted(cluster["name"] for cluster in handler.filter_cluster_name([keyword]))
+
+
+class TestQuickSearchIndex:
+    def test_match_by_trigram(self):
+        order = create_cluster("order-db", "order.db.com")
+        create_cluster("user-db", "user.db.com")
+        QuickSearchIndex.rebuild()
+
+        assert search_cluster_names("ORDER") == ["order-db"]
+        assert search_cluster_names("-db") == ["order-db", "user-db"]
+
+        # 候选对象由索引决定：索引中缺失的对象即使 LIKE 能匹配上也不会返回
+        QuickSearchIndex.delete_index(ResourceType.CLUSTER_NAME.value, [order.id])
+        assert search_cluster_names("order") == []
+
+    def test_short_keyword_fallback_to_like(self):
+        order = create_cluster("order-db", "order.db.com")
+        create_cluster("user-db", "user.db.com")
+        QuickSearchIndex.rebuild()
+        QuickSearchIndex.delete_index(ResourceType.CLUSTER_NAME.value, [order.id])
+
+        # 关键字不足三个字符时无法使用索引，退化为 LIKE 查询
+        assert QuickSearchIndex.match(ResourceType.CLUSTER_NAME.value, "db") is None
+        assert search_cluster_names("db") == ["order-db", "user-db"]
+
+    def test_index_not_ready_fallback_to_like(self):
+        create_cluster("order-db", "order.db.com")
+
+        assert not QuickSearchIndex.is_ready()
+        assert QuickSearchIndex.match(ResourceType.CLUSTER_NAME.value, "order") is None
+        assert search_cluster_names("order") == ["order-db"]
+
+    def test_rebuild_remove_stale_rows(self):
+        cluster = create_cluster("order-db", "order.db.com")
+        QuickSearchIndex.objects.create(resource_type=ResourceType.CLUSTER_NAME.value, object_id="-1", gram="abc")
+        # queryset.update 不会触发信号，由全量对账修正
+        Cluster.objects.filter(id=cluster.id).update(name="pay-db")
+
+        changed_count = QuickSearchIndex.rebuild()
+
+        assert changed_count[ResourceType.CLUSTER_NAME.value] == 1
+        assert not QuickSearchIndex.objects.filter(object_id="-1").exists()
+        assert get_indexed_grams(ResourceType.CLUSTER_NAME.value, cluster.id) == make_grams("pay-db")
+        # 索引没有变化时不重复写入
+        assert QuickSearchIndex.rebuild()[ResourceType.CLUSTER_NAME.value] == 0
+
+
+@pytest.mark.django_db(transaction=True)
+class TestQuickSearchIndexSignal:
+    def test_update_index_by_signal(self, create_city):
+        cluster = create_cluster("order-db", "order.db.com")
+        assert get_indexed_grams(ResourceType.CLUSTER_NAME.value, cluster.id) == make_grams("order-db")
+        assert get_indexed_grams(ResourceType.CLUSTER_DOMAIN.value, cluster.id) == make_grams("order.db.com")
+
+        cluster.name = "pay-db"
+        cluster.save(update_fields=["name"])
+        assert get_indexed_grams(ResourceType.CLUSTER_NAME.value, cluster.id) == make_grams("pay-db")
+
+        machine = Machine.objects.create(ip="127.0.0.1", bk_city=BKCity.objects.first(), bk_host_id=1)
+        assert get_indexed_grams(ResourceType.MACHINE.value, 1) == make_grams("127.0.0.1")
+
+        cluster_id = cluster.id
+        cluster.delete()
+        machine.delete()
+        assert not get_indexed_grams(ResourceType.CLUSTER_NAME.value, cluster_id)
+        assert not get_indexed_grams(ResourceType.CLUSTER_DOMAIN.value, cluster_id)
+        assert not get_indexed_grams(ResourceType.MACHINE.value, 1)
+
+
+class TestFilterMachine:
+    def test_resolve_machine_cluster(self, create_city):
+        bk_city = BKCity.objects.first()
+        proxy_cluster = create_cluster("proxy-db", "proxy.db.com")
+        storage_cluster = create_cluster("storage-db", "storage.db.com")
+        machine = Machine.objects.create(ip="127.0.0.1", bk_city=bk_city, bk_host_id=1)
+        Machine.objects.create(ip="127.0.0.2", bk_city=bk_city, bk_host_id=2)
+        ProxyInstance.objects.create(port=10000, machine=machine).cluster.add(proxy_cluster)
+        StorageInstance.objects.create(port=20000, machine=machine).cluster.add(storage_cluster)
+        # 未绑定集群的实例不影响主机关联的集群
+        StorageInstance.objects.create(port=20001, machine=machine)
+        QuickSearchIndex.rebuild()
+
+        machines = QSearchHandler(filter_type=FilterType.CONTAINS.value).filter_machine(["127.0.0"])
+        machine_clusters = {machine["ip"]: (machine["cluster_id"], machine["cluster_domain"]) for machine in machines}
+
+        # 存储实例所在集群优先于接入层实例所在集群
+        assert machine_clusters == {
+            "127.0.0.1": (storage_cluster.id, "storage.db.com"),
+            "127.0.0.2": (None, None),
+        }
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+from unittest.mock import patch
+
+import pytest
+from bamboo_engine.api import EngineAPIResult
+
+from backend.db_services.taskflow import task
+from backend.db_services.taskflow.handlers import TaskFlowHandler
+from backend.flow.consts import StateType
+from backend.flow.models import FlowNode
+from backend.tests.mock_data.db_services import taskflow
+
+pytestmark = pytest.mark.django_db
+
+
+def encode(value) -> str:
+    # 与 redis-py 一致：str 及其子类(如 StateType)按字符串内容写入，其余类型转换为字符串
+    return value.encode().decode() if isinstance(value, str) else str(value)
+
+
+class FakeRedis:
+    """只实现批量重试用到的命令，取值与 decode_responses=True 时一致，不模拟过期"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self._lock = threading.Lock()
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = encode(value)
+        self.expires[key] = ex
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def expire(self, key, seconds):
+        if key not in self.data:
+            return False
+        self.expires[key] = seconds
+        return True
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self._lock:
+            self.data.setdefault(key, {}).update({k: encode(v) for k, v in (mapping or {field: value}).items()})
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hincrby(self, key, field, amount):
+        with self._lock:
+            values = self.data.setdefault(key, {})
+            values[field] = str(int(values.get(field, 0)) + amount)
+
+
+@pytest.fixture
+def redis():
+    fake_redis = FakeRedis()
+    with patch("backend.db_services.taskflow.task.RedisConn", fake_redis):
+        yield fake_redis
+
+
+@pytest.fixture
+def failed_nodes():
+    for index, status in enumerate([StateType.FAILED, StateType.FAILED, StateType.FINISHED, StateType.RUNNING]):
+        FlowNode.objects.create(
+            root_id=taskflow.ROOT_ID, node_id=f"node{index}", version_id=f"version{index}", status=status.value
+        )
+    # 同一节点重试后的失败版本只返回一次
+    FlowNode.objects.create(
+        root_id=taskflow.ROOT_ID, node_id="node0", version_id="version-retry", status=StateType.FAILED.value
+    )
+    # 其他流程的失败节点不影响
+    FlowNode.objects.create(root_id="other", node_id="node9", version_id="version9", status=StateType.FAILED.value)
+    return ["node0", "node1"]
+
+
+class TestBatchRetry:
+    def test_get_failed_node_ids(self, failed_nodes):
+        node_ids = TaskFlowHandler(root_id=taskflow.ROOT_ID).get_failed_node_ids()
+        assert sorted(node_ids) == failed_nodes
+
+    def test_progress(self, redis):
+        progress = task.BatchRetryProgress(taskflow.ROOT_ID)
+        token = progress.start(["node0", "node1", "node2"])
+        assert token
+        assert redis.expires[progress.lock_key] == task.BATCH_RETRY_LOCK_EXPIRE
+
+        # 执行中不允许再次抢占
+        assert progress.start(["node0"]) is None
+        assert progress.refresh("other-token") is False
+
+        progress.succeed()
+        progress.succeed()
+        progress.fail("node2", "error")
+        assert progress.get() == {
+            "status": StateType.RUNNING,
+            "total": 3,
+            "succeeded": 2,
+            "failed": 1,
+            "errors": {"node2": "error"},
+        }
+
+        # 执行完成后释放执行锁，保留进度供轮询
+        progress.finish(token)
+        assert progress.get()["status"] == StateType.FINISHED
+        assert not redis.exists(progress.lock_key)
+        assert progress.start(["node0"])
+
+    def test_progress_lost_lock(self, redis):
+        progress = task.BatchRetryProgress(taskflow.ROOT_ID)
+        progress.start(["node0"])
+
+        # 后台任务异常退出，执行锁过期后进度标记为失败，允许重新批量重试
+        redis.delete(progress.lock_key)
+        assert progress.get()["status"] == StateType.FAILED
+        assert progress.start(["node0"])
+
+    def test_dispatch_once(self, redis, failed_nodes):
+        handler = TaskFlowHandler(root_id=taskflow.ROOT_ID)
+        with patch.object(task.batch_retry_nodes, "delay") as delay:
+            progress = handler.batch_retry_nodes()
+            handler.batch_retry_nodes()
+
+        delay.assert_called_once()
+        assert sorted(delay.call_args[1]["node_ids"]) == failed_nodes
+        assert progress["status"] == StateType.RUNNING and progress["total"] == 2
+
+    def test_reset_when_dispatch_failed(self, redis, failed_nodes):
+        handler = TaskFlowHandler(root_id=taskflow.ROOT_ID)
+        with patch.object(task.batch_retry_nodes, "delay", side_effect=Exception("broker unavailable")):
+            with pytest.raises(Exception):
+                handler.batch_retry_nodes()
+
+        # 下发失败后不残留进度和执行锁，可以立即重新批量重试
+        assert handler.get_batch_retry_progress() is None
+        with patch.object(task.batch_retry_nodes, "delay") as delay:
+            handler.batch_retry_nodes()
+        delay.assert_called_once()
+
+    def test_batch_retry_nodes(self, redis):
+        def retry_node(root_id, node_id, retry_times):
+            if node_id == "node2":
+                raise Exception("retry error")
+            return EngineAPIResult(result=node_id == "node0", message=f"{node_id} message")
+
+        progress = task.BatchRetryProgress(taskflow.ROOT_ID)
+        token = progress.start(["node0", "node1", "node2"])
+        with patch("backend.db_services.taskflow.task.retry_node", side_effect=retry_node):
+            task.batch_retry_nodes(root_id=taskflow.ROOT_ID, node_ids=["node0", "node1", "node2"], token=token)
+
+        assert progress.get() == {
+            "status": StateType.FINISHED,
+            "total": 3,
+            "succeeded": 1,
+            "failed": 2,
+            "errors": {"node1": "node1 message", "node2": "retry error"},
+        }
+        assert not redis.exists(progress.lock_key)
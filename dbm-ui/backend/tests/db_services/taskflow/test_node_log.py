@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import base64
+import json
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+from backend import env
+from backend.db_services.taskflow.exceptions import InvalidLogCursorException
+from backend.db_services.taskflow.handlers import TaskFlowHandler
+from backend.db_services.taskflow.views.flow import TaskFlowViewSet
+from backend.flow.models import FlowNode, StateType
+from backend.tests.mock_data.db_services import taskflow
+from backend.utils.pytest import AuthorizedAPIRequestFactory
+
+pytestmark = pytest.mark.django_db
+factory = AuthorizedAPIRequestFactory()
+NODE_LOG_URL = f"/apis/taskflow/{taskflow.ROOT_ID}/node_log/"
+
+
+class FakeBKLogApi:
+    """按请求的 sort_list 排序，并按 search_after 分页返回日志"""
+
+    def __init__(self):
+        self.logs = {"dbm_log": [], "dbm_dbactuator": []}
+
+    def add_log(self, index, timestamp, msg, server_ip="127.0.0.1"):
+        self.logs[index].append(
+            {
+                "_index": f"{env.DBA_APP_BK_BIZ_ID}_bklog_{index}",
+                "_id": f"{index}-{len(self.logs[index])}",
+                "_source": {
+                    "log": json.dumps({"levelname": "INFO", "msg": msg}),
+                    "serverIp": server_ip,
+                    "time": timestamp,
+                    "dtEventTimeStamp": timestamp,
+                    "gseIndex": 0,
+                    "iterationIndex": 0,
+                },
+            }
+        )
+
+    def esquery_search(self, params):
+        index = params["indices"].split(".", 1)[1]
+        hits = [
+            {**hit, "sort": [hit["_source"].get(field, hit.get(field)) for field, __ in params["sort_list"]]}
+            for hit in self.logs[index]
+        ]
+        hits = [hit for hit in hits if not params.get("search_after") or hit["sort"] > params["search_after"]]
+        return {"hits": {"hits": sorted(hits, key=lambda hit: hit["sort"])[: params["size"]]}}
+
+
+@pytest.fixture
+def bklog_api():
+    api = FakeBKLogApi()
+    with patch("backend.db_services.taskflow.handlers.BKLogApi", api):
+        yield api
+
+
+@pytest.fixture
+def handler():
+    FlowNode.objects.create(
+        uid=425,
+        root_id=taskflow.ROOT_ID,
+        node_id=taskflow.NODE_ID,
+        status=StateType.FINISHED.value,
+        version_id=taskflow.VERSION_ID,
+        started_at=timezone.now(),
+    )
+    return TaskFlowHandler(root_id=taskflow.ROOT_ID)
+
+
+def get_messages(logs):
+    return [log["message"].split(": ", 1)[1] for log in logs]
+
+
+class TestNodeLog:
+    def test_merge_pages_by_cursor(self, handler, bklog_api):
+        for timestamp in [1, 3, 5]:
+            bklog_api.add_log("dbm_log", timestamp, f"flow-{timestamp}")
+        for timestamp in [2, 4]:
+            bklog_api.add_log("dbm_dbactuator", timestamp, f"actuator-{timestamp}")
+
+        messages, cursor, has_more = [], None, True
+        while has_more:
+            page = handler.get_version_logs_page(taskflow.NODE_ID, taskflow.VERSION_ID, cursor=cursor, size=2)
+            assert len(page["logs"]) <= 2
+            messages.extend(get_messages(page["logs"]))
+            cursor, has_more = page["cursor"], page["has_more"]
+
+        # 两个索引的日志按排序值归并，分页时不重复也不遗漏
+        assert messages == ["flow-1", "actuator-2", "flow-3", "actuator-4", "flow-5"]
+
+        # 没有新日志时游标不变，新上报的日志可以通过同一个游标继续拉取
+        page = handler.get_version_logs_page(taskflow.NODE_ID, taskflow.VERSION_ID, cursor=cursor, size=2)
+        assert page == {"logs": [], "cursor": cursor, "has_more": False}
+        bklog_api.add_log("dbm_dbactuator", 6, "actuator-6")
+        page = handler.get_version_logs_page(taskflow.NODE_ID, taskflow.VERSION_ID, cursor=cursor, size=2)
+        assert get_messages(page["logs"]) == ["actuator-6"]
+
+    def test_same_sort_across_page_boundary(self, handler, bklog_api):
+        # 多台主机在同一时刻上报的日志，前三个排序字段完全相同，由 serverIp 和 _id 区分
+        for server_ip in ["127.0.0.2", "127.0.0.1", "127.0.0.1"]:
+            bklog_api.add_log("dbm_dbactuator", 1, f"actuator-{server_ip}", server_ip=server_ip)
+        bklog_api.add_log("dbm_log", 1, "flow-1")
+
+        messages, cursor, has_more = [], None, True
+        while has_more:
+            page = handler.get_version_logs_page(taskflow.NODE_ID, taskflow.VERSION_ID, cursor=cursor, size=1)
+            messages.extend(get_messages(page["logs"]))
+            cursor, has_more = page["cursor"], page["has_more"]
+
+        # 翻页的边界落在排序值相同的日志之间时，不会跳过也不会重复
+        assert sorted(messages) == ["actuator-127.0.0.1", "actuator-127.0.0.1", "actuator-127.0.0.2", "flow-1"]
+
+    @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
+    def test_first_page_without_cursor(self, handler, bklog_api):
+        for timestamp in range(5):
+            bklog_api.add_log("dbm_log", timestamp, f"flow-{timestamp}")
+
+        view = TaskFlowViewSet.as_view({"get": "node_log"}, **TaskFlowViewSet.node_log.kwargs)
+        params = {"node_id": taskflow.NODE_ID, "version_id": taskflow.VERSION_ID, "size": 2}
+        page = view(factory.get(NODE_LOG_URL, params), root_id=taskflow.ROOT_ID).data
+
+        # 不传游标时只返回第一页，后续日志通过返回的游标拉取
+        assert get_messages(page["logs"]) == ["flow-0", "flow-1"] and page["has_more"]
+        page = view(factory.get(NODE_LOG_URL, {**params, "cursor": page["cursor"]}), root_id=taskflow.ROOT_ID).data
+        assert get_messages(page["logs"]) == ["flow-2", "flow-3"]
+
+    @pytest.mark.parametrize("cursor", ["not-base64!", base64.urlsafe_b64encode(b"[1, 2]").decode()])
+    def test_invalid_cursor(self, handler, bklog_api, cursor):
+        with pytest.raises(InvalidLogCursorException):
+            handler.get_version_logs_page(taskflow.NODE_ID, taskflow.VERSION_ID, cursor=cursor)
+
+    @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
+    def test_stream_download(self, handler, bklog_api):
+        for timestamp in [1, 2]:
+            bklog_api.add_log("dbm_log", timestamp, f"flow-{timestamp}")
+
+        request = factory.get(
+            NODE_LOG_URL, {"node_id": taskflow.NODE_ID, "version_id": taskflow.VERSION_ID, "download": True}
+        )
+        view = TaskFlowViewSet.as_view({"get": "node_log"}, **TaskFlowViewSet.node_log.kwargs)
+        response = view(request, root_id=taskflow.ROOT_ID)
+
+        assert response.streaming
+        content = b"".join(response.streaming_content).decode()
+        assert content == "[flow]: flow-1\n[flow]: flow-2\n"
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import re
+from unittest.mock import patch
+
+import pytest
+
+from backend.flow.consts import (
+    JOB_FAILURE_LOG_BYTES_BUDGET,
+    JOB_FAILURE_LOG_IP_MAX_BYTES,
+    JOB_FAILURE_LOG_TOP_N,
+    JOB_IP_LOG_BATCH_SIZE,
+    JOB_IP_SUCCESS,
+)
+from backend.flow.plugins.components.collections.common.base_service import BkJobService
+from backend.tests.mock_data.components.job import JOB_INSTANCE_ID, STEP_INSTANCE_ID, JobApiMock
+
+JOB_IP_FAILED = 4
+
+
+class FakeJobApi(JobApiMock):
+    """记录每次批量查询的主机，可以为主机指定日志内容"""
+
+    def __init__(self, ip_logs=None):
+        self.ip_logs = ip_logs or {}
+        self.queried_ips = []
+
+    def batch_get_job_instance_ip_log(self, payload, raw=True):
+        self.queried_ips.append([ip_info["ip"] for ip_info in payload["ip_list"]])
+        resp = JobApiMock.batch_get_job_instance_ip_log(payload, raw)
+        for ip_log in resp["data"]["script_task_logs"]:
+            ip_log["log_content"] = self.ip_logs.get(ip_log["ip"], ip_log["log_content"])
+        return resp
+
+
+class RecordLogService(BkJobService):
+    def __init__(self):
+        super().__init__()
+        self.errors, self.warnings = [], []
+
+    def log_error(self, msg: str):
+        self.errors.append(msg)
+
+    def log_warning(self, msg: str):
+        self.warnings.append(msg)
+
+    def log_failed_ips(self, ip_statuses: dict):
+        resp = {
+            "data": {
+                "step_instance_list": [
+                    {
+                        "step_ip_result_list": [
+                            {"bk_cloud_id": 0, "ip": ip, "status": status} for ip, status in ip_statuses.items()
+                        ]
+                    }
+                ]
+            }
+        }
+        ip_dicts = [{"bk_cloud_id": 0, "ip": ip} for ip in ip_statuses]
+        self._BkJobService__log_failed_ips(resp, JOB_INSTANCE_ID, STEP_INSTANCE_ID, ip_dicts)
+
+
+def make_ips(count: int, start: int = 1):
+    return [f"127.0.{index // 256}.{index % 256}" for index in range(start, start + count)]
+
+
+def get_ip_log(error: str) -> str:
+    """主机日志的格式为 {ip_dict}:log_content"""
+    return error.split("}:", 1)[1]
+
+
+@pytest.fixture
+def service():
+    return RecordLogService()
+
+
+def patch_job_api(job_api):
+    return patch("backend.flow.plugins.components.collections.common.base_service.JobApi", job_api)
+
+
+class TestLogFailedIps:
+    def test_only_failed_ips_in_batches(self, service):
+        failed_ips = make_ips(JOB_IP_LOG_BATCH_SIZE + 1)
+        ip_statuses = {ip: JOB_IP_FAILED for ip in failed_ips}
+        ip_statuses["10.0.0.1"] = JOB_IP_SUCCESS
+        job_api = FakeJobApi()
+
+        with patch_job_api(job_api):
+            service.log_failed_ips(ip_statuses)
+
+        # 只拉取失败主机的日志，并按 JOB 接口的主机数上限分批
+        assert sorted(len(ips) for ips in job_api.queried_ips) == [1, JOB_IP_LOG_BATCH_SIZE]
+        assert sorted(ip for ips in job_api.queried_ips for ip in ips) == sorted(failed_ips)
+        assert str(len(failed_ips)) in service.errors[0]
+
+    def test_top_n_errors(self, service):
+        # 第 i 类错误影响 i 台主机
+        ip_logs, ips = {}, iter(make_ips(100))
+        for error_index in range(1, JOB_FAILURE_LOG_TOP_N + 3):
+            for __ in range(error_index):
+                ip_logs[next(ips)] = f"[2024-01-01 00:00:00] step done\n[ERROR] error-{error_index}\n"
+        job_api = FakeJobApi(ip_logs)
+
+        with patch_job_api(job_api):
+            service.log_failed_ips({ip: JOB_IP_FAILED for ip in ip_logs})
+
+        # 汇总行之后按影响主机数从多到少输出 top N 错误类型
+        summaries = [error for error in service.errors if not error.startswith("{")][1:]
+        assert [int(re.search(r"error-(\d+)", summary).group(1)) for summary in summaries] == list(
+            range(JOB_FAILURE_LOG_TOP_N + 2, 2, -1)
+        )
+
+    def test_tail_log(self, service):
+        log_content = "x" * JOB_FAILURE_LOG_IP_MAX_BYTES + "\nlast error"
+        job_api = FakeJobApi({"127.0.0.1": log_content})
+
+        with patch_job_api(job_api):
+            service.log_failed_ips({"127.0.0.1": JOB_IP_FAILED})
+
+        ip_log = get_ip_log(service.errors[-1])
+        assert ip_log.startswith("...\n") and ip_log.endswith("last error")
+        assert len(ip_log.encode()) == JOB_FAILURE_LOG_IP_MAX_BYTES + len("...\n")
+
+    def test_bytes_budget(self, service):
+        host_count = JOB_FAILURE_LOG_BYTES_BUDGET // JOB_FAILURE_LOG_IP_MAX_BYTES + 3
+        ips = make_ips(host_count)
+        job_api = FakeJobApi({ip: "e" * JOB_FAILURE_LOG_IP_MAX_BYTES for ip in ips})
+
+        with patch_job_api(job_api):
+            service.log_failed_ips({ip: JOB_IP_FAILED for ip in ips})
+
+        # 超出字节预算的主机日志不再转载，只提示省略的主机数
+        ip_logs = [error for error in service.errors if error.startswith("{")]
+        assert len(ip_logs) == JOB_FAILURE_LOG_BYTES_BUDGET // JOB_FAILURE_LOG_IP_MAX_BYTES
+        assert sum(len(get_ip_log(error).encode()) for error in ip_logs) <= JOB_FAILURE_LOG_BYTES_BUDGET
+        assert len(service.warnings) == 1 and "3" in service.warnings[0]
@@ -49,6 +49,10 @@ class TestExecActuatorScriptComponent(MySQLSingleApplyComponentTest, TestCase):
                     target="backend.flow.utils.base.payload_handler.DBPrivManagerApi",
                     new=DBPrivManagerApiMock,
                 ),
+                Patcher(
+                    target="backend.flow.utils.base.credential_resolver.DBPrivManagerApi",
+                    new=DBPrivManagerApiMock,
+                ),
             ]
         )
         return patchers
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+from bamboo_engine.api import EngineAPIResult
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from backend.flow.engine.bamboo.scene.common import builder
+from backend.flow.engine.bamboo.scene.common.builder import Builder, SubBuilder
+from backend.flow.models import FlowNode, FlowTree
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+ROOT_ID = "root"
+COMPONENT_CODE = "empty"
+
+
+def make_data():
+    return {"uid": 1, "ticket_type": "MYSQL_HA_APPLY", "bk_biz_id": constant.BK_BIZ_ID, "created_by": "admin"}
+
+
+def make_act(name: str) -> dict:
+    return {"act_name": name, "act_component_code": COMPONENT_CODE, "kwargs": {}}
+
+
+def make_sub_process(name: str, act_count: int):
+    sub_builder = SubBuilder(root_id=ROOT_ID, data=make_data())
+    for index in range(act_count):
+        sub_builder.add_act(**make_act(f"{name}-{index}"))
+    return sub_builder.build_sub_process(sub_name=name)
+
+
+def count_flow_node_inserts(queries) -> int:
+    return len([query for query in queries.captured_queries if query["sql"].startswith('INSERT INTO "flow_node"')])
+
+
+@pytest.fixture
+def run_pipeline():
+    with patch.object(builder.api, "run_pipeline", return_value=EngineAPIResult(result=True, message="")) as run:
+        yield run
+
+
+class TestBuilderFlowNodes:
+    def test_bulk_create_flow_nodes(self, run_pipeline):
+        pipeline = Builder(root_id=ROOT_ID, data=make_data())
+        pipeline.add_act(**make_act("act"))
+        pipeline.add_parallel_acts(
+            [make_act("parallel-0"), make_act("parallel-1"), make_sub_process("parallel-sub", 2)]
+        )
+        pipeline.add_sub_pipeline(make_sub_process("sub", 2))
+        pipeline.add_parallel_sub_pipeline([make_sub_process("sub0", 1), make_sub_process("empty-sub", 0)])
+
+        # 编排过程中只缓存节点记录，不写入数据库
+        assert not FlowNode.objects.exists()
+
+        with CaptureQueriesContext(connection) as queries:
+            assert pipeline.run_pipeline()
+
+        # 运行流程时一次性批量写入所有节点记录，包括子流程中的节点
+        assert count_flow_node_inserts(queries) == 1
+        node_ids = set(FlowNode.objects.filter(root_id=ROOT_ID, uid="1").values_list("node_id", flat=True))
+        assert node_ids == {flow_node.node_id for flow_node in pipeline.flow_nodes}
+        assert len(node_ids) == 8
+        assert FlowTree.objects.filter(root_id=ROOT_ID).exists()
+        run_pipeline.assert_called_once()
+
+    def test_nested_sub_process(self, run_pipeline):
+        # 子流程嵌套子流程时，内层子流程的节点随外层子流程一起收集
+        sub_builder = SubBuilder(root_id=ROOT_ID, data=make_data())
+        sub_builder.add_act(**make_act("outer"))
+        sub_builder.add_sub_pipeline(make_sub_process("inner", 2))
+        pipeline = Builder(root_id=ROOT_ID, data=make_data())
+        pipeline.add_sub_pipeline(sub_builder.build_sub_process(sub_name="outer"))
+
+        pipeline.run_pipeline()
+
+        assert FlowNode.objects.filter(root_id=ROOT_ID).count() == 3
+
+    def test_save_in_batches_without_duplicates(self):
+        pipeline = Builder(root_id=ROOT_ID, data=make_data())
+        for index in range(5):
+            pipeline.add_act(**make_act(f"act-{index}"))
+        sub_process = make_sub_process("sub", 1)
+        # 同一个子流程被多次收集时只写入一次
+        pipeline.collect_sub_flow_nodes(sub_process)
+        pipeline.collect_sub_flow_nodes(sub_process)
+
+        with patch.object(builder, "FLOW_NODE_BATCH_SIZE", 2), CaptureQueriesContext(connection) as queries:
+            pipeline.save_flow_nodes()
+
+        assert count_flow_node_inserts(queries) == 3
+        assert FlowNode.objects.filter(root_id=ROOT_ID).count() == 6
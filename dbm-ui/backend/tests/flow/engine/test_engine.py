@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import copy
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+import pytest
+from bamboo_engine import states
+from bamboo_engine.api import EngineAPIResult
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from pipeline.eri.models import State
+
+from backend.flow.engine.bamboo.engine import BambooEngine, hide_sensitive_data
+from backend.flow.engine.bamboo.scene.common import builder
+from backend.flow.engine.bamboo.scene.common.builder import Builder, SubBuilder
+from backend.flow.models import FlowNode, FlowTree
+from backend.tests.mock_data import constant
+from backend.utils.string import i18n_str
+from backend.utils.time import datetime2timestamp
+
+pytestmark = pytest.mark.django_db
+
+ROOT_ID = "root"
+
+
+def make_pipeline_tree():
+    trans_data = {"password": "xxx", "hosts": [{"ip": "127.0.0.1"}] * 3}
+    return {
+        "id": ROOT_ID,
+        "data": {"inputs": {"${trans_data}": trans_data}, "outputs": {}},
+        "activities": {
+            "act1": {"id": "act1", "type": "ServiceActivity", "component": {"code": "empty", "inputs": trans_data}},
+            "sub1": {
+                "id": "sub1",
+                "type": "SubProcess",
+                "params": {"${trans_data}": {"type": "splice"}},
+                "pipeline": {
+                    "data": {"inputs": {"${global_data}": {"password": "xxx"}}},
+                    "activities": {"act2": {"id": "act2", "component": {"code": "empty", "inputs": {}}}},
+                    "flows": ["flow1", "flow2"],
+                },
+            },
+        },
+    }
+
+
+def contains_inputs(data) -> bool:
+    return isinstance(data, dict) and any(key == "inputs" or contains_inputs(value) for key, value in data.items())
+
+
+def legacy_hide_sensitive_data(copy_data):
+    """原有实现：在深拷贝上原地删除 inputs"""
+    for key, value in list(copy_data.items()):
+        if key == "inputs":
+            copy_data.pop(key)
+            continue
+        if type(value) == dict:
+            legacy_hide_sensitive_data(value)
+    return copy_data
+
+
+class TestHideSensitiveData:
+    def test_same_as_deepcopy_masking(self):
+        pipeline = make_pipeline_tree()
+        source = copy.deepcopy(pipeline)
+
+        insensitive_data = hide_sensitive_data(pipeline)
+
+        # 与深拷贝后原地删除的结果一致，且不修改原数据
+        assert insensitive_data == legacy_hide_sensitive_data(copy.deepcopy(pipeline))
+        assert not contains_inputs(insensitive_data)
+        assert pipeline == source
+
+    def test_share_values_with_source(self):
+        pipeline = make_pipeline_tree()
+
+        insensitive_data = hide_sensitive_data(pipeline)
+
+        # 只重建路径上的 dict，其余的值直接共享引用
+        sub_pipeline = insensitive_data["activities"]["sub1"]["pipeline"]
+        assert sub_pipeline is not pipeline["activities"]["sub1"]["pipeline"]
+        assert sub_pipeline["flows"] is pipeline["activities"]["sub1"]["pipeline"]["flows"]
+
+    def test_run_pipeline_keep_inputs(self):
+        sub_builder = SubBuilder(root_id=ROOT_ID, data={"uid": 1})
+        sub_builder.add_act(act_name="sub act", act_component_code="empty", kwargs={"password": "xxx"})
+        pipeline = Builder(
+            root_id=ROOT_ID,
+            data={"uid": 1, "ticket_type": "MYSQL_HA_APPLY", "bk_biz_id": constant.BK_BIZ_ID, "created_by": "admin"},
+        )
+        pipeline.add_act(act_name="act", act_component_code="empty", kwargs={"password": "xxx"})
+        pipeline.add_sub_pipeline(sub_builder.build_sub_process(sub_name="sub"))
+
+        with patch.object(builder.api, "run_pipeline", return_value=EngineAPIResult(result=True, message="")) as run:
+            pipeline.run_pipeline()
+
+        # 落库的流程树去掉了敏感数据，提交给引擎的流程树保持完整
+        assert not contains_inputs(FlowTree.objects.get(root_id=ROOT_ID).tree)
+        submitted_pipeline = run.call_args[1]["pipeline"]
+        assert "inputs" in submitted_pipeline["data"]
+        for activity in submitted_pipeline["activities"].values():
+            if activity["type"] == "ServiceActivity":
+                assert activity["component"]["inputs"]["kwargs"]["value"]["password"] == "xxx"
+            else:
+                assert "inputs" in activity["pipeline"]["data"]
+
+
+class LegacyBambooEngine(BambooEngine):
+    """原有实现：每个子流程查询一次子节点状态，每个 FlowNode 遍历一次整个流程树"""
+
+    def recursion_subprocess_status(self, activities: Dict, node_maps: Dict):
+        for node_id, activity in list(activities.items()):
+            for key, value in list(activity.items()):
+                if value == "SubProcess":
+                    children_states = self.get_children_states(node_id=node_id).data
+                    try:
+                        children_status_list = [
+                            child["state"] for child in children_states[node_id]["children"].values()
+                        ]
+                        status = children_states[node_id]["state"]
+                        if status == states.RUNNING and states.FAILED in children_status_list:
+                            status = states.FAILED
+                        elif status == states.RUNNING and states.REVOKED in children_status_list:
+                            status = states.REVOKED
+                    except KeyError:
+                        status = states.CREATED
+
+                    act_status = []
+                    self.recursion_subprocess_activity_status(activity["pipeline"]["activities"], act_status, node_maps)
+                    if states.FAILED in act_status:
+                        status = states.FAILED
+                    elif states.REVOKED in act_status:
+                        status = states.REVOKED
+                    activities[node_id]["status"] = status
+                elif key == "pipeline":
+                    self.recursion_subprocess_status(activities[node_id]["pipeline"]["activities"], node_maps)
+
+    def recursion_subprocess_activity_status(self, activities: Dict, act_status: List, node_maps: Dict):
+        for node_id, activity in activities.items():
+            if activity["type"] == "SubProcess":
+                self.recursion_subprocess_activity_status(activity["pipeline"]["activities"], act_status, node_maps)
+            elif activity["type"] == "ServiceActivity":
+                act_status.append(node_maps[node_id])
+
+    def recursion_nodes_status(self, node: FlowNode, raw_data: Dict):
+        for key, values in raw_data.items():
+            if key == node.node_id:
+                raw_data[key]["status"] = node.status
+                raw_data[key]["created_at"] = int(datetime2timestamp(node.created_at))
+                raw_data[key]["started_at"] = int(datetime2timestamp(node.started_at))
+                raw_data[key]["updated_at"] = int(datetime2timestamp(node.updated_at))
+                raw_data[key]["hosts"] = node.hosts
+                continue
+            if isinstance(values, dict):
+                self.recursion_nodes_status(node, values)
+
+    def recursion_translate_activity(self, activities: Dict):
+        for activity in activities.values():
+            activity["name"] = i18n_str(activity["name"])
+            if "pipeline" in activity:
+                self.recursion_translate_activity(activity["pipeline"]["activities"])
+
+    def get_pipeline_tree_states(self) -> Optional[Dict]:
+        tree = self.get_pipeline_tree()
+        nodes = FlowNode.objects.filter(root_id=self.root_id)
+        node_maps = {node.node_id: node.status for node in nodes}
+        self.recursion_subprocess_status(tree["activities"], node_maps)
+        self.recursion_translate_activity(tree["activities"])
+        for node in nodes:
+            self.recursion_nodes_status(node, tree)
+        return tree
+
+
+class FlowTreeMaker:
+    """同时构造流程树、bamboo 节点状态和 FlowNode 记录"""
+
+    def __init__(self):
+        self.activities = {}
+        State.objects.create(node_id=ROOT_ID, root_id=ROOT_ID, parent_id=ROOT_ID, name=states.RUNNING, version="v")
+
+    def add_act(self, activities: Dict, parent_id: str, node_id: str, status: str):
+        activities[node_id] = {"id": node_id, "type": "ServiceActivity", "name": node_id}
+        State.objects.create(node_id=node_id, root_id=ROOT_ID, parent_id=parent_id, name=status, version="v")
+        FlowNode.objects.create(root_id=ROOT_ID, node_id=node_id, status=status, started_at=timezone.now())
+
+    def add_sub(self, activities: Dict, parent_id: str, node_id: str, status: Optional[str]) -> Dict:
+        """status 为空表示子流程还未开始执行"""
+        activities[node_id] = {"id": node_id, "type": "SubProcess", "name": node_id, "pipeline": {"activities": {}}}
+        if status:
+            State.objects.create(node_id=node_id, root_id=ROOT_ID, parent_id=parent_id, name=status, version="v")
+        return activities[node_id]["pipeline"]["activities"]
+
+    def save(self):
+        FlowTree.objects.create(
+            bk_biz_id=constant.BK_BIZ_ID, root_id=ROOT_ID, tree={"activities": self.activities}, status=states.RUNNING
+        )
+
+
+@pytest.fixture
+def flow_tree():
+    maker = FlowTreeMaker()
+    maker.add_act(maker.activities, ROOT_ID, "act0", states.FINISHED)
+    # 子流程中的活动节点失败，嵌套的子流程还未开始执行
+    sub1 = maker.add_sub(maker.activities, ROOT_ID, "sub1", states.RUNNING)
+    maker.add_act(sub1, "sub1", "act1", states.FAILED)
+    sub2 = maker.add_sub(sub1, "sub1", "sub2", None)
+    maker.add_act(sub2, "sub2", "act2", states.CREATED)
+    # 嵌套子流程中的活动节点撤销
+    sub3 = maker.add_sub(maker.activities, ROOT_ID, "sub3", states.RUNNING)
+    sub4 = maker.add_sub(sub3, "sub3", "sub4", states.RUNNING)
+    maker.add_act(sub4, "sub4", "act4", states.REVOKED)
+    # 已完成的子流程
+    sub5 = maker.add_sub(maker.activities, ROOT_ID, "sub5", states.FINISHED)
+    maker.add_act(sub5, "sub5", "act5", states.FINISHED)
+    maker.save()
+
+
+class TestGetPipelineTreeStates:
+    def test_same_as_recursive_walk(self, flow_tree):
+        tree = BambooEngine(root_id=ROOT_ID).get_pipeline_tree_states()
+
+        assert tree == LegacyBambooEngine(root_id=ROOT_ID).get_pipeline_tree_states()
+        sub_status = {node_id: tree["activities"][node_id]["status"] for node_id in ["sub1", "sub3", "sub5"]}
+        assert sub_status == {"sub1": states.FAILED, "sub3": states.REVOKED, "sub5": states.FINISHED}
+        assert tree["activities"]["sub1"]["pipeline"]["activities"]["sub2"]["status"] == states.CREATED
+
+    def test_query_count_independent_of_tree_size(self, flow_tree):
+        with CaptureQueriesContext(connection) as queries:
+            BambooEngine(root_id=ROOT_ID).get_pipeline_tree_states()
+        query_count = len(queries.captured_queries)
+
+        # 增加子流程后查询次数不变
+        FlowTree.objects.filter(root_id=ROOT_ID).delete()
+        State.objects.filter(node_id=ROOT_ID).delete()
+        maker = FlowTreeMaker()
+        for index in range(5):
+            sub = maker.add_sub(maker.activities, ROOT_ID, f"new-sub{index}", states.RUNNING)
+            maker.add_act(sub, f"new-sub{index}", f"new-act{index}", states.RUNNING)
+        maker.save()
+        with CaptureQueriesContext(connection) as queries:
+            BambooEngine(root_id=ROOT_ID).get_pipeline_tree_states()
+        assert len(queries.captured_queries) == query_count
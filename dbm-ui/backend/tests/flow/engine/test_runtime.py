@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from pipeline.eri.runtime import BambooDjangoRuntime
+
+from backend.flow.engine.bamboo.engine import BambooEngine
+from backend.flow.engine.bamboo.runtime import RuntimeHolder, get_runtime, runtime_holder
+
+ENGINE_NUMBER = 1000
+BENCHMARK_NUMBER = 10000
+
+# 基准测试耗时受机器负载影响，默认跳过，通过 RUN_BENCHMARK=true pytest -s 查看结果
+mark_benchmark = pytest.mark.skipif(os.environ.get("RUN_BENCHMARK") != "true", reason="benchmark only")
+
+
+class TestRuntimeHolder:
+    def test_engine_share_runtime(self):
+        assert get_runtime() is get_runtime()
+        assert BambooEngine(root_id="root1").runtime is BambooEngine(root_id="root2").runtime
+
+    def test_concurrent_get_construct_once(self):
+        constructed = []
+
+        def runtime_cls():
+            constructed.append(1)
+            return object()
+
+        holder = RuntimeHolder(runtime_cls=runtime_cls)
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            runtimes = list(ex.map(lambda __: holder.get(), range(100)))
+
+        assert len(constructed) == 1
+        assert all(runtime is runtimes[0] for runtime in runtimes)
+
+    def test_reset(self):
+        holder = RuntimeHolder()
+        runtime = holder.get()
+        holder.reset()
+        assert holder.get() is not runtime
+
+    def test_engines_construct_runtime_once(self):
+        # 大量引擎实例只构造一次 runtime，而不是每个引擎(每次调用)都重新构造
+        constructed = []
+
+        def runtime_cls():
+            constructed.append(1)
+            return BambooDjangoRuntime()
+
+        with patch.object(runtime_holder, "runtime_cls", runtime_cls):
+            runtime_holder.reset()
+            try:
+                runtimes = {id(BambooEngine(root_id=f"root{index}").runtime) for index in range(ENGINE_NUMBER)}
+            finally:
+                runtime_holder.reset()
+
+        assert len(constructed) == 1
+        assert len(runtimes) == 1
+
+    @mark_benchmark
+    def test_benchmark_construct_overhead(self):
+        # 对比每次调用都构造 runtime 和复用进程级 runtime 的开销，只输出结果，不做断言
+        construct_cost = timeit.timeit(BambooDjangoRuntime, number=BENCHMARK_NUMBER)
+        shared_cost = timeit.timeit(get_runtime, number=BENCHMARK_NUMBER)
+        print(
+            f"BambooDjangoRuntime x {BENCHMARK_NUMBER}: construct each call {construct_cost:.4f}s, "
+            f"shared {shared_cost:.4f}s"
+        )
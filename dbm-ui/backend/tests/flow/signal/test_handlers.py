@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from pipeline.eri.models import State
+
+from backend.flow.consts import StateType
+from backend.flow.engine.bamboo.engine import BambooEngine
+from backend.flow.models import FlowNode, FlowTree
+from backend.flow.signal import handlers
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+ROOT_ID = "root"
+NODE_IDS = ["node0", "node1", "node2"]
+
+
+def set_states(root_state: str, node_states: dict):
+    """同时写入 bamboo 的节点状态和 FlowNode 的节点状态"""
+    State.objects.update_or_create(
+        node_id=ROOT_ID, defaults={"root_id": ROOT_ID, "parent_id": ROOT_ID, "name": root_state, "version": "v"}
+    )
+    for node_id, state in node_states.items():
+        State.objects.update_or_create(
+            node_id=node_id, defaults={"root_id": ROOT_ID, "parent_id": ROOT_ID, "name": state, "version": "v"}
+        )
+        FlowNode.objects.update_or_create(root_id=ROOT_ID, node_id=node_id, defaults={"status": state})
+
+
+@pytest.fixture
+def flow_tree():
+    set_states(StateType.RUNNING, {node_id: StateType.CREATED for node_id in NODE_IDS})
+    return FlowTree.objects.create(
+        bk_biz_id=constant.BK_BIZ_ID, uid="1", root_id=ROOT_ID, tree={"activities": {}}, status=StateType.RUNNING
+    )
+
+
+@pytest.fixture
+def callback():
+    with patch.object(handlers.DBDirtyMachineHandler, "handle_dirty_machine"), patch.object(
+        handlers, "callback_ticket"
+    ) as callback_ticket:
+        yield callback_ticket
+
+
+def send_signal(node_id: str, to_state: str):
+    handlers.post_set_state_signal_handler(
+        sender=None, node_id=node_id, to_state=to_state, version="v2", root_id=ROOT_ID
+    )
+
+
+class TestGetRootState:
+    @pytest.mark.parametrize(
+        "root_state, node_states",
+        [
+            (StateType.RUNNING, {"node0": StateType.FINISHED, "node1": StateType.RUNNING}),
+            (StateType.RUNNING, {"node0": StateType.SUSPENDED, "node1": StateType.REVOKED}),
+            (StateType.RUNNING, {"node0": StateType.FAILED, "node1": StateType.SUSPENDED}),
+            (StateType.FINISHED, {"node0": StateType.FINISHED, "node1": StateType.FINISHED}),
+            (StateType.REVOKED, {"node0": StateType.FAILED}),
+        ],
+    )
+    def test_same_as_pipeline_states(self, root_state, node_states):
+        set_states(root_state, node_states)
+        engine = BambooEngine(root_id=ROOT_ID)
+
+        # 增量汇总的流程状态与完整状态树汇总的结果一致
+        assert engine.get_root_state() == engine.get_pipeline_states().data[ROOT_ID]["state"]
+
+    def test_root_not_exist(self):
+        assert BambooEngine(root_id=ROOT_ID).get_root_state() is None
+
+
+class TestPostSetStateSignalHandler:
+    def test_update_changed_node_only(self, flow_tree, callback):
+        with patch.object(BambooEngine, "get_pipeline_states") as get_pipeline_states, CaptureQueriesContext(
+            connection
+        ) as queries:
+            send_signal("node0", StateType.RUNNING)
+
+        # 只更新变更的节点，且不加载流程树和完整状态树
+        nodes = {node.node_id: node for node in FlowNode.objects.filter(root_id=ROOT_ID)}
+        assert (nodes["node0"].status, nodes["node0"].version_id) == (StateType.RUNNING, "v2")
+        assert nodes["node0"].started_at
+        assert all(nodes[node_id].status == StateType.CREATED for node_id in NODE_IDS[1:])
+        get_pipeline_states.assert_not_called()
+        assert not any('"flow_tree"."tree"' in query["sql"] for query in queries.captured_queries)
+        # 流程状态没有变化时不回调单据
+        callback.assert_not_called()
+
+    def test_node_failed(self, flow_tree, callback):
+        set_states(StateType.RUNNING, {"node0": StateType.FAILED})
+        send_signal("node0", StateType.FAILED)
+
+        flow_tree.refresh_from_db()
+        assert flow_tree.status == StateType.FAILED and flow_tree.tree == {"activities": {}}
+        callback.assert_called_once_with(flow_tree.uid, ROOT_ID)
+
+        # 其他节点完成时流程仍为失败
+        callback.reset_mock()
+        send_signal("node1", StateType.FINISHED)
+        flow_tree.refresh_from_db()
+        assert flow_tree.status == StateType.FAILED
+        callback.assert_not_called()
+
+    def test_root_node_reconcile(self, flow_tree, callback):
+        set_states(StateType.RUNNING, {node_id: StateType.FINISHED for node_id in NODE_IDS})
+
+        # 子节点完成时流程仍在运行，根节点完成时通过完整状态树对账
+        send_signal("node2", StateType.FINISHED)
+        flow_tree.refresh_from_db()
+        assert flow_tree.status == StateType.RUNNING
+        set_states(StateType.FINISHED, {})
+        with patch.object(BambooEngine, "get_pipeline_states", wraps=BambooEngine(ROOT_ID).get_pipeline_states) as get:
+            send_signal(ROOT_ID, StateType.FINISHED)
+        get.assert_called_once()
+        flow_tree.refresh_from_db()
+        assert flow_tree.status == StateType.FINISHED
+        callback.assert_called_once_with(flow_tree.uid, ROOT_ID)
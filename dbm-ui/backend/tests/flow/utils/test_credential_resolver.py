@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import base64
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import Cluster
+from backend.flow.consts import MySQLPrivComponent, UserName
+from backend.flow.utils.base.credential_resolver import (
+    PASSWORD_QUERY_BATCH_SIZE,
+    credential_scope,
+    get_credential_resolver,
+)
+from backend.flow.utils.base.payload_handler import PayloadHandler
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeDBPrivManagerApi:
+    """记录每次 get_password 请求，按 (ip, port, bk_cloud_id, username, component) 返回预置的密码"""
+
+    def __init__(self, passwords=None):
+        self.passwords = passwords or {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_password(self, params):
+        with self._lock:
+            self.calls.append(params)
+        items = []
+        for instance in params["instances"]:
+            for user in params["users"]:
+                key = (instance["ip"], instance["port"], instance["bk_cloud_id"], user["username"], user["component"])
+                if key in self.passwords:
+                    items.append({**instance, **user, "password": self.passwords[key]})
+        return {"items": items}
+
+    @property
+    def queried_instance_counts(self):
+        return sorted(len(call["instances"]) for call in self.calls)
+
+
+@pytest.fixture
+def priv_api():
+    api = FakeDBPrivManagerApi()
+    with patch("backend.flow.utils.base.credential_resolver.DBPrivManagerApi", api):
+        yield api
+
+
+def make_instance(ip: str, port: int = 20000, bk_cloud_id: int = 0):
+    return {"ip": ip, "port": port, "bk_cloud_id": bk_cloud_id}
+
+
+ADMIN = {"username": "admin", "component": "mysql"}
+MONITOR = {"username": "monitor", "component": "mysql"}
+
+
+class TestCredentialResolver:
+    def test_dedupe(self, priv_api):
+        instances = [make_instance("127.0.0.1"), make_instance("127.0.0.2")]
+        priv_api.passwords = {("127.0.0.1", 20000, 0, "admin", "mysql"): "p1"}
+
+        with credential_scope() as resolver:
+            items = resolver.get_password(instances=instances + instances[:1], users=[ADMIN])
+            # 重复的实例只查询一次，密码服务没有返回的组合也不会重复查询
+            assert resolver.get_password(instances=instances, users=[ADMIN]) == items[:1]
+
+        # 返回结果与传入的实例一一对应
+        assert [item["password"] for item in items] == ["p1", "p1"]
+        assert priv_api.queried_instance_counts == [2]
+
+    def test_query_in_batches(self, priv_api):
+        instances = [make_instance(f"127.0.{index // 256}.{index % 256}") for index in range(250)]
+        priv_api.passwords = {(instance["ip"], 20000, 0, "admin", "mysql"): instance["ip"] for instance in instances}
+
+        items = get_credential_resolver().get_password(instances=instances, users=[ADMIN])
+
+        # 超过单次查询的实例数上限时分批查询，结果与实例的顺序一致
+        assert priv_api.queried_instance_counts == [50, PASSWORD_QUERY_BATCH_SIZE, PASSWORD_QUERY_BATCH_SIZE]
+        assert [item["password"] for item in items] == [instance["ip"] for instance in instances]
+
+    def test_map_items_to_instance_and_user(self, priv_api):
+        instances = [
+            make_instance("127.0.0.1"),
+            make_instance("127.0.0.1", port=20001),
+            make_instance("127.0.0.1", 20000, 1),
+        ]
+        priv_api.passwords = {
+            ("127.0.0.1", 20000, 0, "admin", "mysql"): "admin-20000",
+            ("127.0.0.1", 20001, 0, "monitor", "mysql"): "monitor-20001",
+            ("127.0.0.1", 20000, 1, "admin", "mysql"): "admin-cloud-1",
+            ("127.0.0.1", 20000, 1, "monitor", "mysql"): "monitor-cloud-1",
+        }
+
+        with credential_scope() as resolver:
+            resolver.get_password(instances=instances, users=[ADMIN, MONITOR])
+
+            # 按返回记录的 ip/port/bk_cloud_id 与 username/component 对应到实例和账号，之后直接命中缓存
+            def get_passwords(instance, user):
+                return [item["password"] for item in resolver.get_password(instances=[instance], users=[user])]
+
+            assert get_passwords(instances[0], ADMIN) == ["admin-20000"]
+            assert get_passwords(instances[0], MONITOR) == []
+            assert get_passwords(instances[1], MONITOR) == ["monitor-20001"]
+            assert get_passwords(instances[2], ADMIN) == ["admin-cloud-1"]
+            assert get_passwords(instances[2], MONITOR) == ["monitor-cloud-1"]
+
+        assert len(priv_api.calls) == 1
+
+    def test_single_instance_ignore_item_instance(self, priv_api):
+        # 单实例查询时与直接调用密码服务一致，不依赖返回记录中的实例信息
+        priv_api.get_password = lambda params: {"items": [{**make_instance("0.0.0.0", 0), **ADMIN, "password": "p"}]}
+
+        items = get_credential_resolver().get_password(instances=[make_instance("127.0.0.1")], users=[ADMIN])
+
+        assert [item["password"] for item in items] == ["p"]
+
+    def test_cache_lifetime(self, priv_api):
+        instance = make_instance("127.0.0.1")
+
+        with credential_scope() as resolver:
+            # 嵌套使用时复用外层的解析器
+            with credential_scope() as inner_resolver:
+                assert inner_resolver is resolver is get_credential_resolver()
+            get_credential_resolver().get_password(instances=[instance], users=[ADMIN])
+            get_credential_resolver().get_password(instances=[instance], users=[ADMIN])
+            assert len(priv_api.calls) == 1
+
+            # 密码变更后清空缓存重新查询
+            resolver.clear()
+            resolver.get_password(instances=[instance], users=[ADMIN])
+            assert len(priv_api.calls) == 2
+
+        # 不在 credential_scope 内时不做缓存
+        assert get_credential_resolver() is not resolver
+        get_credential_resolver().get_password(instances=[instance], users=[ADMIN])
+        get_credential_resolver().get_password(instances=[instance], users=[ADMIN])
+        assert len(priv_api.calls) == 4
+
+
+class TestRedisClusterPassword:
+    def test_prefetch_by_cluster_ids(self, priv_api):
+        clusters = [
+            Cluster.objects.create(
+                bk_biz_id=constant.BK_BIZ_ID,
+                name=f"redis{index}",
+                db_module_id=constant.DB_MODULE_ID,
+                immute_domain=f"redis{index}.db.com",
+                cluster_type=ClusterType.TendisTwemproxyRedisInstance.value,
+            )
+            for index in range(3)
+        ]
+        priv_api.passwords = {
+            (str(cluster.id), 0, 0, UserName.REDIS_DEFAULT.value, MySQLPrivComponent.REDIS.value): base64.b64encode(
+                cluster.name.encode()
+            ).decode()
+            for cluster in clusters
+        }
+
+        with credential_scope():
+            PayloadHandler.redis_batch_get_password_by_cluster_ids([cluster.id for cluster in clusters])
+            # 预取之后逐个集群获取密码直接命中缓存
+            passwords = [PayloadHandler.redis_get_password_by_domain(cluster.immute_domain) for cluster in clusters]
+
+        assert len(priv_api.calls) == 1
+        assert [password["redis_password"] for password in passwords] == ["redis0", "redis1", "redis2"]
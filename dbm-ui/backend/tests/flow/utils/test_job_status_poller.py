@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from collections import defaultdict
+
+import pytest
+
+from backend.flow.utils.job_status_poller import JobAgeIntervalGenerator, JobStatusPoller, get_poll_interval
+from backend.tests.mock_data.components.job import JOB_SUCCESS_STATUS
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeRedis:
+    """只实现 JobStatusPoller 用到的 redis 命令"""
+
+    def __init__(self):
+        self.zsets = defaultdict(dict)
+        self.hashes = defaultdict(dict)
+        self.strings = {}
+
+    def zadd(self, name, mapping, nx=False, xx=False):
+        for member, score in mapping.items():
+            member = str(member)
+            exists = member in self.zsets[name]
+            if (nx and exists) or (xx and not exists):
+                continue
+            self.zsets[name][member] = score
+
+    def zscore(self, name, member):
+        return self.zsets[name].get(str(member))
+
+    def zrem(self, name, *members):
+        for member in members:
+            self.zsets[name].pop(str(member), None)
+
+    def zrangebyscore(self, name, min, max, start=None, num=None):
+        members = sorted((score, member) for member, score in self.zsets[name].items() if min <= score <= max)
+        members = [member for __, member in members]
+        return members[start : start + num] if num is not None else members
+
+    def hset(self, name, mapping):
+        self.hashes[name].update({str(key): value for key, value in mapping.items()})
+
+    def hget(self, name, key):
+        return self.hashes[name].get(str(key))
+
+    def hdel(self, name, *keys):
+        for key in keys:
+            self.hashes[name].pop(str(key), None)
+
+    def set(self, name, value, nx=False, ex=None):
+        if nx and name in self.strings:
+            return None
+        self.strings[name] = value
+        return True
+
+    def get(self, name):
+        return self.strings.get(name)
+
+    def delete(self, name):
+        self.strings.pop(name, None)
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def zscore(self, name, member):
+        self.commands.append(lambda: self.redis.zscore(name, member))
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+class FakeJobApi:
+    def __init__(self):
+        self.finished_jobs = set()
+        self.calls = []
+
+    def get_job_instance_status(self, payload, raw=True):
+        job_instance_id = payload["job_instance_id"]
+        self.calls.append(job_instance_id)
+        return {
+            "result": True,
+            "data": {
+                "finished": job_instance_id in self.finished_jobs,
+                "job_instance": {"job_instance_id": job_instance_id, "status": JOB_SUCCESS_STATUS},
+                "step_instance_list": [{"step_instance_id": job_instance_id + 1}],
+            },
+        }
+
+
+@pytest.fixture
+def job_api():
+    return FakeJobApi()
+
+
+@pytest.fixture
+def poller(job_api):
+    return JobStatusPoller(job_api=job_api, redis_conn=FakeRedis())
+
+
+class TestJobStatusPoller:
+    def test_running_job_is_polled_once_per_interval(self, poller, job_api):
+        # 同一个作业被多个调度同时查询时，只会请求一次 JOB
+        for __ in range(5):
+            assert poller.get_status(1000) is None
+        assert job_api.calls == [1000]
+
+    def test_batch_poll_all_due_jobs(self, poller, job_api):
+        for job_instance_id in [1000, 2000, 3000]:
+            poller.register(job_instance_id)
+        job_api.finished_jobs = {2000}
+
+        assert poller.poll() == 3
+        assert sorted(job_api.calls) == [1000, 2000, 3000]
+        # 已结束的作业可以直接读取结果，不需要再请求 JOB
+        assert poller.get_result(2000)["data"]["finished"]
+        assert poller.get_result(1000) is None
+
+    def test_finished_job_release(self, poller, job_api):
+        job_api.finished_jobs = {1000}
+        resp = poller.get_status(1000)
+        assert resp["data"]["job_instance"]["status"] == JOB_SUCCESS_STATUS
+
+        poller.release(1000)
+        assert poller.get_result(1000) is None
+        assert poller.poll() == 0
+
+    def test_poll_lock_released_by_owner_only(self, poller, job_api):
+        poller.register(1000)
+
+        def get_job_instance_status(payload, raw=True):
+            # 模拟轮询耗时超过锁的过期时间，锁被其他调用方抢占
+            poller.redis.strings[poller.LOCK_KEY] = "other"
+            return {"result": True, "data": {"finished": False}}
+
+        job_api.get_job_instance_status = get_job_instance_status
+        assert poller.poll() == 1
+        assert poller.redis.get(poller.LOCK_KEY) == "other"
+
+        # 持有锁期间其他调用方不会轮询
+        assert poller.poll() == 0
+
+    def test_poll_interval_backoff(self):
+        assert get_poll_interval(0) == 5
+        assert get_poll_interval(120) == 10
+        assert get_poll_interval(600) == 30
+        assert get_poll_interval(3600) == 60
+
+        generator = JobAgeIntervalGenerator()
+        intervals = []
+        for count in range(40):
+            generator.count = count
+            intervals.append(generator.next())
+        assert intervals[0] == 5
+        assert intervals == sorted(intervals)
+        assert intervals[-1] > intervals[0]
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from backend.flow.consts import RedisRole
+from backend.flow.utils.redis.redis_cluster_nodes import (
+    ClusterNodes,
+    SlotRangeSet,
+    convert_slot_to_str,
+    decode_slots_from_str,
+    plan_slots_migration,
+)
+
+CLUSTER_NODES = """\
+a1 1.1.1.1:30000@40000 myself,master - 0 0 1 connected 0-5460 [5461->-a2]
+a2 1.1.1.2:30000@40000 master - 0 1700000000000 2 connected 5461-10922 [5461-<-a1]
+a3 1.1.1.3:30000@40000 master - 0 1700000000000 3 connected 10923-16383
+b1 1.1.1.4:30000@40000 slave a1 0 1700000000000 1 connected
+b2 1.1.1.5:30000@40000 slave a2 0 1700000000000 2 disconnected
+"""
+
+
+class TestSlotRangeSet:
+    def test_parse_and_format(self):
+        slots = SlotRangeSet.from_str("100-200,0-10,11,300")
+        assert slots.ranges == [(0, 11), (100, 200), (300, 300)]
+        assert str(slots) == "0-11,100-200,300"
+        assert len(slots) == 12 + 101 + 1
+        assert 150 in slots and 250 not in slots
+
+    def test_set_operations(self):
+        left = SlotRangeSet.from_str("0-100,200-300")
+        right = SlotRangeSet.from_str("50-250")
+        assert str(left | right) == "0-300"
+        assert str(left - right) == "0-49,251-300"
+        assert str(left & right) == "50-100,200-250"
+        assert str(SlotRangeSet.full() - left - right) == "301-16383"
+
+    def test_compatible_helpers(self):
+        assert convert_slot_to_str([17, 0, 1, 2, 3, 4, 10, 11, 12, 13]) == "0-4,10-13,17"
+        slots, slot_map, __, __ = decode_slots_from_str("0-3,5", ",")
+        assert slots == [0, 1, 2, 3, 5]
+        assert slot_map[5] and 4 not in slot_map
+
+    def test_split(self):
+        taken, rest = SlotRangeSet.from_str("0-9,20-29").split(15)
+        assert str(taken) == "0-9,20-24"
+        assert str(rest) == "25-29"
+
+    def test_plan_slots_migration(self):
+        node_slots = {"a": SlotRangeSet.full(), "b": SlotRangeSet()}
+        plans = plan_slots_migration(node_slots, ["a", "b", "c", "d"])
+
+        result = {node: SlotRangeSet(slots.ranges) for node, slots in node_slots.items()}
+        for src, dst, slots in plans:
+            result[src] = result[src] - slots
+            result.setdefault(dst, SlotRangeSet())
+            result[dst] = result[dst] | slots
+        assert [len(result[node]) for node in ["a", "b", "c", "d"]] == [4096] * 4
+        assert SlotRangeSet().union(*result.values()) == SlotRangeSet.full()
+
+        # 不在目标节点中的节点会迁出全部 slot
+        plans = plan_slots_migration({"a": SlotRangeSet.full(), "b": SlotRangeSet()}, ["b"])
+        assert plans == [("a", "b", SlotRangeSet.full())]
+
+
+class TestClusterNodes:
+    def test_parse_cluster_nodes(self):
+        cluster_nodes = ClusterNodes.parse(CLUSTER_NODES)
+        assert len(cluster_nodes.nodes) == 5
+
+        master = cluster_nodes.addr_to_node["1.1.1.1:30000"]
+        assert master.is_myself and master.get_role() == RedisRole.MASTER.value
+        assert master.slot_cnt == 5461
+        assert master.migrating_slots == {5461: "a2"}
+        assert cluster_nodes.node_id_to_node["a2"].importing_slots == {5461: "a1"}
+
+        assert [node.node_id for node in cluster_nodes.masters_with_slots] == ["a1", "a2", "a3"]
+        slaves = cluster_nodes.slaves_by_master_id
+        assert slaves["a1"][0].is_running() and not slaves["a2"][0].is_running()
+        assert not cluster_nodes.missing_slots
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from iam import IAM, Resource
+
+from backend import env
+from backend.iam_app.dataclass.actions import ActionEnum
+from backend.iam_app.dataclass.resources import ResourceEnum
+from backend.iam_app.handlers.permission import Permission
+
+pytestmark = pytest.mark.django_db
+
+POLICY_CACHE_TIME = 60
+USERNAME = "admin"
+
+ACTIONS = [ActionEnum.TICKET_CONFIG_SET, ActionEnum.GLOBAL_DBCONFIG_EDIT, ActionEnum.GLOBAL_DBCONFIG_CREATE]
+# GLOBAL_DBCONFIG_CREATE 没有任何策略
+ACTION_POLICIES = {
+    ActionEnum.TICKET_CONFIG_SET.id: {"op": "in", "field": "dbtype.id", "value": ["mysql", "redis"]},
+    ActionEnum.GLOBAL_DBCONFIG_EDIT.id: {"op": "eq", "field": "dbtype.id", "value": "redis"},
+}
+
+
+def policy_query_by_actions(request, with_resources=True):
+    return [
+        {"action": {"id": action.id}, "condition": ACTION_POLICIES[action.id]}
+        for action in request.actions
+        if action.id in ACTION_POLICIES
+    ]
+
+
+def policy_query(request, with_resources=True):
+    return ACTION_POLICIES.get(request.action.id)
+
+
+@pytest.fixture(autouse=True)
+def policy_cache():
+    # 同名的 LocMemCache 共享存储，每个用例开始前清空
+    local_cache = LocMemCache("iam_policy", {})
+    local_cache.clear()
+    with patch("backend.iam_app.handlers.permission.cache", local_cache), patch.object(
+        env, "BK_IAM_POLICY_CACHE_TIME", POLICY_CACHE_TIME
+    ):
+        yield local_cache
+
+
+@pytest.fixture
+def permission():
+    # 客户端初始化后再关闭 BK_IAM_SKIP，使用真实的 IAM SDK 并替换掉对权限中心的请求
+    permission = Permission(username=USERNAME)
+    permission._iam = IAM(env.APP_CODE, env.SECRET_KEY, bk_apigateway_url="http://iam.example.com", api_version="v2")
+    permission._iam._do_policy_query_by_actions = MagicMock(side_effect=policy_query_by_actions)
+    permission._iam._do_policy_query = MagicMock(side_effect=policy_query)
+    with patch.object(env, "BK_IAM_SKIP", False):
+        yield permission
+
+
+def make_dbtype_resources(db_types):
+    return [[Permission.make_resource_instance(ResourceEnum.DBTYPE.id, db_type)] for db_type in db_types]
+
+
+class TestActionPolicies:
+    def test_batch_query_missing_actions(self, permission):
+        permission.get_action_policies(ActionEnum.TICKET_CONFIG_SET)
+        permission._iam._do_policy_query_by_actions.reset_mock()
+
+        action_policies = permission.get_actions_policies(ACTIONS)
+
+        # 缓存中缺失的动作合并为一次查询，没有策略的动作同样缓存为空
+        assert action_policies == {**ACTION_POLICIES, ActionEnum.GLOBAL_DBCONFIG_CREATE.id: []}
+        request = permission._iam._do_policy_query_by_actions.call_args[0][0]
+        assert [action.id for action in request.actions] == [action.id for action in ACTIONS[1:]]
+        permission._iam._do_policy_query_by_actions.reset_mock()
+        permission.get_actions_policies(ACTIONS)
+        permission._iam._do_policy_query_by_actions.assert_not_called()
+
+    def test_cache_expire(self, permission):
+        permission.get_action_policies(ActionEnum.TICKET_CONFIG_SET)
+        permission.get_action_policies(ActionEnum.TICKET_CONFIG_SET)
+        assert permission._iam._do_policy_query_by_actions.call_count == 1
+
+        # 策略缓存过期后重新查询
+        with patch("time.time", return_value=time.time() + POLICY_CACHE_TIME + 1):
+            permission.get_action_policies(ActionEnum.TICKET_CONFIG_SET)
+        assert permission._iam._do_policy_query_by_actions.call_count == 2
+
+    def test_cache_disabled(self, permission):
+        with patch.object(env, "BK_IAM_POLICY_CACHE_TIME", 0):
+            permission.get_action_policies(ActionEnum.TICKET_CONFIG_SET)
+            permission.get_action_policies(ActionEnum.TICKET_CONFIG_SET)
+        assert permission._iam._do_policy_query_by_actions.call_count == 2
+
+    def test_invalidate_policy_cache(self, permission):
+        permission.get_actions_policies(ACTIONS)
+
+        # 只清理指定动作的缓存
+        Permission.invalidate_policy_cache(USERNAME, [ActionEnum.TICKET_CONFIG_SET])
+        permission.get_actions_policies(ACTIONS)
+        request = permission._iam._do_policy_query_by_actions.call_args[0][0]
+        assert [action.id for action in request.actions] == [ActionEnum.TICKET_CONFIG_SET.id]
+
+        # 不指定动作时清理用户所有动作的缓存
+        Permission.invalidate_policy_cache(USERNAME)
+        permission.get_actions_policies(ACTIONS)
+        request = permission._iam._do_policy_query_by_actions.call_args[0][0]
+        assert [action.id for action in request.actions] == [action.id for action in ACTIONS]
+
+
+class TestLocalEval:
+    def test_batch_is_allowed_same_as_sdk(self, permission):
+        resources = make_dbtype_resources(["mysql", "redis", "es"])
+
+        batch_permission = permission.batch_is_allowed(ACTIONS, resources)
+
+        sdk_permission = permission._iam.batch_resource_multi_actions_allowed(
+            permission.make_multi_request(ACTIONS), resources
+        )
+        # SDK 不返回没有策略的动作，本地计算时这类动作均无权限
+        for resource_id, action_permission in sdk_permission.items():
+            assert {**action_permission, ActionEnum.GLOBAL_DBCONFIG_CREATE.id: False} == batch_permission[resource_id]
+        assert batch_permission["redis"] == {
+            action.id: action != ActionEnum.GLOBAL_DBCONFIG_CREATE for action in ACTIONS
+        }
+        assert not any(batch_permission["es"].values())
+
+    def test_is_allowed_same_as_sdk(self, permission):
+        for action in ACTIONS:
+            for resources in make_dbtype_resources(["mysql", "redis", "es"]):
+                sdk_allowed = permission._iam.is_allowed(permission.make_request(action, resources))
+                assert permission.is_allowed(action, resources) == sdk_allowed
+
+    def test_cross_system_fallback(self, permission):
+        permission._iam.is_allowed = MagicMock(return_value=True)
+        resources = [Resource("bk_cmdb", "biz", "1", {})]
+
+        # 跨系统资源交由权限中心计算，不使用缓存的策略
+        assert permission.is_allowed(ActionEnum.DB_MANAGE, resources)
+        permission._iam.is_allowed.assert_called_once()
+        permission._iam._do_policy_query_by_actions.assert_not_called()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from backend.utils.cache import LocalTTLCache, SingleFlight, format_cache_key, func_cache_decorator
+
+
+@pytest.fixture
+def local_cache():
+    # 同名的 LocMemCache 共享存储，每个用例开始前清空
+    cache = LocMemCache("func_cache", {})
+    cache.clear()
+    with patch("backend.utils.cache.cache", cache):
+        yield cache
+
+
+class Counter:
+    """记录被调用的次数，可以指定每次调用的耗时"""
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, value="value"):
+        with self._lock:
+            self.count += 1
+        time.sleep(self.latency)
+        return value
+
+
+class TestSingleFlight:
+    def test_compute_once_when_concurrent(self, local_cache):
+        compute = Counter(latency=0.3)
+
+        with ThreadPoolExecutor(5) as executor:
+            futures = [executor.submit(SingleFlight("key", 60).get_or_compute, compute) for __ in range(5)]
+            values = [future.result() for future in futures]
+
+        # 只有抢到锁的调用方重新计算，其余调用方等待新值
+        assert values == ["value"] * 5
+        assert compute.count == 1
+        assert local_cache.get("key:lock") is None
+
+    def test_return_stale_while_computing(self, local_cache):
+        SingleFlight("key", 60).set("old")
+        local_cache.delete("key")
+        assert SingleFlight("key", 60).acquire()
+
+        # 其他调用方正在重新计算时，直接返回旧值
+        compute = Counter()
+        assert SingleFlight("key", 60).get_or_compute(compute) == "old"
+        assert compute.count == 0
+
+    def test_compute_after_wait_timeout(self, local_cache):
+        assert SingleFlight("key", 60).acquire()
+
+        # 没有旧值且等待超时，自行计算兜底
+        compute = Counter()
+        assert SingleFlight("key", 60, wait_timeout=0.2).get_or_compute(compute) == "value"
+        assert compute.count == 1
+        assert local_cache.get("key") == "value"
+
+    def test_release_own_lock_only(self, local_cache):
+        flight = SingleFlight("key", 60)
+        assert flight.acquire()
+
+        # 锁过期后被其他调用方抢占，不会误删其他调用方的锁
+        local_cache.delete(flight.lock_key)
+        other_flight = SingleFlight("key", 60)
+        assert other_flight.acquire()
+        flight.release()
+        assert local_cache.get(flight.lock_key) == other_flight._lock_token
+
+
+class TestFuncCacheInvalidate:
+    def test_invalidate(self, local_cache):
+        counter = Counter()
+
+        @func_cache_decorator(cache_time=60)
+        def get_value(value):
+            return counter(value)
+
+        assert get_value("a", get_cache=True) == "a"
+        assert get_value("a", get_cache=True) == "a"
+        assert counter.count == 1
+
+        # 失效后同时删除旧值副本，重新计算期间不会返回失效前的数据
+        get_value.invalidate("a")
+        cache_key = format_cache_key(get_value.__wrapped__, "a")
+        assert local_cache.get(cache_key) is None
+        assert local_cache.get(SingleFlight(cache_key, 60).stale_key) is None
+
+        assert get_value("a", get_cache=True) == "a"
+        assert counter.count == 2
+        # 只失效指定参数的缓存
+        get_value("b", get_cache=True)
+        get_value.invalidate("a")
+        assert local_cache.get(format_cache_key(get_value.__wrapped__, "b")) is not None
+
+
+class TestLocalTTLCache:
+    def test_expire_after_ttl(self):
+        cache = LocalTTLCache(maxsize=2, ttl=60)
+        cache.set("a", "value")
+        assert cache.get("a") == "value"
+
+        with patch("backend.utils.cache.time.monotonic", return_value=time.monotonic() + 61):
+            assert cache.get("a") is None
+        assert cache.get("a") is None
+
+    def test_evict_least_recently_used(self):
+        cache = LocalTTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # 读取后 a 变为最近使用，超过容量时淘汰 b
+        cache.get("a")
+        cache.set("c", 3)
+        assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+        cache.delete("a")
+        assert cache.get("a") is None
+        cache.clear()
+        assert cache.get("c") is None
+
+
+class TestFuncCacheLocalTier:
+    def test_hit_local_cache(self, local_cache):
+        counter = Counter()
+
+        @func_cache_decorator(cache_time=60, local_cache_size=10, local_cache_time=10)
+        def get_value(value):
+            return {"value": counter(value)}
+
+        value = get_value("a", get_cache=True)
+        # 本地缓存命中时不访问 redis，直接返回同一个对象
+        local_cache.clear()
+        assert get_value("a", get_cache=True) is value
+        assert counter.count == 1
+
+        # 本地缓存过期后从 redis 获取并回填，redis 中也没有时重新计算
+        with patch("backend.utils.cache.time.monotonic", return_value=time.monotonic() + 11):
+            assert get_value("a", get_cache=True) == value
+        assert counter.count == 2
+        assert get_value("a", get_cache=True) == value
+        assert counter.count == 2
+
+    def test_refresh_and_invalidate_local_cache(self, local_cache):
+        counter = Counter()
+
+        @func_cache_decorator(cache_time=60, local_cache_size=10)
+        def get_value(value):
+            return [counter(value), counter.count]
+
+        # 不从缓存获取时会刷新本地缓存
+        get_value("a", get_cache=True)
+        refreshed = get_value("a")
+        assert get_value("a", get_cache=True) is refreshed
+
+        # 失效时同时删除本地缓存
+        get_value.invalidate("a")
+        assert get_value("a", get_cache=True) == ["a", 3]
+
+        # cache_clear 只清空本地缓存，redis 中的缓存仍然有效
+        get_value.cache_clear()
+        assert get_value("a", get_cache=True) == ["a", 3]
+        assert counter.count == 3
+
+    def test_local_cache_disabled(self, local_cache):
+        counter = Counter()
+
+        @func_cache_decorator(cache_time=60)
+        def get_value(value):
+            return {"value": counter(value)}
+
+        value = get_value("a", get_cache=True)
+        # 未启用本地缓存时每次从 redis 反序列化
+        assert get_value("a", get_cache=True) is not value
+        local_cache.clear()
+        get_value("a", get_cache=True)
+        assert counter.count == 2
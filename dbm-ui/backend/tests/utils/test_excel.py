@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import io
+
+from openpyxl import load_workbook
+
+from backend.utils.excel import ExcelHandler
+
+
+class TestExcelHandler:
+    def test_stream_response(self):
+        headers = [{"id": "cluster_id", "name": "集群ID"}, {"id": "master_domain", "name": "主域名"}, "proxy"]
+        rows = [
+            {"cluster_id": 1, "master_domain": "a.db.com", "proxy": "127.0.0.1:10000\n127.0.0.2:10000"},
+            # 缺失的列写入空单元格，多余的字段忽略
+            {"cluster_id": 2, "master_domain": "b.db.com", "unknown": "x"},
+        ]
+        # 数据在响应迭代时才开始生成
+        consumed = []
+
+        def iter_rows():
+            for row in rows:
+                consumed.append(row)
+                yield row
+
+        response = ExcelHandler.stream_response(iter_rows(), headers, "clusters.xlsx", chunk_size=1024)
+        assert response["Content-Disposition"] == "attachment;filename=clusters.xlsx"
+        assert not consumed
+
+        chunks = list(response.streaming_content)
+        assert all(len(chunk) <= 1024 for chunk in chunks)
+
+        sheet = load_workbook(io.BytesIO(b"".join(chunks))).active
+        assert [list(row) for row in sheet.iter_rows(values_only=True)] == [
+            ["集群ID", "主域名", "proxy"],
+            ["1", "a.db.com", "127.0.0.1:10000\n127.0.0.2:10000"],
+            ["2", "b.db.com", None],
+        ]
@@ -85,9 +85,11 @@ class MySQLBaseOperateDetailSerializer(SkipToRepresentationMixin, serializers.Se
 
     def validate_cluster_can_access(self, attrs):
         """校验集群状态是否可以提单"""
-        clusters = Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs))
+        clusters = list(Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs)))
         ticket_type = self.context["ticket_type"]
 
+        # 批量计算集群状态位，避免逐个集群查询实例状态
+        Cluster.fill_status_flags(clusters)
         for cluster in clusters:
             if cluster.cluster_type == ClusterType.TenDBSingle:
                 # 如果单节点异常，则直接报错
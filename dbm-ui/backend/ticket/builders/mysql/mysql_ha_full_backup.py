@@ -43,12 +43,12 @@ class MySQLHaFullBackupDetailSerializer(MySQLBaseOperateDetailSerializer):
             self.validate_cluster_can_access(attrs)
         except serializers.ValidationError as e:
             clusters = Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs))
-            id__cluster = {cluster.id: cluster for cluster in clusters}
+            id__status_flag = Cluster.fill_status_flags(clusters)
             # 如果备份位置选的是master，但是slave异常，则认为是可以的
             for info in attrs["infos"]["clusters"]:
                 if info["backup_local"] != InstanceInnerRole.MASTER:
                     raise serializers.ValidationError(e)
-                if id__cluster[info["cluster_id"]].status_flag & ClusterDBHAStatusFlags.BackendMasterUnavailable:
+                if id__status_flag[info["cluster_id"]] & ClusterDBHAStatusFlags.BackendMasterUnavailable:
                     raise serializers.ValidationError(e)
 
         return attrs
@@ -22,6 +22,7 @@ from backend.db_meta.exceptions import ClusterExclusiveOperateException
 from backend.db_meta.models import Cluster
 from backend.flow.consts import StateType
 from backend.flow.models import FlowTree
+from backend.flow.utils.base.credential_resolver import credential_scope
 from backend.ticket import constants
 from backend.ticket.builders.common.base import fetch_cluster_ids
 from backend.ticket.constants import BAMBOO_STATE__TICKET_STATE_MAP, FlowCallbackType
@@ -163,7 +164,9 @@ class InnerFlow(BaseTicketFlow):
         controller_class = getattr(controller_module, controller_info["class_name"])
         controller_inst = controller_class(root_id=root_id, ticket_data=flow_details["ticket_data"])
 
-        return getattr(controller_inst, controller_info["func_name"])()
+        # 流程构造期间共享密码/配置的查询结果，避免逐个集群、逐个节点重复查询
+        with credential_scope():
+            return getattr(controller_inst, controller_info["func_name"])()
 
     def _retry(self) -> Any:
         # 重试则将机器挪出污点池
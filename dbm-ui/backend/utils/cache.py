@@ -10,15 +10,24 @@ specific language governing permissions and limitations under the License.
 """
 
 import json
+import logging
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Optional, Union
+from typing import Any, Callable, Dict, Hashable, Optional, Union
 
 from django.core.cache import cache
 
 from backend.utils.md5 import count_md5
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("root")
 
 DEFAULT_CACHE_TIME = 60 * 15
+# 缓存失效后旧值的保留时间，用于在重新计算期间返回旧值
+DEFAULT_STALE_TIME = 60 * 5
 
 
 def class_member_cache(name: Optional[str] = None):
@@ -52,29 +61,248 @@ def format_cache_key(func: Callable, *args, **kwargs):
     return f"{func.__name__}_{count_md5(kwargs)}"
 
 
-def func_cache_decorator(cache_time: int = DEFAULT_CACHE_TIME):
+class LocalTTLCache(object):
+    """
+    进程内的 LRU 缓存，条目超过 ttl 秒后失效，超过 maxsize 时淘汰最久未使用的条目
+    注意：缓存直接返回同一个对象，调用方不能修改返回的结果
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expire_at, value = item
+            if expire_at < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class VersionedSnapshot(object):
+    """
+    带版本号的进程内快照
+    - 数据按 key 懒加载到进程内存，命中快照时不再查询数据库
+    - 数据变更提交后自增 redis 中的版本号，各进程最多每隔 check_interval 秒检查一次版本号，
+      版本号变化时丢弃整个快照，因此数据变更最多延迟 check_interval 秒生效
+    - redis 不可用时每次检查都会丢弃快照，退化为最多缓存 check_interval 秒
+    注意：快照直接返回同一个对象，调用方不能修改返回的结果
+    """
+
+    def __init__(self, version_key: str, check_interval: float = 5, redis_conn=None):
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.redis = redis_conn or RedisConn
+        self._version: Optional[str] = None
+        self._checked_at: float = 0
+        self._values: Dict[Hashable, Any] = {}
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < self.check_interval:
+            return
+
+        self._checked_at = now
+        try:
+            version = self.redis.get(self.version_key)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(f"get snapshot version {self.version_key} failed: {err}")
+            self._values = {}
+            return
+
+        if version != self._version:
+            self._version = version
+            self._values = {}
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """从快照中获取数据，未命中时通过 loader 加载"""
+        self._check_version()
+        values = self._values
+        if key not in values:
+            values[key] = loader()
+        return values[key]
+
+    def clear(self):
+        """丢弃当前进程的快照，下次读取时重新检查版本号"""
+        self._values = {}
+        self._checked_at = 0
+
+    def bump(self):
+        """数据变更后自增版本号，并丢弃当前进程的快照"""
+        self.clear()
+        try:
+            self.redis.incr(self.version_key)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(f"bump snapshot version {self.version_key} failed: {err}")
+
+
+class SingleFlight(object):
+    """
+    缓存击穿保护(single-flight)：缓存失效时只允许一个调用方重新计算，其余调用方优先返回旧值，没有旧值时等待新值
+    - 缓存值写入时会额外保留一份旧值副本，多保留 stale_time 秒
+    - 重新计算的调用方通过 cache.add 抢占分布式锁，锁超过 lock_timeout 秒自动释放
+    - 等待超过 wait_timeout 秒仍未拿到新值时，调用方自行计算兜底
+    """
+
+    WAIT_INTERVAL = 0.1
+
+    def __init__(
+        self,
+        cache_key: str,
+        cache_time: int,
+        stale_time: int = DEFAULT_STALE_TIME,
+        lock_timeout: int = 60,
+        wait_timeout: float = 10,
+    ):
+        self.cache_key = cache_key
+        self.cache_time = cache_time
+        self.stale_time = stale_time
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self._lock_token = None
+
+    @property
+    def stale_key(self):
+        return f"{self.cache_key}:stale"
+
+    @property
+    def lock_key(self):
+        return f"{self.cache_key}:lock"
+
+    def acquire(self) -> bool:
+        token = uuid.uuid4().hex
+        if cache.add(self.lock_key, token, self.lock_timeout):
+            self._lock_token = token
+            return True
+        return False
+
+    def release(self):
+        # 只释放自己持有的锁，避免计算超时后误删其他调用方的锁
+        if self._lock_token and cache.get(self.lock_key) == self._lock_token:
+            cache.delete(self.lock_key)
+        self._lock_token = None
+
+    def get_stale(self) -> Any:
+        return cache.get(self.stale_key)
+
+    def set(self, value: Any):
+        cache.set(self.cache_key, value, self.cache_time)
+        cache.set(self.stale_key, value, self.cache_time + self.stale_time)
+
+    def wait(self) -> Any:
+        """等待持锁方写入新值，超时返回 None"""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.WAIT_INTERVAL)
+            value = cache.get(self.cache_key)
+            if value is not None:
+                return value
+        return None
+
+    def get_or_compute(self, compute: Callable[[], Any]) -> Any:
+        value = cache.get(self.cache_key)
+        if value is not None:
+            return value
+
+        if not self.acquire():
+            value = self.get_stale()
+            if value is None:
+                value = self.wait()
+            if value is not None:
+                return value
+            # 等待超时，自行计算兜底
+            value = compute()
+            self.set(value)
+            return value
+
+        try:
+            # 抢到锁之前可能已有其他调用方写入新值
+            value = cache.get(self.cache_key)
+            if value is None:
+                value = compute()
+                self.set(value)
+            return value
+        finally:
+            self.release()
+
+
+def func_cache_decorator(
+    cache_time: int = DEFAULT_CACHE_TIME, local_cache_size: int = 0, local_cache_time: Optional[int] = None
+):
     """
     函数缓存装饰器
     :param cache_time: 缓存时间
+    :param local_cache_size: 进程内 LRU 缓存的条目数，为 0 时不启用本地缓存。本地缓存命中时不需要访问 redis 和反序列化，
+                             但会直接返回同一个对象，因此只适用于调用方只读的结果
+    :param local_cache_time: 本地缓存时间，默认与 cache_time 一致。通常应设置得比 cache_time 短，以便及时感知 redis 中的变更
+    被装饰的函数提供以下失效接口：
+    - func.invalidate(*args, **kwargs): 按参数删除本地缓存、redis 缓存及其旧值副本，参数需与调用时一致(classmethod 需带上 cls)
+    - func.cache_clear(): 清空当前进程的本地缓存
     """
 
     def decorate(func):
+        local_cache = LocalTTLCache(local_cache_size, local_cache_time or cache_time) if local_cache_size else None
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             get_cache = kwargs.pop("get_cache", False)
             cache_key = format_cache_key(func, *args, **kwargs)
-            func_result = None
             if get_cache:
-                func_result = cache.get(cache_key, None)
-
-            # 若无需从缓存中获取数据或者缓存中没有数据，则执行函数得到结果，并设置缓存
-            if func_result is None:
-                func_result = func(*args, **kwargs)
-                cache.set(cache_key, json.dumps(func_result), cache_time)
-            else:
-                func_result = json.loads(func_result)
+                # 优先从本地缓存获取，其次从 redis 获取并回填本地缓存
+                func_result = local_cache.get(cache_key) if local_cache else None
+                if func_result is not None:
+                    return func_result
+
+                # redis 中没有数据时，只允许一个调用方重新计算，其余调用方返回旧值或等待
+                func_result = json.loads(
+                    SingleFlight(cache_key, cache_time).get_or_compute(lambda: json.dumps(func(*args, **kwargs)))
+                )
+                if local_cache:
+                    local_cache.set(cache_key, func_result)
+                return func_result
+
+            # 若无需从缓存中获取数据，则执行函数得到结果，并设置缓存
+            func_result = func(*args, **kwargs)
+            SingleFlight(cache_key, cache_time).set(json.dumps(func_result))
+            if local_cache:
+                local_cache.set(cache_key, func_result)
             return func_result
 
+        def invalidate(*args, **kwargs):
+            cache_key = format_cache_key(func, *args, **kwargs)
+            # 同时删除旧值副本，避免失效后重新计算期间其他调用方仍读到失效前的数据
+            cache.delete_many([cache_key, SingleFlight(cache_key, cache_time).stale_key])
+            if local_cache:
+                local_cache.delete(cache_key)
+
+        def cache_clear():
+            if local_cache:
+                local_cache.clear()
+
+        wrapper.invalidate = invalidate
+        wrapper.cache_clear = cache_clear
         return wrapper
 
     return decorate
@@ -9,14 +9,17 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import tempfile
 from collections import defaultdict
 from io import BytesIO
-from typing import Any, Dict, List, Union
+from typing import IO, Any, Dict, Iterable, Iterator, List, Union
 
 import openpyxl
 from django.http.response import HttpResponse, StreamingHttpResponse
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, PatternFill
+from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.writer.excel import save_virtual_workbook
 
@@ -164,6 +167,73 @@ class ExcelHandler:
         return response
 
     @classmethod
-    def stream_response(cls, wb: Workbook, excel_name: str) -> StreamingHttpResponse:
-        # TODO 如果excel文件过大，需采用流式返回，待实现
-        raise NotImplementedError
+    def write_only_serialize(
+        cls,
+        data_dict__iter: Iterable[Dict],
+        headers: List,
+        file: IO,
+        header_style: List = None,
+        min_col_width: int = 20,
+    ):
+        """
+        - 将数据字典迭代器逐行写入只写模式的excel，内存占用与数据量无关
+        - 只写模式下无法在写入后调整列宽，因此列宽根据表头预先设置
+        :param data_dict__iter: 数据字典迭代器
+        :param headers: excel数据头 [{"id": "header_id", "name": "header_name"}]，数据严格按照 header 匹配列名
+        :param file: 写入的文件对象
+        :param header_style: excel的头部样式(颜色)
+        :param min_col_width: 最小列宽
+        """
+
+        wb: Workbook = Workbook(write_only=True)
+        sheet = wb.create_sheet()
+        header_ids = [header if isinstance(header, str) else header["id"] for header in headers]
+        header_names = [str(header if isinstance(header, str) else header["name"]) for header in headers]
+
+        for col, header_name in enumerate(header_names):
+            header_width = len(header_name.encode("gbk", errors="ignore")) * 1.3
+            sheet.column_dimensions[get_column_letter(col + 1)].width = max(header_width, min_col_width)
+
+        header_cells = []
+        for header_name in header_names:
+            cell = WriteOnlyCell(sheet, value=header_name)
+            if header_style:
+                cell.fill = PatternFill("solid", fgColor=header_style[header_name])
+            header_cells.append(cell)
+        sheet.append(header_cells)
+
+        # 数据写入单元格，单元格内容可能通过\n分割为多行，需要自动换行
+        alignment = Alignment(wrapText=True)
+        for data_dict in data_dict__iter:
+            row_cells = []
+            for header_id in header_ids:
+                cell = WriteOnlyCell(sheet, value=str(data_dict[header_id]) if header_id in data_dict else "")
+                cell.alignment = alignment
+                row_cells.append(cell)
+            sheet.append(row_cells)
+
+        wb.save(file)
+
+    @classmethod
+    def stream_response(
+        cls, data_dict__iter: Iterable[Dict], headers: List, excel_name: str, chunk_size: int = 64 * 1024
+    ) -> StreamingHttpResponse:
+        """
+        - 流式返回excel文件，适用于数据量较大的导出场景
+        - 数据在响应迭代时才逐行写入临时文件，写入完成后再分块返回，不会在内存中构建完整的Workbook
+        :param data_dict__iter: 数据字典迭代器
+        :param headers: excel数据头 [{"id": "header_id", "name": "header_name"}]
+        :param excel_name: excel文件名
+        :param chunk_size: 每次返回的字节数
+        """
+
+        def iter_excel_content() -> Iterator[bytes]:
+            with tempfile.TemporaryFile() as excel_file:
+                cls.write_only_serialize(data_dict__iter, headers, excel_file)
+                excel_file.seek(0)
+                yield from iter(lambda: excel_file.read(chunk_size), b"")
+
+        response = StreamingHttpResponse(iter_excel_content(), content_type="application/octet-stream")
+        response["Content-Disposition"] = f"attachment;filename={excel_name}"
+        response["Access-Control-Expose-Headers"] = "content-disposition"
+        return response